@@ -0,0 +1,91 @@
+from fastapi import APIRouter, HTTPException, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import logging
+
+from backend.utils import ingestion, evaluation_jobs
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/jobs/ingestion/{job_id}")
+async def get_ingestion_job(job_id: int):
+    """查询文档导入任务的状态、阶段、进度和重试次数"""
+    try:
+        job = await asyncio.to_thread(ingestion.IngestionQueue.get_job, job_id)
+    except Exception as e:
+        logger.error(f"查询导入任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询导入任务失败")
+    if job is None:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return job
+
+@router.post("/jobs/ingestion/{job_id}/retry")
+async def retry_ingestion_job(job_id: int):
+    """重新执行失败的文档导入任务"""
+    try:
+        job = await asyncio.to_thread(ingestion.IngestionQueue.retry, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"重试导入任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="重试导入任务失败")
+    if job is None:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    ingestion.get_queue().notify()
+    return job
+
+@router.get("/jobs/evaluation/{job_id}")
+async def get_evaluation_job(job_id: int):
+    """查询评价任务的状态、阶段、进度、模型已输出的文本和最终结果"""
+    try:
+        job = await asyncio.to_thread(evaluation_jobs.EvaluationJobManager.get_job, job_id)
+    except Exception as e:
+        logger.error(f"查询评价任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="查询评价任务失败")
+    if job is None:
+        raise HTTPException(status_code=404, detail="评价任务不存在")
+    return job
+
+@router.get("/jobs/evaluation/{job_id}/events")
+async def stream_evaluation_job(
+    job_id: int,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    以 Server-Sent Events 推送评价任务的进度和模型输出；
+    浏览器断线重连时会带上 Last-Event-ID，只补发之后的事件
+    """
+    if last_event_id is None and last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    if await asyncio.to_thread(evaluation_jobs.EvaluationJobManager.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="评价任务不存在")
+
+    async def event_stream():
+        async for event in evaluation_jobs.get_manager().events(job_id, last_event_id):
+            yield evaluation_jobs.format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/jobs/evaluation/{job_id}/ws")
+async def watch_evaluation_job(websocket: WebSocket, job_id: int, last_event_id: Optional[int] = None):
+    """
+    以 WebSocket 推送评价任务的进度和模型输出，每条消息为 {"id", "type", "data"}；
+    重连时通过 last_event_id 参数只接收之后的事件
+    """
+    await websocket.accept()
+    try:
+        if await asyncio.to_thread(evaluation_jobs.EvaluationJobManager.get_job, job_id) is None:
+            await websocket.close(code=4404, reason="评价任务不存在")
+            return
+        async for event in evaluation_jobs.get_manager().events(job_id, last_event_id):
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"评价任务 {job_id} 的订阅连接已断开")
@@ -7,20 +7,15 @@ from datetime import datetime
 
 from backend.database import get_db as get_knowledge_db, Base
 from backend.knowledge import KnowledgeBase
-from backend.utils.document_processor import DocumentProcessor
-from backend.utils.vector_store import VectorStore
+from backend.utils import ingestion
+from backend.utils.vector_store import VectorStore, make_doc_id
 from backend.core.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# 初始化向量存储
-try:
-    vector_store = VectorStore()
-    if not vector_store.model or not vector_store.index:
-        logger.error('向量存储初始化失败，模型或索引未加载')
-except Exception as e:
-    logger.error(f'初始化向量存储失败: {str(e)}')
+# 向量存储（模型和索引在首次使用时加载）
+vector_store = VectorStore()
 
 @router.get("/knowledge")
 async def get_knowledge_list(db: Session = Depends(get_knowledge_db)):
@@ -76,39 +71,28 @@ async def upload_knowledge(
             content = await file.read()
             f.write(content)
 
-        # 处理文档
-        logger.info("开始处理文档内容")
-        processor = DocumentProcessor()
-        text = processor.process_document(file_path)
-        
-        # 生成向量
-        logger.info("开始生成文档向量")
-        try:
-            vector_id = vector_store.add_document(text, {"file_path": file_path})
-            logger.info(f"向量生成成功，ID: {vector_id}")
-        except Exception as e:
-            logger.error(f"向量生成失败: {str(e)}")
-            os.remove(file_path)  # 清理文件
-            raise HTTPException(status_code=500, detail="向量生成失败")
-
-        # 保存到数据库
+        # 保存到数据库并创建导入任务，文本提取和向量生成在后台完成
         knowledge = KnowledgeBase(
             title=file.filename,
             file_path=file_path,
-            language='zh',  # 默认为中文
-            vector=text
+            language='zh'  # 默认为中文
         )
         db.add(knowledge)
+        db.flush()
+        
+        ingestion_queue = ingestion.get_queue()
+        job = ingestion_queue.enqueue(db, ingestion.KIND_KNOWLEDGE, knowledge.id, file_path)
         db.commit()
-        db.refresh(knowledge)
+        ingestion_queue.notify()
         
-        logger.info(f"知识库文档上传成功: {knowledge.id}")
-        return {"id": knowledge.id, "title": knowledge.title}
+        logger.info(f"知识库文档上传成功: {knowledge.id}, 导入任务ID: {job.id}")
+        return {"id": knowledge.id, "job_id": job.id, "title": knowledge.title}
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"知识库文档上传失败: {str(e)}")
+        db.rollback()
         # 清理文件
         if 'file_path' in locals() and os.path.exists(file_path):
             os.remove(file_path)
@@ -130,6 +114,14 @@ async def delete_knowledge(knowledge_id: int, db: Session = Depends(get_knowledg
         db.delete(knowledge)
         db.commit()
 
+        # 删除向量存储中的数据，旧版本上传的文档按文件路径查找
+        try:
+            doc_ids = [make_doc_id("knowledge", knowledge_id)]
+            doc_ids += await vector_store.afind_ids({"file_path": knowledge.file_path})
+            await vector_store.aremove_ids(doc_ids)
+        except Exception as e:
+            logger.error(f"删除向量数据失败: {str(e)}")
+
         return {"message": "文档删除成功"}
     except HTTPException:
         raise
@@ -1,14 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from backend.utils.ollama_client import OllamaClient
+from backend.utils.ollama_client import AsyncOllamaClient, GenerationMetrics, cancel_on_disconnect, invalidate_models
+from backend.utils.config_cache import bump_version, get_config_cache
 from backend.core.config import settings
 from backend.database import get_db as get_model_db, ModelConfig
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-ollama_client = OllamaClient()
+ollama_client = AsyncOllamaClient()
 
 class ModelConfigUpdate(BaseModel):
     server_url: str | None = None
@@ -34,17 +35,18 @@ async def list_models(server_url: str = None):
     try:
         # 如果提供了服务器URL，尝试连接新服务器
         if server_url:
-            client = OllamaClient(base_url=server_url)
+            client = AsyncOllamaClient(base_url=server_url)
             logger.info(f'尝试连接新服务器: {server_url}')
-            models = client.list_models()
+            models = await client.list_models(refresh=True)
             logger.info(f'从新服务器获取的模型列表: {models}')
             if not models.get('models'):
                 raise ValueError('无法从服务器获取模型列表')
             return models
         
         # 使用默认服务器
+        await ollama_client.load_config()
         logger.info(f'从默认服务器获取模型列表: {ollama_client.base_url}')
-        models = ollama_client.list_models()
+        models = await ollama_client.list_models(refresh=True)
         logger.info(f'从默认服务器获取的模型列表: {models}')
         return models
         
@@ -61,7 +63,7 @@ async def check_model(model_name: str):
     检查模型是否已安装
     """
     try:
-        exists = ollama_client.check_model(model_name)
+        exists = await ollama_client.check_model(model_name)
         return {"exists": exists}
     except Exception as e:
         logger.error(f'检查模型状态失败: {str(e)}')
@@ -71,33 +73,36 @@ async def check_model(model_name: str):
         )
 
 @router.post("/models/test")
-async def test_model(request: dict):
+async def test_model(request: dict, http_request: Request):
     """
-    测试模型是否正常工作
+    测试模型是否正常工作，客户端断开连接时停止生成
     """
     try:
         model_name = request.get('model_name', settings.DEFAULT_MODEL)
         server_url = request.get('server_url')
         
         # 创建客户端
-        client = OllamaClient(base_url=server_url)
+        client = AsyncOllamaClient(base_url=server_url)
         
         # 首先检查模型是否存在
-        if not client.check_model(model_name):
+        if not await client.check_model(model_name):
             raise ValueError(f'模型 {model_name} 不存在')
         
         # 测试模型
         logger.info(f'开始测试模型: {model_name}, 服务器: {client.base_url}')
-        response = client.generate(
+        metrics = GenerationMetrics()
+        response = await cancel_on_disconnect(http_request, client.generate(
             prompt='这是一个测试。请回复：模型工作正常。',
             model_name=model_name,
-            max_tokens=50
-        )
+            max_tokens=50,
+            metrics=metrics
+        ))
         
         return {
             "status": "success",
             "model": model_name,
-            "response": response
+            "response": response,
+            "metrics": metrics.to_dict()
         }
         
     except ValueError as e:
@@ -157,8 +162,8 @@ async def update_model_config(
         # 验证新服务器和模型
         if config.server_url is not None:
             try:
-                client = OllamaClient(base_url=config.server_url)
-                if config.default_model and not client.check_model(config.default_model):
+                client = AsyncOllamaClient(base_url=config.server_url)
+                if config.default_model and not await client.check_model(config.default_model):
                     raise ValueError(f'模型 {config.default_model} 在新服务器上不可用')
             except Exception as e:
                 raise ValueError(f'无法连接到服务器 {config.server_url}: {str(e)}')
@@ -198,10 +203,16 @@ async def update_model_config(
         try:
             logger.info('开始保存配置...')
             db.add(model_config)
+            # 版本号与配置在同一事务中提交，其他工作进程据此重新加载配置
+            bump_version(db)
             db.commit()
             db.refresh(model_config)
             logger.info('模型配置已成功更新')
             
+            # 本进程的配置缓存立即失效；服务器可能已变化，清除模型列表缓存
+            get_config_cache().invalidate()
+            invalidate_models()
+            
             return {
                 "status": "success",
                 "message": "配置更新成功",
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 import json
+import asyncio
 import os
 import shutil
 import aiofiles
@@ -14,16 +16,17 @@ from backend.database import get_db as get_knowledge_db
 from backend.knowledge import KnowledgeBase
 from backend.utils.document_processor import DocumentProcessor
 from backend.utils.vector_store import VectorStore
-from backend.utils.ollama_client import OllamaClient
+from backend.utils.ollama_client import AsyncOllamaClient, cancel_on_disconnect
+from backend.utils import ingestion, evaluation_jobs
 from backend.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# 初始化向量存储
+# 向量存储（模型和索引在首次使用时加载）
 vector_store = VectorStore()
-ollama_client = OllamaClient()
+ollama_client = AsyncOllamaClient()
 
 class EvaluationResponse(BaseModel):
     id: int
@@ -197,62 +200,25 @@ async def upload_paper(
         async with aiofiles.open(file_path, 'wb') as f:
             await f.write(content)
 
-        # 处理文档
-        logger.debug(f"开始提取文档内容: {file_path}")
-        try:
-            text = DocumentProcessor.process_document(file_path)
-            logger.info(f"文档内容提取成功，长度: {len(text)}")
-        except Exception as e:
-            logger.error(f"文档处理失败: {str(e)}")
-            # 删除已上传的文件
-            os.remove(file_path)
-            raise HTTPException(status_code=400, detail=f"文档处理失败: {str(e)}")
-        
-        # 生成向量
-        logger.debug("开始生成文档向量")
-        try:
-            doc_id = vector_store.add_document(text, {
-                "file_path": file_path,
-                "paper_type": paper_type.value
-            })
-            logger.info(f"向量生成成功，ID: {doc_id}")
-        except Exception as e:
-            logger.error(f"向量生成失败: {str(e)}")
-            # 删除已上传的文件
-            os.remove(file_path)
-            raise HTTPException(status_code=500, detail=f"向量生成失败: {str(e)}")
-        
-        # 保存到数据库
+        # 保存到数据库并创建导入任务，文本提取和向量生成在后台完成
         logger.debug("开始保存到数据库")
         try:
             paper = Paper(
                 title=os.path.splitext(file.filename)[0],
                 file_path=file_path,
                 paper_type=paper_type,
-                vector=str(doc_id),
-                status='pending'  # 添加状态字段，表示未评价
+                status=ingestion.PAPER_STATUS_PROCESSING  # 导入完成后变为 pending（未评价）
             )
             paper_db.add(paper)
-            paper_db.commit()
-            logger.info(f"论文保存成功，ID: {paper.id}")
+            paper_db.flush()
             
-            return {"id": paper.id, "message": "论文上传成功"}
-            
-        except ValueError as e:
-            logger.error(f'论文保存失败: {str(e)}')
-            paper_db.rollback()
-            # 删除已上传的文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            raise HTTPException(status_code=500, detail=str(e))
+            ingestion_queue = ingestion.get_queue()
+            job = ingestion_queue.enqueue(paper_db, ingestion.KIND_PAPER, paper.id, file_path)
+            paper_db.commit()
+            ingestion_queue.notify()
+            logger.info(f"论文保存成功，ID: {paper.id}, 导入任务ID: {job.id}")
             
-        except HTTPException as e:
-            logger.error(f'论文保存失败: {e.detail}')
-            paper_db.rollback()
-            # 删除已上传的文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            raise e
+            return {"id": paper.id, "job_id": job.id, "title": paper.title, "message": "论文上传成功，正在后台处理"}
             
         except Exception as e:
             logger.error(f'论文保存过程发生未知错误: {str(e)}')
@@ -260,10 +226,7 @@ async def upload_paper(
             # 删除已上传的文件
             if os.path.exists(file_path):
                 os.remove(file_path)
-            paper_db.rollback()
             raise HTTPException(status_code=500, detail=f'论文保存失败: {str(e)}')
-        
-        return {"id": paper.id, "title": paper.title, "message": "论文上传成功"}
     
     except ValueError as e:
         logger.error(f'论文上传失败: {str(e)}')
@@ -399,325 +362,107 @@ async def upload_temp_paper(
         logger.error(f'上传临时文件失败: {str(e)}')
         raise HTTPException(status_code=500, detail=f'上传失败: {str(e)}')
 
-@router.post("/papers/evaluate/{paper_type}")
-async def evaluate_paper(
-    paper_type: str,
-    request: EvaluateRequest,
-    paper_db: Session = Depends(get_paper_db),
-    evaluate_db: Session = Depends(get_evaluate_db),
-    model_db: Session = Depends(get_model_db),
-    knowledge_db: Session = Depends(get_knowledge_db)
-):
+async def _prepare_evaluation(paper_type: str,
+                              request: EvaluateRequest,
+                              model_db: Session,
+                              knowledge_db: Session) -> tuple:
     """
-    评价论文
+    评价前的检查：模型配置、知识库数量、要评价的文件和论文类型
+    :return: (论文类型, 文件名, 文件路径, 模型名称)
     """
-    try:
-        logger.info(f'开始评价{paper_type}论文')
-
-        # 获取系统默认模型
-        model_config = model_db.query(ModelConfig).first()
-        if not model_config or not model_config.default_model:
-            logger.error('未选择评价模型')
-            raise HTTPException(
-                status_code=400,
-                detail='请先在模型管理页面选择并保存要使用的模型，然后再进行评价'
-            )
-            
-        if not ollama_client.check_model(model_config.default_model):
-            logger.error(f'模型 {model_config.default_model} 不可用')
-            raise HTTPException(
-                status_code=400,
-                detail=f'模型 {model_config.default_model} 不可用'
-            )
+    # 获取系统默认模型
+    model_config = model_db.query(ModelConfig).first()
+    if not model_config or not model_config.default_model:
+        logger.error('未选择评价模型')
+        raise HTTPException(
+            status_code=400,
+            detail='请先在模型管理页面选择并保存要使用的模型，然后再进行评价'
+        )
         
-        # 检查知识库数量
-        knowledge_count = knowledge_db.query(KnowledgeBase).count()
-        logger.info(f'知识库数量: {knowledge_count}')
-        if knowledge_count < 5:
-            logger.error('知识库文档数量不足')
-            raise HTTPException(
-                status_code=400,
-                detail='知识库中需要至少 5 篇文档'
-            )
+    if not await ollama_client.check_model(model_config.default_model):
+        logger.error(f'模型 {model_config.default_model} 不可用')
+        raise HTTPException(
+            status_code=400,
+            detail=f'模型 {model_config.default_model} 不可用'
+        )
+    
+    # 检查知识库数量
+    knowledge_count = knowledge_db.query(KnowledgeBase).count()
+    logger.info(f'知识库数量: {knowledge_count}')
+    if knowledge_count < 5:
+        logger.error('知识库文档数量不足')
+        raise HTTPException(
+            status_code=400,
+            detail='知识库中需要至少 5 篇文档'
+        )
 
-        # 准备评价文件目录
-        base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-        evaluation_dir = os.path.join(base_dir, settings.PAPERS_DIR, 'evaluation')
-        os.makedirs(evaluation_dir, exist_ok=True)
-        
-        # 获取前端传递的文件名（如果有）
-        filename = request.filename if hasattr(request, 'filename') and request.filename else None
-        
-        # 如果前端提供了文件名，使用指定的文件
-        if filename:
-            target_file = filename
-            target_path = os.path.join(evaluation_dir, target_file)
-            if not os.path.exists(target_path):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f'未找到指定的论文文件: {filename}'
-                )
-            logger.info(f'使用指定的文件进行评价: {target_file}')
-        else:
-            # 否则，在评价目录中查找最新的文件
-            eval_files = os.listdir(evaluation_dir)
-            if not eval_files:
-                raise HTTPException(
-                    status_code=400,
-                    detail='未找到要评价的论文文件'
-                )
-            
-            # 选择最新的文件
-            eval_files.sort(key=lambda x: os.path.getmtime(os.path.join(evaluation_dir, x)), reverse=True)
-            target_file = eval_files[0]
-            target_path = os.path.join(evaluation_dir, target_file)
-            logger.info(f'在评价目录找到最新文件: {target_file}')
-        
-        # 检查文件类型
-        if not target_file.lower().endswith(('.pdf', '.doc', '.docx')):
-            raise HTTPException(
-                status_code=400,
-                detail='不支持的文件类型'
-            )
-        
-        # 读取文件内容
-        try:
-            paper_text = DocumentProcessor.process_document(target_path)
-            if not paper_text:
-                raise ValueError('无法提取文件内容')
-        except Exception as e:
-            logger.error(f'读取文件内容失败: {str(e)}')
+    # 准备评价文件目录
+    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+    evaluation_dir = os.path.join(base_dir, settings.PAPERS_DIR, 'evaluation')
+    os.makedirs(evaluation_dir, exist_ok=True)
+    
+    # 获取前端传递的文件名（如果有）
+    filename = request.filename if hasattr(request, 'filename') and request.filename else None
+    
+    # 如果前端提供了文件名，使用指定的文件
+    if filename:
+        target_file = filename
+        target_path = os.path.join(evaluation_dir, target_file)
+        if not os.path.exists(target_path):
             raise HTTPException(
                 status_code=400,
-                detail=f'读取文件内容失败: {str(e)}'
+                detail=f'未找到指定的论文文件: {filename}'
             )
-        
-        # 获取参考文献
-        reference_texts = []
-        try:
-            # 从知识库中获取相关文献
-            knowledge_items = knowledge_db.query(KnowledgeBase).all()
-            reference_texts = []
-            for item in knowledge_items:
-                try:
-                    text = DocumentProcessor.process_document(item.file_path)
-                    if text:
-                        reference_texts.append(text)
-                except Exception as e:
-                    logger.error(f'读取参考文献失败 (ID: {item.id}): {str(e)}')
-                    continue
-            logger.info(f'获取到 {len(reference_texts)} 篇参考文献')
-        except Exception as e:
-            logger.error(f'获取参考文献失败: {str(e)}')
-            raise HTTPException(
-                status_code=500,
-                detail=f'获取参考文献失败: {str(e)}'
-            )
-        
-        # 转换论文类型
-        try:
-            paper_type_enum = PaperType[paper_type]
-        except KeyError:
-            logger.error(f'无效的论文类型: {paper_type}')
+        logger.info(f'使用指定的文件进行评价: {target_file}')
+    else:
+        # 否则，在评价目录中查找最新的文件
+        eval_files = os.listdir(evaluation_dir)
+        if not eval_files:
             raise HTTPException(
                 status_code=400,
-                detail=f'无效的论文类型: {paper_type}'
+                detail='未找到要评价的论文文件'
             )
-            
-        # 获取同类型的历年论文作为比对材料
-        historical_papers = []
-        plagiarism_results = []
-        try:
-            # 查询同类型的论文
-            same_type_papers = paper_db.query(Paper).filter(
-                Paper.paper_type == paper_type_enum
-            ).all()
-            
-            logger.info(f'找到 {len(same_type_papers)} 篇同类型历史论文')
-            
-            # 处理历史论文
-            for hist_paper in same_type_papers:
-                try:
-                    # 跳过不存在的文件
-                    if not os.path.exists(hist_paper.file_path):
-                        logger.warning(f'历史论文文件不存在: {hist_paper.file_path}')
-                        continue
-                        
-                    # 提取文本
-                    hist_text = DocumentProcessor.process_document(hist_paper.file_path)
-                    if not hist_text:
-                        logger.warning(f'无法提取历史论文内容: {hist_paper.id}')
-                        continue
-                    
-                    # 计算相似度
-                    similarity = vector_store.calculate_similarity(paper_text, hist_text)
-                    logger.info(f'论文相似度: 当前论文 vs {hist_paper.title} = {similarity}')
-                    
-                    # 添加到历史论文列表
-                    historical_papers.append({
-                        "id": hist_paper.id,
-                        "title": hist_paper.title,
-                        "text": hist_text,
-                        "similarity": similarity
-                    })
-                    
-                    # 检查是否可能抄袭
-                    if similarity > 0.85:  # 设置相似度阈值
-                        plagiarism_results.append({
-                            "paper_id": hist_paper.id,
-                            "title": hist_paper.title,
-                            "similarity": similarity
-                        })
-                        logger.warning(f'检测到可能的抄袭: 当前论文 vs {hist_paper.title} = {similarity}')
-                        
-                except Exception as e:
-                    logger.error(f'处理历史论文失败 (ID: {hist_paper.id}): {str(e)}')
-                    continue
-            
-            # 按相似度排序
-            historical_papers.sort(key=lambda x: x["similarity"], reverse=True)
-            
-            # 取前5篇最相似的论文作为参考
-            top_historical_papers = historical_papers[:5]
-            logger.info(f'选择了 {len(top_historical_papers)} 篇最相似的历史论文作为参考')
-            
-        except Exception as e:
-            logger.error(f'获取历史论文失败: {str(e)}')
-            # 不中断评价流程，只记录错误
-            top_historical_papers = []
         
-        logger.info(f'最终获取到 {len(reference_texts)} 篇知识库参考文献和 {len(top_historical_papers)} 篇历史论文')
-
-        # 创建论文记录
-        paper = Paper(
-            title=target_file,  # 暂时使用文件名作为标题
-            file_path=target_path,
-            paper_type=paper_type_enum,
-            status='pending'
+        # 选择最新的文件
+        eval_files.sort(key=lambda x: os.path.getmtime(os.path.join(evaluation_dir, x)), reverse=True)
+        target_file = eval_files[0]
+        target_path = os.path.join(evaluation_dir, target_file)
+        logger.info(f'在评价目录找到最新文件: {target_file}')
+    
+    # 检查文件类型
+    if not target_file.lower().endswith(('.pdf', '.doc', '.docx')):
+        raise HTTPException(
+            status_code=400,
+            detail='不支持的文件类型'
         )
-        paper_db.add(paper)
-        paper_db.commit()
-        logger.info(f'论文记录已创建, ID: {paper.id}')
+    
+    # 转换论文类型
+    try:
+        paper_type_enum = PaperType[paper_type]
+    except KeyError:
+        logger.error(f'无效的论文类型: {paper_type}')
+        raise HTTPException(
+            status_code=400,
+            detail=f'无效的论文类型: {paper_type}'
+        )
+    
+    return paper_type_enum, target_file, target_path, model_config.default_model
 
-        # 评价论文
-        try:
-            evaluation = ollama_client.evaluate_paper(
-                paper_text=paper_text,
-                paper_type=paper_type_enum,
-                reference_texts=reference_texts,
-                historical_papers=top_historical_papers if 'top_historical_papers' in locals() else [],
-                plagiarism_results=plagiarism_results if 'plagiarism_results' in locals() else [],
-                model_name=model_config.default_model
-            )
-            
-            # 验证评价结果
-            score = evaluation.get('score')
-            if not isinstance(score, (int, float)):
-                raise ValueError(f'评价分数格式错误: {type(score)}')
-            if not (65 <= float(score) <= 98):
-                raise ValueError(f'评价分数超出范围: {score}')
-                
-            overall_comments = evaluation.get('overall_comments')
-            if not isinstance(overall_comments, str) or len(overall_comments.strip()) < 50:
-                raise ValueError('总体评价不能为空或过短')
-            
-            # 检查抄袭检测和历史比较结果
-            plagiarism_check = evaluation.get('plagiarism_check', {})
-            if not isinstance(plagiarism_check, dict):
-                plagiarism_check = {
-                    'is_plagiarized': False,
-                    'comments': '未检测到抄袭问题'
-                }
-                
-            historical_comparison = evaluation.get('historical_comparison', {})
-            if not isinstance(historical_comparison, dict):
-                historical_comparison = {
-                    'improvement': 'unchanged',
-                    'comments': '与历史论文相比无显著变化'
-                }
-            
-            # 检查各部分评价
-            sections = {
-                'academic_evaluation': '学术评价',
-                'ethical_evaluation': '伦理评价',
-                'technical_analysis': '技术分析',
-                'format_evaluation': '格式评价'
-            }
-            
-            detailed_comments = []
-            for section_name, section_title in sections.items():
-                section = evaluation.get(section_name)
-                if not isinstance(section, dict):
-                    raise ValueError(f'{section_title}格式错误')
-                
-                section_comments = []
-                for criterion, data in section.items():
-                    if not isinstance(data, dict):
-                        raise ValueError(f'{section_title}.{criterion}格式错误')
-                    
-                    subscore = data.get('score')
-                    comments = data.get('comments')
-                    
-                    if not isinstance(subscore, (int, float)) or not (1 <= float(subscore) <= 10):
-                        raise ValueError(f'{section_title}.{criterion}分数超出范围: {subscore}')
-                    if not isinstance(comments, str) or not comments.strip():
-                        raise ValueError(f'{section_title}.{criterion}评语不能为空')
-                        
-                    section_comments.append(f'{criterion}: {comments.strip()}')
-                
-                detailed_comments.append(f'\n{section_title}:\n' + '\n'.join(section_comments))
-            
-            # 添加抄袭检测和历史比较结果
-            plagiarism_text = f"\n\n抄袭检测:\n检测结果: {'可能存在抄袭' if plagiarism_check.get('is_plagiarized') else '未发现抄袭问题'}\n评语: {plagiarism_check.get('comments', '')}"
-            
-            historical_text = f"\n\n与历史论文比较:\n水平变化: {historical_comparison.get('improvement', 'unchanged')}\n评语: {historical_comparison.get('comments', '')}"
-            
-            full_comments = overall_comments + '\n\n详细评价:\n' + '\n'.join(detailed_comments) + plagiarism_text + historical_text
-            logger.info(f'评价结果: 分数={score}, 评语长度={len(full_comments)}')
-            
-            # 创建评价记录
-            evaluation = Evaluation(
-                paper_id=paper.id,
-                score=float(score),
-                comments=full_comments,
-                model_name=model_config.default_model
-            )
-            evaluate_db.add(evaluation)
-            evaluate_db.commit()
-            logger.info(f'评价结果已保存到数据库, ID: {evaluation.id}')
-
-            # 返回评价结果
-            return {
-                'id': evaluation.id,
-                'paper_id': evaluation.paper_id,
-                'paper_title': paper.title,
-                'paper_type': paper_type,
-                'score': evaluation.score,
-                'comments': evaluation.comments,  # 直接使用完整的评价内容
-                'model_name': evaluation.model_name,
-                'plagiarism_check': {
-                    'is_plagiarized': plagiarism_check.get('is_plagiarized', False),
-                    'comments': plagiarism_check.get('comments', '')
-                },
-                'historical_comparison': {
-                    'improvement': historical_comparison.get('improvement', 'unchanged'),
-                    'comments': historical_comparison.get('comments', '')
-                },
-                'message': '论文评价完成'
-            }
-
-        except ValueError as e:
-            logger.error(f'评价论文失败: {str(e)}')
-            raise HTTPException(
-                status_code=500,
-                detail=str(e)
-            )
-        except Exception as e:
-            logger.error(f'评价过程发生未知错误: {str(e)}')
-            raise HTTPException(
-                status_code=500,
-                detail=f'评价失败: {str(e)}'
-            )
+@router.post("/papers/evaluate/{paper_type}")
+async def evaluate_paper(
+    paper_type: str,
+    request: EvaluateRequest,
+    http_request: Request,
+    model_db: Session = Depends(get_model_db),
+    knowledge_db: Session = Depends(get_knowledge_db)
+):
+    """
+    评价论文，等待评价完成后返回结果；客户端断开连接时停止评价
+    """
+    try:
+        logger.info(f'开始评价{paper_type}论文')
+        params = await _prepare_evaluation(paper_type, request, model_db, knowledge_db)
+        return await cancel_on_disconnect(http_request, evaluation_jobs.run_evaluation(*params))
     
     except HTTPException as e:
         # 直接向上抛出 HTTP 异常
@@ -728,6 +473,66 @@ async def evaluate_paper(
         logger.exception(e)  # 输出完整的堆栈信息
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/papers/evaluate/{paper_type}/stream")
+async def evaluate_paper_stream(
+    paper_type: str,
+    request: EvaluateRequest,
+    model_db: Session = Depends(get_model_db),
+    knowledge_db: Session = Depends(get_knowledge_db)
+):
+    """
+    评价论文，以 Server-Sent Events 边生成边推送阶段进度和模型输出，最后推送结果或错误；
+    客户端断开连接时停止评价
+    """
+    try:
+        logger.info(f'开始流式评价{paper_type}论文')
+        params = await _prepare_evaluation(paper_type, request, model_db, knowledge_db)
+    except HTTPException as e:
+        logger.error(f"论文评价失败: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"论文评价失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    progress = evaluation_jobs.StreamProgress(asyncio.get_running_loop())
+
+    async def event_stream():
+        async for event in progress.run(evaluation_jobs.run_evaluation(*params, progress=progress)):
+            yield evaluation_jobs.format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/papers/evaluate/{paper_type}/jobs")
+async def submit_evaluation_job(
+    paper_type: str,
+    request: EvaluateRequest,
+    model_db: Session = Depends(get_model_db),
+    knowledge_db: Session = Depends(get_knowledge_db),
+    evaluate_db: Session = Depends(get_evaluate_db)
+):
+    """
+    提交评价任务，立即返回任务ID；通过 /jobs/evaluation/{job_id}/events（SSE）
+    或 /jobs/evaluation/{job_id}/ws（WebSocket）获取进度和结果
+    """
+    try:
+        logger.info(f'提交{paper_type}论文评价任务')
+        params = await _prepare_evaluation(paper_type, request, model_db, knowledge_db)
+        job = evaluation_jobs.get_manager().submit(evaluate_db, *params)
+        logger.info(f'评价任务已创建, ID: {job.id}')
+        return {"job_id": job.id, "status": job.status, "message": "评价任务已提交"}
+    
+    except HTTPException as e:
+        logger.error(f"提交评价任务失败: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"提交评价任务失败: {str(e)}")
+        evaluate_db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/papers/{paper_type}")
 async def get_papers(paper_type: str = None, db: Session = Depends(get_paper_db)):
     """
@@ -800,7 +605,7 @@ async def delete_paper(
         # 删除向量存储中的数据
         try:
             if paper.vector:
-                vector_store.delete_document(paper.vector)
+                await vector_store.adelete_document(int(paper.vector))
                 logger.info(f"成功删除向量数据: {paper.vector}")
         except Exception as e:
             logger.error(f"删除向量数据失败: {str(e)}")
@@ -15,6 +15,13 @@ class Settings(BaseSettings):
     
     # Ollama配置
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_POOL_CONNECTIONS: int = 4  # 连接池缓存的Ollama服务器（主机）数量
+    OLLAMA_POOL_MAXSIZE: int = 8  # 每个服务器最多同时保持的连接数，超出时等待空闲连接
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0  # 建立连接的超时秒数
+    OLLAMA_READ_TIMEOUT: float = 30.0  # 查询模型列表等请求的读取超时秒数
+    OLLAMA_GENERATE_TIMEOUT: float = 120.0  # 生成请求的读取超时秒数（流式生成时为相邻两段输出的最大间隔）
+    OLLAMA_MODEL_CACHE_TTL: float = 60.0  # 模型列表缓存的有效秒数，0表示不缓存
+    MODEL_CONFIG_CHECK_INTERVAL: float = 2.0  # 检查模型配置版本号的最小间隔秒数，其他工作进程的修改最迟在该时间后生效
     DEFAULT_MODEL: str = "llama2"  # 默认使用 llama2 模型
     REQUIRED_MODELS: list = ["llama2"]  # 需要安装的模型
     
@@ -26,6 +33,85 @@ class Settings(BaseSettings):
     # 向量维度配置
     VECTOR_DIMENSION: int = 768
     
+    # 向量存储持久化配置
+    VECTOR_STORE_DIR: str = "data/vector_store"
+    VECTOR_METRIC: str = "cosine"  # cosine: 归一化向量+内积索引，分数即余弦相似度；l2: 欧氏距离索引
+    VECTOR_WAL_COMPACT_THRESHOLD: int = 200  # 预写日志累计多少条记录后压缩为快照
+    VECTOR_TOMBSTONE_RATIO: float = 0.1  # 已删除向量占索引比例超过该值时批量移除
+    
+    # 向量索引类型配置：auto 按数据量自动选择，也可固定为 flat / ivf_flat / ivf_pq / hnsw
+    VECTOR_INDEX_TYPE: str = "auto"
+    VECTOR_IVF_THRESHOLD: int = 20000  # 向量数超过该值时切换为 IVF-Flat
+    VECTOR_IVF_PQ_THRESHOLD: int = 500000  # 向量数超过该值时切换为 IVF-PQ
+    VECTOR_IVF_MIN_TRAIN: int = 2000  # 训练IVF索引所需的最少向量数
+    VECTOR_IVF_RETRAIN_GROWTH: float = 2.0  # 建议聚类数增长到当前的多少倍时重新训练
+    VECTOR_IVF_NPROBE: int = 16  # IVF默认每次查询访问的聚类数
+    VECTOR_PQ_M: int = 48  # PQ子量化器数量（自动调整为能整除维度的值）
+    VECTOR_HNSW_M: int = 32
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 80
+    VECTOR_HNSW_EF_SEARCH: int = 64  # HNSW默认查询候选列表长度
+    
+    # 文本编码配置
+    VECTOR_MODEL_WARMUP: bool = True  # 启动后在后台预热向量模型，关闭时在首次使用时加载
+    EMBEDDING_BATCH_SIZE: int = 32  # 文本编码时每批送入模型的文本数
+    EMBEDDING_BACKEND: str = "torch"  # 编码后端：torch / torch_int8 / onnx / onnx_int8
+    EMBEDDING_ONNX_DIR: str = ""  # ONNX模型目录，为空时导出到 models/<模型名称>-onnx
+    EMBEDDING_NUM_THREADS: int = 0  # ONNX推理线程数，0表示由onnxruntime自动决定
+    # 加载非torch后端时与torch后端比对输出，不一致则回退；ONNX后端的结果缓存在模型目录中，
+    # 只在导出或量化后首次加载时比对一次，模型文件或阈值变化时重新比对
+    EMBEDDING_PARITY_CHECK: bool = True
+    EMBEDDING_PARITY_MIN_COSINE: float = 0.99  # 一致性检查要求的最小余弦相似度
+    # 异步编码工作池：thread 共享进程内模型；process 每个工作进程各加载一份模型。
+    # 默认使用 thread：torch和onnxruntime在矩阵运算期间释放GIL，且单次推理已使用多个CPU核，
+    # 多个线程即可并行编码，不需要每个进程各占一份模型内存（MiniLM约470MB）和启动时的加载时间；
+    # 当分词等Python侧开销成为瓶颈（大量短文本的批量导入）时再改为 process
+    EMBEDDING_WORKER_MODE: str = "thread"
+    EMBEDDING_WORKERS: int = 0  # 编码工作数，0表示 min(4, CPU核数)
+    EMBEDDING_CACHE_ENABLED: bool = True  # 按文本哈希缓存编码结果，模型变化时自动失效
+    EMBEDDING_CACHE_PATH: str = "data/cache/embedding_cache.db"
+    EMBEDDING_CACHE_MAX_MB: int = 1024
+    
+    # 文本分块配置：长文档按章节和滑动窗口切分后逐块编码
+    # 每个文本块的最大字符数。编码模型最多处理128个token（含2个特殊token），
+    # 多语言MiniLM的分词器对中文大致一字一个token，按字符计的块大小不能超过约126，否则块尾会在编码时被截断
+    CHUNK_SIZE: int = 120
+    CHUNK_OVERLAP: int = 24  # 相邻文本块重叠的字符数
+    CHUNK_MAX_PER_DOCUMENT: int = 4096  # 每个文档最多的文本块数（不超过4096）
+    CHUNK_SEARCH_K: int = 10  # 每个查询文本块取回的相似文本块数
+    
+    # 相似度检测配置
+    PLAGIARISM_THRESHOLD: float = 0.85  # 文本块余弦相似度超过该值视为相似片段
+    PLAGIARISM_MIN_COVERAGE: float = 0.3  # 相似片段占当前论文文本块的比例超过该值视为可能抄袭
+    SIMILARITY_SEARCH_TOP_K: int = 20  # 每次评价从索引中取回的候选历史论文数量
+    
+    # PDF提取配置
+    PDF_EXTRACT_WORKERS: int = 0  # PDF逐页提取的进程数，0表示 min(4, CPU核数)
+    PDF_PARALLEL_MIN_PAGES: int = 32  # 页数达到该值时才使用进程池并行提取
+    PDF_PAGES_PER_TASK: int = 16  # 每个进程任务处理的连续页数
+    PDF_MIN_TEXT_CHARS: int = 20  # 文本层字符数低于该值的页面视为没有文本层
+    PDF_MIXED_IMAGE_COVERAGE: float = 0.5  # 有文本层的页面中图像覆盖比例超过该值时额外做OCR
+    OCR_WORKERS: int = 0  # OCR进程数上限，0表示 min(4, CPU核数)
+    OCR_DPI: int = 200  # OCR渲染页面的分辨率
+    OCR_MODE: str = "combined"  # combined: 组合语言模型识别一次；detect: 脚本检测后识别一次；sequential: 逐个语言重试
+    OCR_CACHE_ENABLED: bool = True  # 按预处理后的页面位图哈希和OCR配置缓存识别结果
+    OCR_CACHE_PATH: str = "data/cache/ocr_cache.db"
+    OCR_CACHE_MAX_MB: int = 256
+    
+    # 文本提取缓存配置
+    TEXT_CACHE_ENABLED: bool = True
+    TEXT_CACHE_PATH: str = "data/cache/text_cache.db"
+    TEXT_CACHE_MAX_MB: int = 512
+    
+    # 后台导入任务配置：上传后由工作协程依次完成提取、分块、编码和写入索引
+    INGESTION_WORKERS: int = 2  # 同时处理的导入任务数
+    INGESTION_MAX_ATTEMPTS: int = 3  # 每个任务最多尝试的次数
+    INGESTION_RETRY_DELAY: float = 10.0  # 失败后重试的等待秒数（按已尝试次数递增）
+    INGESTION_POLL_INTERVAL: float = 2.0  # 没有新任务通知时检查队列的间隔秒数
+    
+    # 异步评价任务配置
+    EVALUATION_JOB_WORKERS: int = 2  # 同时执行的评价任务数
+    EVALUATION_FLUSH_INTERVAL: float = 1.0  # 模型输出写入数据库的最小间隔秒数，供断线重连的客户端恢复
+    
     # 评分配置
     MIN_SCORE: int = 65
     MAX_SCORE: int = 98
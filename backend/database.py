@@ -53,6 +53,53 @@ class Evaluation(Base):
     model_name = Column(String(100))
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class IngestionJob(Base):
+    """文档导入任务表：上传的论文和知识库文档在后台完成提取、分块、编码和写入索引"""
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # paper, knowledge
+    target_id = Column(Integer, nullable=False)  # 论文或知识库文档的主键
+    file_path = Column(String(255), nullable=False)
+    status = Column(String(50), default='queued', index=True)  # queued, running, succeeded, failed
+    stage = Column(String(50), nullable=True)  # extract, chunk, embed, index
+    progress = Column(Float, default=0.0)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class EvaluationJob(Base):
+    """论文评价任务表：保存评价进度、模型的部分输出和最终结果，客户端断线后可以恢复"""
+    __tablename__ = "evaluation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    paper_type = Column(String(50), nullable=False)
+    file_name = Column(String(255), nullable=False)
+    file_path = Column(String(255), nullable=False)
+    model_name = Column(String(100), nullable=False)
+    status = Column(String(50), default='queued', index=True)  # queued, running, succeeded, failed
+    stage = Column(String(50), nullable=True)  # extract, references, historical, generate, save
+    progress = Column(Float, default=0.0)
+    partial_output = Column(Text, nullable=True)  # 模型已生成的文本
+    result = Column(Text, nullable=True)  # 评价结果的JSON字符串
+    error = Column(Text, nullable=True)
+    last_event_id = Column(Integer, default=0)  # 已分配的事件ID上限，任务重新执行时事件ID从此继续递增
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class ConfigVersion(Base):
+    """配置版本号表：配置修改时在同一事务中递增版本号，各工作进程据此判断缓存的配置是否过期"""
+    __tablename__ = "config_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class ModelConfig(Base):
     """模型配置表"""
     __tablename__ = "model_config"
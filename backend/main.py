@@ -1,7 +1,8 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from backend.api import paper_routes, model_routes, knowledge_routes
+from backend.api import paper_routes, model_routes, knowledge_routes, job_routes
 from backend.database import init_db as init_all_db
+from backend.core.config import settings
 import logging
 import os
 
@@ -62,17 +63,19 @@ async def startup_event():
         os.makedirs(models_dir, exist_ok=True)
         logger.info(f'检查模型目录: {models_dir}')
         
-        # 检查向量模型是否存在
-        try:
-            # 预先初始化向量存储，触发模型检查和下载
+        # 启动文档导入队列，继续处理上次未完成的任务
+        from backend.utils import ingestion
+        await ingestion.get_queue().start()
+        
+        # 恢复未完成的评价任务
+        from backend.utils import evaluation_jobs
+        await evaluation_jobs.get_manager().start()
+        
+        # 在后台预热向量模型，不阻塞启动；未预热时在首次使用时加载
+        if settings.VECTOR_MODEL_WARMUP:
             from backend.utils.vector_store import VectorStore
-            vector_store = VectorStore()
-            if vector_store.model and vector_store.index:
-                logger.info('向量模型检查成功，模型已存在或已下载')
-            else:
-                logger.warning('向量模型初始化失败，知识库搜索功能可能不可用')
-        except Exception as e:
-            logger.error(f'检查向量模型时发生错误: {str(e)}')
+            VectorStore().warm_up()
+            logger.info('已在后台开始加载向量模型')
         
         # 检查数据库连接
         model_db = next(get_model_db())
@@ -111,10 +114,47 @@ async def startup_event():
     
     logger.info("应用启动完成")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    应用关闭时停止文档导入队列和评价任务，关闭Ollama连接、编码工作池、PDF提取和OCR进程池，并将向量存储压缩为快照
+    """
+    try:
+        from backend.utils import ingestion
+        await ingestion.get_queue().stop()
+    except Exception as e:
+        logger.error(f'停止文档导入队列失败: {str(e)}')
+    try:
+        from backend.utils import evaluation_jobs
+        await evaluation_jobs.get_manager().stop()
+    except Exception as e:
+        logger.error(f'停止评价任务失败: {str(e)}')
+    try:
+        from backend.utils import ollama_client
+        ollama_client.close_session()
+        await ollama_client.close_async_client()
+    except Exception as e:
+        logger.error(f'关闭Ollama连接失败: {str(e)}')
+    try:
+        from backend.utils.document_processor import DocumentProcessor
+        from backend.utils import ocr
+        DocumentProcessor.shutdown_pool()
+        ocr.shutdown()
+    except Exception as e:
+        logger.error(f'关闭PDF提取进程池失败: {str(e)}')
+    try:
+        from backend.utils.vector_store import VectorStore
+        if VectorStore._instance is not None:
+            VectorStore._instance.close_encoder_pool()
+            VectorStore._instance.compact()
+    except Exception as e:
+        logger.error(f'保存向量存储失败: {str(e)}')
+
 # 包含路由模块
 app.include_router(paper_routes.router, prefix="/api", tags=["papers"])
 app.include_router(model_routes.router, prefix="/api", tags=["models"])
 app.include_router(knowledge_routes.router, prefix="/api", tags=["knowledge"])
+app.include_router(job_routes.router, prefix="/api", tags=["jobs"])
 
 @app.get("/")
 async def root():
@@ -126,9 +166,38 @@ async def root():
 @app.get("/api/health")
 async def health_check():
     """
-    健康检查路由
+    健康检查路由，vector_store_ready 表示向量模型是否已加载完成
+    """
+    from backend.utils.vector_store import VectorStore
+    vector_store = VectorStore()
+    return {
+        "status": "ok",
+        "message": "服务正常",
+        "vector_store_ready": vector_store.ready,
+        "vector_store_state": vector_store.load_state
+    }
+
+@app.get("/api/metrics")
+async def metrics():
+    """
+    运行指标路由，返回各类缓存的统计信息
     """
-    return {"status": "ok", "message": "服务正常"}
+    from backend.utils.document_processor import DocumentProcessor
+    from backend.utils.vector_store import VectorStore
+    from backend.utils import ocr, ingestion, ollama_client
+    from backend.utils.config_cache import get_config_cache
+    return {
+        "ingestion_jobs": ingestion.IngestionQueue.stats(),
+        "ollama_http": ollama_client.transport_stats(),
+        "ollama_models_cache": ollama_client.model_cache_stats(),
+        "ollama_generation": ollama_client.generation_stats(),
+        "model_config_cache": get_config_cache().stats(),
+        "text_cache": DocumentProcessor.cache_stats(),
+        "pdf_extraction": DocumentProcessor.extraction_stats(),
+        "ocr_cache": ocr.cache_stats(),
+        "vector_store": VectorStore._instance.stats() if VectorStore._instance is not None else None,
+        "embedding_cache": VectorStore._instance.embedding_cache_stats() if VectorStore._instance is not None else None
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,131 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from backend.core.config import settings
+from backend.database import SessionLocal, ConfigVersion, ModelConfig
+
+logger = logging.getLogger(__name__)
+
+# 模型配置在版本号表中的名称
+MODEL_CONFIG = "model_config"
+
+
+class ModelConfigSnapshot:
+    """模型配置的只读快照，与数据库会话无关，可以在线程间共享"""
+
+    __slots__ = ("server_url", "default_model", "temperature", "max_tokens", "version")
+
+    def __init__(self, config: ModelConfig, version: int):
+        self.server_url = config.server_url
+        self.default_model = config.default_model
+        self.temperature = config.temperature
+        self.max_tokens = config.max_tokens
+        self.version = version
+
+    def __repr__(self):
+        return f"ModelConfigSnapshot(version={self.version}, server_url='{self.server_url}', "\
+               f"default_model='{self.default_model}', temperature={self.temperature}, max_tokens={self.max_tokens})"
+
+
+def bump_version(db: Session, name: str = MODEL_CONFIG) -> None:
+    """
+    递增配置版本号，需要与配置的修改在同一事务中提交
+    :param db: 数据库会话
+    :param name: 配置名称
+    """
+    updated = db.query(ConfigVersion).filter(ConfigVersion.name == name).update(
+        {ConfigVersion.version: ConfigVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.add(ConfigVersion(name=name, version=1))
+
+
+class ModelConfigCache:
+    """
+    进程内的模型配置缓存：首次使用时从数据库加载一次，
+    之后每隔 MODEL_CONFIG_CHECK_INTERVAL 秒只查询版本号，版本号变化时才重新加载配置
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[ModelConfigSnapshot] = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self) -> Optional[ModelConfigSnapshot]:
+        """
+        获取当前的模型配置
+        :return: 配置快照，数据库中没有配置时返回None
+        """
+        if self._fresh():
+            return self._snapshot
+
+        with self._lock:
+            if self._fresh():
+                return self._snapshot
+            self._refresh()
+            return self._snapshot
+
+    async def aget(self) -> Optional[ModelConfigSnapshot]:
+        """
+        在事件循环中获取当前的模型配置，需要检查版本号时在线程中查询数据库，不阻塞事件循环
+        :return: 配置快照，数据库中没有配置时返回None
+        """
+        if self._fresh():
+            return self._snapshot
+        return await asyncio.to_thread(self.get)
+
+    def peek(self) -> Optional[ModelConfigSnapshot]:
+        """
+        只读取已缓存的配置快照，不查询数据库
+        :return: 配置快照，尚未加载或数据库中没有配置时返回None
+        """
+        return self._snapshot
+
+    def _fresh(self) -> bool:
+        """已加载且距上次检查版本号不超过 MODEL_CONFIG_CHECK_INTERVAL 秒"""
+        return self._loaded and time.monotonic() - self._checked_at < settings.MODEL_CONFIG_CHECK_INTERVAL
+
+    def _refresh(self) -> None:
+        """检查版本号，版本号变化或尚未加载时重新加载配置"""
+        db = SessionLocal()
+        try:
+            row = db.query(ConfigVersion.version).filter(ConfigVersion.name == MODEL_CONFIG).first()
+            version = row[0] if row else 0
+            if not self._loaded or self._snapshot is None or self._snapshot.version != version:
+                config = db.query(ModelConfig).first()
+                self._snapshot = ModelConfigSnapshot(config, version) if config else None
+                self.loads += 1
+                logger.info(f'从数据库加载配置: {self._snapshot}')
+            self._loaded = True
+        except Exception as e:
+            # 数据库暂时不可用时继续使用已缓存的配置
+            logger.error(f'加载配置失败: {str(e)}')
+        finally:
+            self._checked_at = time.monotonic()
+            db.close()
+
+    def stats(self) -> dict:
+        """缓存的配置版本号和从数据库加载配置的次数"""
+        return {"version": self._snapshot.version if self._snapshot else None, "loads": self.loads}
+
+    def invalidate(self) -> None:
+        """使缓存失效，下次获取时重新检查版本号；本进程修改配置后调用，修改立即生效"""
+        with self._lock:
+            self._loaded = False
+
+
+_cache: Optional[ModelConfigCache] = None
+
+
+def get_config_cache() -> ModelConfigCache:
+    """获取共享的模型配置缓存"""
+    global _cache
+    if _cache is None:
+        _cache = ModelConfigCache()
+    return _cache
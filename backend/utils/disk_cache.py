@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """基于SQLite的持久化LRU缓存，值以zlib压缩后存储，超出容量时按最近访问时间淘汰"""
+
+    def __init__(self, path: str, max_bytes: int, compress: bool = True):
+        """
+        初始化磁盘缓存
+        :param path: SQLite缓存文件路径
+        :param max_bytes: 缓存容量上限（按存储后的字节数计算）
+        :param compress: 是否使用zlib压缩缓存值
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        logger.info(f'磁盘缓存已打开: {path}, 容量上限: {max_bytes} 字节')
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        读取缓存值，命中时刷新访问时间
+        :param key: 缓存键
+        :return: 缓存值，未命中返回None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        value = row[0]
+        return zlib.decompress(value) if self.compress else value
+
+    def set(self, key: str, value: bytes) -> None:
+        """
+        写入缓存值，写入后按LRU淘汰超出容量的条目
+        :param key: 缓存键
+        :param value: 原始字节值
+        """
+        stored = zlib.compress(value, 6) if self.compress else value
+        if len(stored) > self.max_bytes:
+            logger.debug(f'缓存值过大，跳过写入: {key}, 大小: {len(stored)}')
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(stored), len(stored), time.time())
+            )
+            self._evict_locked()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """
+        批量读取缓存值，命中的条目刷新访问时间
+        :param keys: 缓存键列表
+        :return: {缓存键: 缓存值}，只包含命中的键
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            now = time.time()
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({placeholders})", part
+                ).fetchall()
+                found.update(rows)
+                self._conn.executemany(
+                    "UPDATE entries SET last_access = ? WHERE key = ?", ((now, key) for key, _ in rows)
+                )
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        if self.compress:
+            return {key: zlib.decompress(value) for key, value in found.items()}
+        return {key: bytes(value) for key, value in found.items()}
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        """
+        批量写入缓存值，写入后按LRU淘汰超出容量的条目
+        :param items: {缓存键: 原始字节值}
+        """
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            stored = zlib.compress(value, 6) if self.compress else value
+            if len(stored) <= self.max_bytes:
+                rows.append((key, sqlite3.Binary(stored), len(stored), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._evict_locked()
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """读取缓存的附加信息（如生成缓存值时使用的模型版本），不计入命中统计"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str) -> None:
+        """写入缓存的附加信息"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def delete(self, key: str) -> None:
+        """删除指定缓存条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            logger.info(f'磁盘缓存已清空: {self.path}')
+
+    def _evict_locked(self) -> None:
+        """按最近访问时间淘汰条目，直到总大小不超过容量上限（调用方需持有锁）"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access ASC LIMIT 32"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                self.evictions += 1
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        :return: 命中次数、未命中次数、命中率、条目数和占用空间
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes
+        }
@@ -5,83 +5,223 @@ from PIL import Image
 import io
 import logging
 import os
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 import fitz  # PyMuPDF
+import hashlib
+import threading
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from backend.core.config import OCR_LANGUAGES
+from backend.core.config import OCR_LANGUAGES, settings
+from backend.utils.disk_cache import DiskCache
+from backend.utils import ocr
 
 logger = logging.getLogger(__name__)
 
+# 文本提取逻辑版本，提取方式变化时递增以使旧的缓存失效
+TEXT_EXTRACTOR_VERSION = 3
+
+# PDF页面类型
+PAGE_TEXT = "text"  # 有文本层，直接提取
+PAGE_IMAGE = "image"  # 没有文本层但有图像（扫描页），需要OCR
+PAGE_MIXED = "mixed"  # 有文本层且大面积为图像，文本层之外再做OCR补充
+PAGE_EMPTY = "empty"  # 既没有文本层也没有图像
+
+
+def _text_cache_tag() -> str:
+    """
+    文本缓存的配置标识：提取逻辑版本、页面分类阈值、OCR分辨率和OCR配置，
+    任何一项变化都会使缓存失效
+    """
+    return f"{TEXT_EXTRACTOR_VERSION}|text{settings.PDF_MIN_TEXT_CHARS}|mixed{settings.PDF_MIXED_IMAGE_COVERAGE}|" \
+           f"dpi{settings.OCR_DPI}|{ocr._ocr_config_tag()}"
+
+
+def _classify_page(page) -> Dict[str, Any]:
+    """
+    提取页面文本层并判断页面类型
+    :param page: PyMuPDF页面
+    :return: {"text": 文本层, "kind": 页面类型, "image_coverage": 图像覆盖页面的比例}
+    """
+    text = page.get_text("text")
+    page_area = page.rect.get_area() or 1.0
+    image_area = 0.0
+    for info in page.get_image_info():
+        image_area += (fitz.Rect(info["bbox"]) & page.rect).get_area()
+    coverage = min(1.0, image_area / page_area)
+
+    if len(text.strip()) < settings.PDF_MIN_TEXT_CHARS:
+        kind = PAGE_IMAGE if coverage > 0 else PAGE_EMPTY
+    elif coverage >= settings.PDF_MIXED_IMAGE_COVERAGE:
+        kind = PAGE_MIXED
+    else:
+        kind = PAGE_TEXT
+    return {"text": text, "kind": kind, "image_coverage": coverage}
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """
+    在工作进程中提取连续若干页的文本层并分类，每个进程各自打开PDF文档
+    :param file_path: PDF文件路径
+    :param start: 起始页（从0开始，包含）
+    :param end: 结束页（不包含）
+    :return: 各页的分类结果
+    """
+    with fitz.open(file_path) as doc:
+        return [_classify_page(doc[i]) for i in range(start, end)]
+
+
+def _merge_ocr_text(text: str, ocr_text: str) -> str:
+    """将OCR结果中文本层没有的行追加到文本层之后"""
+    existing = {line.strip() for line in text.splitlines() if line.strip()}
+    extra = [line for line in ocr_text.splitlines() if line.strip() and line.strip() not in existing]
+    if not extra:
+        return text
+    return text.rstrip("\n") + "\n" + "\n".join(extra)
+
+
 class DocumentProcessor:
     """文档处理类，用于处理不同类型的文档"""
 
-    @staticmethod
-    def extract_text_from_pdf(file_path: str) -> str:
+    _text_cache: Optional[DiskCache] = None
+    _text_cache_lock = threading.Lock()
+    # (文件路径, 大小, 修改时间) -> 文件内容SHA-256，避免重复读取未变化的文件
+    _digest_memo = {}
+    # PDF逐页提取使用的进程池，首次处理大文档时创建
+    _pdf_pool: Optional[ProcessPoolExecutor] = None
+    _pdf_pool_lock = threading.Lock()
+    # PDF提取的累计统计
+    _extraction_stats = {"documents": 0, "pages": 0, "ocr_pages": 0, "ocr_seconds": 0.0, "total_seconds": 0.0}
+    _stats_lock = threading.Lock()
+
+    @classmethod
+    def _get_pdf_pool(cls) -> ProcessPoolExecutor:
+        """获取PDF提取进程池"""
+        if cls._pdf_pool is None:
+            with cls._pdf_pool_lock:
+                if cls._pdf_pool is None:
+                    workers = settings.PDF_EXTRACT_WORKERS or min(4, os.cpu_count() or 1)
+                    cls._pdf_pool = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                    logger.info(f"PDF提取进程池已创建，进程数: {workers}")
+        return cls._pdf_pool
+
+    @classmethod
+    def shutdown_pool(cls) -> None:
+        """关闭PDF提取进程池"""
+        with cls._pdf_pool_lock:
+            pool, cls._pdf_pool = cls._pdf_pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def _iter_classified_pages(cls, file_path: str) -> Iterator[Dict[str, Any]]:
         """
-        从PDF文件中提取文本，使用多种方法确保最佳提取效果
+        按页码顺序逐页产出文本层和页面类型，页数较多时按页段分发到进程池并行提取
+        :param file_path: PDF文件路径
+        :return: 各页分类结果的生成器
         """
+        with fitz.open(file_path) as doc:
+            page_count = doc.page_count
+            if page_count < settings.PDF_PARALLEL_MIN_PAGES:
+                for page in doc:
+                    yield _classify_page(page)
+                return
+
+        pool = cls._get_pdf_pool()
+        step = max(settings.PDF_PAGES_PER_TASK, 1)
+        futures = [
+            pool.submit(_extract_page_range, file_path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
         try:
-            text = ""
-            doc = fitz.open(file_path)
-            
-            # 1. 首先尝试使用PyMuPDF直接提取文本
-            for page in doc:
-                page_text = page.get_text("text")
-                if page_text.strip():
-                    text += page_text + "\n"
-            
-            # 如果成功提取到文本，直接返回
-            if text.strip():
-                return text
-                
-            # 2. 如果没有文本，尝试使用pdfplumber
-            import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            
-            # 如果pdfplumber成功提取到文本，返回结果
-            if text.strip():
-                return text
-            
-            # 3. 如果仍然没有文本，可能是扫描版PDF，使用OCR
-            from pdf2image import convert_from_path
-            import cv2
-            import numpy as np
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @classmethod
+    def iter_pdf_pages(cls, file_path: str, report: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        按页码顺序逐页产出PDF文本：每页按类型选择代价最低的提取方式，
+        有文本层的页面直接提取，扫描页做OCR，图文混排页在文本层之外用OCR补充；
+        需要OCR的页面提交到OCR进程池并行处理，前面的页面完成后即可产出，下游无需等待整个文档解析完成
+        :param file_path: PDF文件路径
+        :param report: 可选，传入字典时填充各类页面数量、OCR页数占比和OCR耗时
+        :return: 各页文本的生成器（无内容的页面产出空字符串）
+        """
+        report = report if report is not None else {}
+        report.update({
+            "pages": 0, PAGE_TEXT: 0, PAGE_IMAGE: 0, PAGE_MIXED: 0, PAGE_EMPTY: 0,
+            "ocr_pages": 0, "ocr_seconds": 0.0
+        })
+
+        def finish(page: Dict[str, Any], future) -> str:
+            if future is None:
+                return page["text"]
+            ocr_text, seconds, _ = future.result()
+            report["ocr_seconds"] += seconds
+            report["ocr_pages"] += 1
+            return ocr_text if page["kind"] == PAGE_IMAGE else _merge_ocr_text(page["text"], ocr_text)
+
+        pending = deque()
+        try:
+            for page_no, page in enumerate(cls._iter_classified_pages(file_path)):
+                report["pages"] += 1
+                report[page["kind"]] += 1
+                future = None
+                if page["kind"] in (PAGE_IMAGE, PAGE_MIXED):
+                    future = ocr.get_pipeline().submit(file_path, page_no)
+                pending.append((page, future))
+                # 按页码顺序产出已经完成的页面
+                while pending and (pending[0][1] is None or pending[0][1].done()):
+                    yield finish(*pending.popleft())
+            while pending:
+                yield finish(*pending.popleft())
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+        report["ocr_share"] = report["ocr_pages"] / report["pages"] if report["pages"] else 0.0
+
+    @classmethod
+    def extract_text_from_pdf(cls, file_path: str) -> str:
+        """
+        从PDF文件中提取文本：逐页分类后选择合适的提取方式，并记录OCR页数占比和耗时
+        """
+        try:
+            started = time.perf_counter()
+            report = {}
+            text = "".join(
+                page_text + "\n" for page_text in cls.iter_pdf_pages(file_path, report) if page_text.strip()
+            )
             
-            # 将PDF转换为图片
-            images = convert_from_path(file_path)
+            # 逐页提取没有得到任何文本时，再用pdfplumber尝试整个文档
+            if not text.strip():
+                import pdfplumber
+                parts = []
+                with pdfplumber.open(file_path) as pdf:
+                    for page in pdf.pages:
+                        page_text = page.extract_text()
+                        if page_text:
+                            parts.append(page_text + "\n")
+                text = "".join(parts)
             
-            for i, image in enumerate(images):
-                # 转换为OpenCV格式
-                img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                
-                # 图像预处理
-                # 1. 转换为灰度图
-                gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-                # 2. 二值化
-                _, binary = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                # 3. 降噪
-                denoised = cv2.fastNlMeansDenoising(binary)
-                
-                # 对处理后的图像进行OCR
-                for lang in OCR_LANGUAGES:
-                    try:
-                        page_text = pytesseract.image_to_string(
-                            Image.fromarray(denoised),
-                            lang=lang,
-                            config='--psm 1 --oem 3'
-                        )
-                        if page_text.strip():
-                            text += page_text + "\n"
-                            break
-                    except Exception as e:
-                        logger.warning(f"OCR处理失败 (页面 {i+1}, 语言: {lang}): {str(e)}")
-                        continue
+            report["total_seconds"] = time.perf_counter() - started
+            cls._record_extraction(report)
+            logger.info(
+                f"PDF提取完成: {file_path}, 页数: {report['pages']}, "
+                f"文本页/扫描页/混排页/空白页: {report[PAGE_TEXT]}/{report[PAGE_IMAGE]}/{report[PAGE_MIXED]}/{report[PAGE_EMPTY]}, "
+                f"OCR页数占比: {report['ocr_share']:.1%}, OCR耗时: {report['ocr_seconds']:.2f}秒, "
+                f"总耗时: {report['total_seconds']:.2f}秒"
+            )
             
             if not text.strip():
                 logger.warning(f"无法从PDF提取文本: {file_path}")
@@ -93,6 +233,30 @@ class DocumentProcessor:
             logger.error(f"PDF处理错误: {str(e)}")
             raise
 
+    @classmethod
+    def _record_extraction(cls, report: Dict[str, Any]) -> None:
+        """累计PDF提取统计"""
+        with cls._stats_lock:
+            stats = cls._extraction_stats
+            stats["documents"] += 1
+            stats["pages"] += report["pages"]
+            stats["ocr_pages"] += report["ocr_pages"]
+            stats["ocr_seconds"] += report["ocr_seconds"]
+            stats["total_seconds"] += report["total_seconds"]
+
+    @classmethod
+    def extraction_stats(cls) -> dict:
+        """
+        获取PDF提取的累计统计：文档数、页数、OCR页数占比和OCR耗时占比
+        """
+        with cls._stats_lock:
+            stats = dict(cls._extraction_stats)
+        stats["ocr_share"] = round(stats["ocr_pages"] / stats["pages"], 4) if stats["pages"] else 0.0
+        stats["ocr_time_share"] = round(stats["ocr_seconds"] / stats["total_seconds"], 4) if stats["total_seconds"] else 0.0
+        stats["ocr_seconds"] = round(stats["ocr_seconds"], 3)
+        stats["total_seconds"] = round(stats["total_seconds"], 3)
+        return stats
+
     @staticmethod
     def extract_text_from_docx(file_path: str) -> str:
         """
@@ -129,13 +293,88 @@ class DocumentProcessor:
             logger.error(f"DOC处理错误: {str(e)}")
             raise
 
+    @classmethod
+    def get_text_cache(cls) -> Optional[DiskCache]:
+        """
+        获取文本提取缓存，未启用时返回None
+        """
+        if not settings.TEXT_CACHE_ENABLED:
+            return None
+        if cls._text_cache is None:
+            with cls._text_cache_lock:
+                if cls._text_cache is None:
+                    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+                    cls._text_cache = DiskCache(
+                        os.path.join(base_dir, settings.TEXT_CACHE_PATH),
+                        max_bytes=settings.TEXT_CACHE_MAX_MB * 1024 * 1024
+                    )
+        return cls._text_cache
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """
+        获取文本提取缓存的统计信息
+        """
+        cache = cls.get_text_cache()
+        if cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **cache.stats()}
+
+    @classmethod
+    def file_digest(cls, file_path: str) -> str:
+        """
+        计算文件内容的SHA-256，文件大小和修改时间未变化时复用上次的结果
+        """
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        digest = cls._digest_memo.get(memo_key)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    sha256.update(block)
+            digest = sha256.hexdigest()
+            if len(cls._digest_memo) >= 4096:
+                cls._digest_memo.clear()
+            cls._digest_memo[memo_key] = digest
+        return digest
+
     @classmethod
     def process_document(cls, file_path: str) -> str:
         """
-        根据文件类型处理文档并提取文本
+        根据文件类型处理文档并提取文本，按文件内容哈希缓存提取结果
         """
         file_extension = os.path.splitext(file_path)[1].lower()
-        
+        if file_extension not in ('.pdf', '.docx', '.doc'):
+            raise ValueError(f"不支持的文件类型: {file_extension}")
+
+        cache = cls.get_text_cache()
+        cache_key = None
+        if cache is not None:
+            try:
+                cache_key = f"{_text_cache_tag()}:{cls.file_digest(file_path)}"
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    logger.debug(f"文本缓存命中: {file_path}")
+                    return cached.decode('utf-8')
+            except Exception as e:
+                logger.warning(f"读取文本缓存失败: {str(e)}")
+                cache_key = None
+
+        text = cls._extract_text(file_path, file_extension)
+
+        if cache_key and text:
+            try:
+                cache.set(cache_key, text.encode('utf-8'))
+            except Exception as e:
+                logger.warning(f"写入文本缓存失败: {str(e)}")
+        return text
+
+    @classmethod
+    def _extract_text(cls, file_path: str, file_extension: str) -> str:
+        """
+        按文件类型调用对应的提取方法
+        """
         if file_extension == '.pdf':
             return cls.extract_text_from_pdf(file_path)
         elif file_extension == '.docx':
@@ -0,0 +1,75 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+from backend.core.config import settings
+from backend.utils import encoders
+
+logger = logging.getLogger(__name__)
+
+# 进程池模式下每个工作进程各自持有的编码器
+_worker_encoder = None
+
+
+def _init_worker(backend: str, model_name: str, cache_dir: str) -> None:
+    """工作进程初始化：每个进程只加载一次模型"""
+    global _worker_encoder
+    _worker_encoder = encoders.create_encoder(backend, model_name, cache_dir)
+    logger.info(f'编码工作进程 {os.getpid()} 已加载模型，后端: {backend}')
+
+
+def _encode_in_worker(texts: List[str], batch_size: int) -> np.ndarray:
+    """在工作进程中编码一批文本"""
+    return _worker_encoder.encode(texts, batch_size=batch_size)
+
+
+class EncoderPool:
+    """
+    编码工作池，供异步接口把编码从事件循环中移出
+    thread 模式：多个线程共享进程内已加载的编码器（torch和onnxruntime推理时会释放GIL）
+    process 模式：每个工作进程各加载一份模型，适合多核CPU上的批量导入
+    """
+
+    def __init__(self, encoder, model_name: str):
+        """
+        :param encoder: 进程内已加载的编码器，thread 模式下直接使用
+        :param model_name: 模型名称，process 模式下工作进程按此加载模型
+        """
+        self.mode = settings.EMBEDDING_WORKER_MODE
+        self.workers = settings.EMBEDDING_WORKERS or min(4, os.cpu_count() or 1)
+        self._encoder = encoder
+
+        if self.mode == "process":
+            # 使用spawn启动，避免fork继承torch的线程状态
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(encoder.backend, model_name, os.path.abspath('./models'))
+            )
+        elif self.mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="encoder")
+        else:
+            raise ValueError(f"不支持的编码工作池模式: {self.mode}")
+        logger.info(f'编码工作池已创建，模式: {self.mode}, 工作数: {self.workers}')
+
+    async def encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """
+        在工作池中编码一批文本
+        :param texts: 文本列表
+        :param batch_size: 每批文本数
+        :return: 向量矩阵
+        """
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            return await loop.run_in_executor(self._executor, _encode_in_worker, texts, batch_size)
+        return await loop.run_in_executor(self._executor, self._encoder.encode, texts, batch_size)
+
+    def shutdown(self) -> None:
+        """关闭工作池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info('编码工作池已关闭')
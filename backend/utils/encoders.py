@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import logging
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 支持的编码后端
+BACKEND_TORCH = "torch"  # sentence-transformers 原始全精度模型
+BACKEND_TORCH_INT8 = "torch_int8"  # torch 动态量化（Linear层int8）
+BACKEND_ONNX = "onnx"  # 导出为ONNX后由onnxruntime推理
+BACKEND_ONNX_INT8 = "onnx_int8"  # ONNX模型再做int8动态量化
+ENCODER_BACKENDS = (BACKEND_TORCH, BACKEND_TORCH_INT8, BACKEND_ONNX, BACKEND_ONNX_INT8)
+
+# 一致性检查和性能测试使用的样例文本
+SAMPLE_TEXTS = [
+    "测试文本",
+    "本文研究了基于深度学习的中文文本分类方法，并在多个公开数据集上进行了实验。",
+    "The proposed method improves retrieval accuracy while reducing inference latency on CPU.",
+    "第一章 绪论 1.1 研究背景 随着信息技术的快速发展，学术论文的数量呈指数级增长。",
+    "实验结果表明，所提出的模型在准确率和召回率上均优于基线方法。",
+    "Keywords: plagiarism detection; sentence embedding; approximate nearest neighbor search",
+    "参考文献 [1] 张三, 李四. 学术论文质量评价研究[J]. 情报学报, 2020, 39(5): 1-10.",
+    "致谢 感谢导师在论文写作过程中给予的悉心指导。",
+]
+
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> List[List[int]]:
+    """
+    按文本长度降序排列后分批，使同一批次内的填充长度接近
+    :param texts: 文本列表
+    :param batch_size: 每批文本数
+    :return: 每批文本在原列表中的下标
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def _load_sentence_transformer(model_name: str, cache_dir: str):
+    """
+    加载（必要时下载）sentence-transformer模型
+    :param model_name: 模型名称
+    :param cache_dir: 模型缓存目录
+    :return: SentenceTransformer 实例
+    """
+    # 延迟导入，避免导入应用时加载torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(cache_dir, exist_ok=True)
+    logger.info(f'模型缓存目录：{cache_dir}')
+
+    # 检查缓存目录中是否已有模型文件
+    model_dir = os.path.join(cache_dir, model_name)
+    if os.path.isdir(model_dir) and any(f.endswith('.bin') for f in os.listdir(model_dir)):
+        logger.info(f'使用本地缓存的模型: {model_name}')
+    else:
+        logger.info(f'本地未找到模型文件，将从缓存或网络加载: {model_name}')
+
+    logger.info(f'开始加载模型: {model_name}')
+    model = SentenceTransformer(model_name, cache_folder=cache_dir)
+    logger.info('模型加载成功')
+    return model
+
+
+class TorchEncoder:
+    """基于 sentence-transformers 的编码器，可选对Linear层做int8动态量化"""
+
+    def __init__(self, model_name: str, cache_dir: str, quantize: bool = False):
+        """
+        :param model_name: 模型名称
+        :param cache_dir: 模型缓存目录
+        :param quantize: 是否做int8动态量化
+        """
+        self.model_name = model_name
+        self.backend = BACKEND_TORCH_INT8 if quantize else BACKEND_TORCH
+        # 一致性检查结果的缓存文件，torch后端本身即参考实现，不缓存
+        self.parity_cache_path = None
+        self.model = _load_sentence_transformer(model_name, cache_dir)
+        if quantize:
+            import torch
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            logger.info('模型已完成int8动态量化')
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        编码文本
+        :param texts: 文本列表
+        :param batch_size: 每批文本数
+        :return: 向量矩阵
+        """
+        return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+class OnnxEncoder:
+    """基于 onnxruntime 的编码器：首次使用时从 sentence-transformers 模型导出，之后推理不再依赖torch"""
+
+    def __init__(self, model_name: str, cache_dir: str, quantize: bool = False, onnx_dir: Optional[str] = None):
+        """
+        :param model_name: 模型名称
+        :param cache_dir: 模型缓存目录
+        :param quantize: 是否使用int8动态量化后的ONNX模型
+        :param onnx_dir: ONNX模型目录，默认为缓存目录下的 <模型名称>-onnx
+        """
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.backend = BACKEND_ONNX_INT8 if quantize else BACKEND_ONNX
+        onnx_dir = onnx_dir or os.path.join(cache_dir, f"{model_name}-onnx")
+        model_path = os.path.join(onnx_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            self._export(model_name, cache_dir, onnx_dir)
+
+        if quantize:
+            quantized_path = os.path.join(onnx_dir, "model_int8.onnx")
+            if not os.path.exists(quantized_path):
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                logger.info(f'开始对ONNX模型做int8动态量化: {quantized_path}')
+                quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+            model_path = quantized_path
+        self.model_path = model_path
+        # 一致性检查结果保存在ONNX模型旁边，模型文件不变时之后的启动不再加载torch做比对
+        self.parity_cache_path = os.path.join(onnx_dir, "parity.json")
+
+        with open(os.path.join(onnx_dir, "encoder_config.json"), 'r', encoding='utf-8') as f:
+            self.max_seq_length = json.load(f)["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.EMBEDDING_NUM_THREADS:
+            options.intra_op_num_threads = settings.EMBEDDING_NUM_THREADS
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f'ONNX模型加载成功: {model_path}')
+
+    @staticmethod
+    def _export(model_name: str, cache_dir: str, onnx_dir: str) -> None:
+        """
+        将 sentence-transformers 模型中的transformer部分导出为ONNX，并保存分词器
+        :param model_name: 模型名称
+        :param cache_dir: 模型缓存目录
+        :param onnx_dir: 导出目录
+        """
+        import torch
+
+        logger.info(f'开始导出ONNX模型: {onnx_dir}')
+        st_model = _load_sentence_transformer(model_name, cache_dir)
+        transformer = st_model[0].auto_model.eval()
+        tokenizer = st_model.tokenizer
+        os.makedirs(onnx_dir, exist_ok=True)
+
+        sample = tokenizer(["测试文本"], padding=True, truncation=True, return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in input_names),
+                os.path.join(onnx_dir, "model.onnx"),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        tokenizer.save_pretrained(onnx_dir)
+        with open(os.path.join(onnx_dir, "encoder_config.json"), 'w', encoding='utf-8') as f:
+            json.dump({"model_name": model_name, "max_seq_length": st_model.max_seq_length}, f)
+        logger.info('ONNX模型导出完成')
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        编码文本：分词后推理，按注意力掩码对词向量做均值池化（与原模型的Pooling层一致）
+        :param texts: 文本列表
+        :param batch_size: 每批文本数
+        :return: 向量矩阵
+        """
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: batch[name].astype(np.int64) for name in self._input_names if name in batch}
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            outputs.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+        return np.vstack(outputs).astype(np.float32)
+
+
+def create_encoder(backend: str, model_name: str, cache_dir: str):
+    """
+    按后端名称创建编码器
+    :param backend: torch / torch_int8 / onnx / onnx_int8
+    :param model_name: 模型名称
+    :param cache_dir: 模型缓存目录
+    :return: 提供 encode(texts, batch_size) 方法的编码器
+    """
+    if backend == BACKEND_TORCH:
+        return TorchEncoder(model_name, cache_dir)
+    if backend == BACKEND_TORCH_INT8:
+        return TorchEncoder(model_name, cache_dir, quantize=True)
+    if backend in (BACKEND_ONNX, BACKEND_ONNX_INT8):
+        return OnnxEncoder(model_name, cache_dir, quantize=backend == BACKEND_ONNX_INT8,
+                           onnx_dir=settings.EMBEDDING_ONNX_DIR or None)
+    raise ValueError(f"不支持的编码后端: {backend}")
+
+
+def check_parity(encoder, reference, texts: Optional[List[str]] = None,
+                 min_cosine: Optional[float] = None) -> Dict[str, Any]:
+    """
+    检查编码器与参考编码器（通常为torch后端）输出向量的一致性
+    :param encoder: 待检查的编码器
+    :param reference: 参考编码器
+    :param texts: 用于比较的文本，默认使用内置样例
+    :param min_cosine: 每条文本余弦相似度的下限，默认取 EMBEDDING_PARITY_MIN_COSINE
+    :return: 最小/平均余弦相似度和是否通过
+    """
+    texts = texts or SAMPLE_TEXTS
+    min_cosine = settings.EMBEDDING_PARITY_MIN_COSINE if min_cosine is None else min_cosine
+    a = encoder.encode(texts)
+    b = reference.encode(texts)
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+    result = {
+        "backend": getattr(encoder, "backend", None),
+        "reference": getattr(reference, "backend", None),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "threshold": min_cosine,
+        "passed": bool(cosines.min() >= min_cosine)
+    }
+    log = logger.info if result["passed"] else logger.warning
+    log(f'编码一致性检查: {result}')
+    return result
+
+
+def _parity_fingerprint(encoder, min_cosine: float) -> Dict[str, Any]:
+    """一致性检查结果对应的模型文件（大小和修改时间）和阈值，任何一项变化时需要重新检查"""
+    stat = os.stat(encoder.model_path)
+    return {
+        "model_file": os.path.basename(encoder.model_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "threshold": min_cosine
+    }
+
+
+def verify_parity(encoder, model_name: str, cache_dir: str) -> bool:
+    """
+    检查非torch后端与torch后端输出是否一致：ONNX后端导出或量化后首次加载时比对一次，
+    结果缓存在ONNX模型目录中，之后的启动直接读取缓存，不再加载torch模型
+    :param encoder: 待检查的编码器
+    :param model_name: 模型名称，用于加载torch参考编码器
+    :param cache_dir: 模型缓存目录
+    :return: 是否通过
+    """
+    min_cosine = settings.EMBEDDING_PARITY_MIN_COSINE
+    cache_path = getattr(encoder, "parity_cache_path", None)
+    fingerprint = None
+    cached = {}
+    if cache_path:
+        fingerprint = _parity_fingerprint(encoder, min_cosine)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        entry = cached.get(encoder.backend)
+        if entry and entry.get("fingerprint") == fingerprint:
+            logger.info(f'使用缓存的编码一致性检查结果: {entry["result"]}')
+            return entry["result"]["passed"]
+
+    reference = create_encoder(BACKEND_TORCH, model_name, cache_dir)
+    result = check_parity(encoder, reference, min_cosine=min_cosine)
+    if cache_path:
+        cached[encoder.backend] = {"fingerprint": fingerprint, "result": result}
+        try:
+            with open(cache_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(cached, f, ensure_ascii=False, indent=2)
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError as e:
+            logger.warning(f'保存编码一致性检查结果失败: {str(e)}')
+    return result["passed"]
+
+
+def benchmark(backends: List[str], model_name: str, cache_dir: str,
+              texts: Optional[List[str]] = None, batch_size: int = 32, repeats: int = 3) -> List[Dict[str, Any]]:
+    """
+    测试各编码后端的加载时间和吞吐量，并与torch后端做一致性检查
+    :param backends: 要测试的后端列表
+    :param model_name: 模型名称
+    :param cache_dir: 模型缓存目录
+    :param texts: 测试文本，默认将内置样例重复到256条
+    :param batch_size: 每批文本数
+    :param repeats: 重复次数，取最快一次
+    :return: 每个后端的测试结果
+    """
+    texts = texts or (SAMPLE_TEXTS * (256 // len(SAMPLE_TEXTS)))
+    reference = None
+    results = []
+    for backend in backends:
+        started = time.perf_counter()
+        encoder = create_encoder(backend, model_name, cache_dir)
+        load_seconds = time.perf_counter() - started
+
+        encoder.encode(texts[:batch_size], batch_size=batch_size)  # 预热
+        best = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            encoder.encode(texts, batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        if backend == BACKEND_TORCH:
+            reference = encoder
+        elif reference is None:
+            reference = create_encoder(BACKEND_TORCH, model_name, cache_dir)
+        parity = check_parity(encoder, reference) if encoder is not reference else None
+
+        results.append({
+            "backend": backend,
+            "load_seconds": round(load_seconds, 3),
+            "texts_per_second": round(len(texts) / best, 1),
+            "min_cosine": parity["min_cosine"] if parity else 1.0,
+            "parity_passed": parity["passed"] if parity else True
+        })
+        logger.info(f'编码后端性能: {results[-1]}')
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="编码后端一致性检查和性能测试")
+    parser.add_argument("--backends", default=",".join(ENCODER_BACKENDS), help="逗号分隔的后端列表")
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--cache-dir", default=os.path.abspath('./models'))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    for row in benchmark(args.backends.split(","), args.model, args.cache_dir,
+                         batch_size=args.batch_size, repeats=args.repeats):
+        print(json.dumps(row, ensure_ascii=False))
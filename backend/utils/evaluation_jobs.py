@@ -0,0 +1,815 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from backend.core.config import settings
+from backend.database import SessionLocal, EvaluationJob, Evaluation, Paper, PaperType
+from backend.knowledge import KnowledgeBase
+from backend.utils.document_processor import DocumentProcessor
+from backend.utils.ollama_client import AsyncOllamaClient, GenerationMetrics
+from backend.utils.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+# 评价阶段及各阶段开始时的进度
+STAGE_EXTRACT = "extract"
+STAGE_REFERENCES = "references"
+STAGE_HISTORICAL = "historical"
+STAGE_GENERATE = "generate"
+STAGE_SAVE = "save"
+_STAGE_PROGRESS = {
+    STAGE_EXTRACT: 0.0,
+    STAGE_REFERENCES: 0.1,
+    STAGE_HISTORICAL: 0.2,
+    STAGE_GENERATE: 0.35,
+    STAGE_SAVE: 0.95
+}
+
+# 推送给客户端的事件类型
+EVENT_SNAPSHOT = "snapshot"
+EVENT_STAGE = "stage"
+EVENT_TOKEN = "token"
+EVENT_RESULT = "result"
+EVENT_ERROR = "error"
+
+# 生成阶段按已输出的token数估算进度时使用的预期长度
+_EXPECTED_TOKENS = 2000
+
+# 每次写入数据库时预留的事件ID数：模型输出只定期保存，保存的是已分配ID的上限，
+# 进程退出后重新执行的任务从该上限继续编号，不会重复使用已发出的事件ID
+_EVENT_ID_RESERVE = 1000
+
+ollama_client = AsyncOllamaClient()
+
+
+class EvaluationProgress:
+    """评价进度回调，默认不做任何处理（同步评价接口使用）"""
+
+    async def stage(self, stage: str) -> None:
+        """进入新的评价阶段"""
+
+    @property
+    def on_token(self) -> Optional[Callable[[str], None]]:
+        """模型输出回调，可能在工作线程中调用；为None时不使用流式生成"""
+        return None
+
+
+def _load_reference_texts() -> List[str]:
+    """读取知识库中的全部文档作为参考文献"""
+    db = SessionLocal()
+    try:
+        reference_texts = []
+        for item in db.query(KnowledgeBase).all():
+            try:
+                text = DocumentProcessor.process_document(item.file_path)
+                if text:
+                    reference_texts.append(text)
+            except Exception as e:
+                logger.error(f'读取参考文献失败 (ID: {item.id}): {str(e)}')
+                continue
+        logger.info(f'获取到 {len(reference_texts)} 篇参考文献')
+        return reference_texts
+    finally:
+        db.close()
+
+
+def _collect_historical(paper_type: PaperType, hits: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    根据检索结果查找历史论文记录，判断可能的抄袭，并提取最相似论文的文本
+    :param paper_type: 论文类型
+    :param hits: search_documents 的检索结果
+    :return: (最相似的历史论文列表, 抄袭检测结果列表)
+    """
+    historical_papers = []
+    plagiarism_results = []
+    if not hits:
+        return historical_papers, plagiarism_results
+
+    db = SessionLocal()
+    try:
+        # 根据向量ID查找对应的论文记录
+        hit_papers = {
+            p.vector: p for p in db.query(Paper).filter(
+                Paper.paper_type == paper_type,
+                Paper.vector.in_([str(hit["doc_id"]) for hit in hits])
+            ).all()
+        }
+    finally:
+        db.close()
+
+    for hit in hits:
+        doc_id = hit["doc_id"]
+        similarity = hit["similarity"]
+        hist_paper = hit_papers.get(str(doc_id))
+        if not hist_paper:
+            logger.warning(f'向量 {doc_id} 没有对应的论文记录，跳过')
+            continue
+
+        logger.info(f'论文相似度: 当前论文 vs {hist_paper.title} = {similarity}, 相似片段占比 = {hit["coverage"]}')
+
+        # 足够比例的文本块与该论文高度相似时视为可能抄袭
+        if hit["matched_chunks"] and hit["coverage"] >= settings.PLAGIARISM_MIN_COVERAGE:
+            plagiarism_results.append({
+                "paper_id": hist_paper.id,
+                "title": hist_paper.title,
+                "similarity": similarity,
+                "max_similarity": hit["max_similarity"],
+                "coverage": hit["coverage"]
+            })
+            logger.warning(f'检测到可能的抄袭: 当前论文 vs {hist_paper.title} = {similarity}, 相似片段占比 = {hit["coverage"]}')
+
+        # 只为最相似的前5篇论文提取文本作为参考
+        if len(historical_papers) >= 5:
+            continue
+        try:
+            # 跳过不存在的文件
+            if not os.path.exists(hist_paper.file_path):
+                logger.warning(f'历史论文文件不存在: {hist_paper.file_path}')
+                continue
+
+            hist_text = DocumentProcessor.process_document(hist_paper.file_path)
+            if not hist_text:
+                logger.warning(f'无法提取历史论文内容: {hist_paper.id}')
+                continue
+
+            historical_papers.append({
+                "id": hist_paper.id,
+                "title": hist_paper.title,
+                "text": hist_text,
+                "similarity": similarity
+            })
+        except Exception as e:
+            logger.error(f'处理历史论文失败 (ID: {hist_paper.id}): {str(e)}')
+            continue
+
+    return historical_papers, plagiarism_results
+
+
+def _format_comments(evaluation: Dict[str, Any]) -> Tuple[float, str, Dict[str, Any], Dict[str, Any]]:
+    """
+    验证模型返回的评价结果，并整理为完整的评语
+    :return: (总分, 完整评语, 抄袭检测结果, 历史比较结果)
+    """
+    score = evaluation.get('score')
+    if not isinstance(score, (int, float)):
+        raise ValueError(f'评价分数格式错误: {type(score)}')
+    if not (65 <= float(score) <= 98):
+        raise ValueError(f'评价分数超出范围: {score}')
+
+    overall_comments = evaluation.get('overall_comments')
+    if not isinstance(overall_comments, str) or len(overall_comments.strip()) < 50:
+        raise ValueError('总体评价不能为空或过短')
+
+    # 检查抄袭检测和历史比较结果
+    plagiarism_check = evaluation.get('plagiarism_check', {})
+    if not isinstance(plagiarism_check, dict):
+        plagiarism_check = {
+            'is_plagiarized': False,
+            'comments': '未检测到抄袭问题'
+        }
+
+    historical_comparison = evaluation.get('historical_comparison', {})
+    if not isinstance(historical_comparison, dict):
+        historical_comparison = {
+            'improvement': 'unchanged',
+            'comments': '与历史论文相比无显著变化'
+        }
+
+    # 检查各部分评价
+    sections = {
+        'academic_evaluation': '学术评价',
+        'ethical_evaluation': '伦理评价',
+        'technical_analysis': '技术分析',
+        'format_evaluation': '格式评价'
+    }
+
+    detailed_comments = []
+    for section_name, section_title in sections.items():
+        section = evaluation.get(section_name)
+        if not isinstance(section, dict):
+            raise ValueError(f'{section_title}格式错误')
+
+        section_comments = []
+        for criterion, data in section.items():
+            if not isinstance(data, dict):
+                raise ValueError(f'{section_title}.{criterion}格式错误')
+
+            subscore = data.get('score')
+            comments = data.get('comments')
+
+            if not isinstance(subscore, (int, float)) or not (1 <= float(subscore) <= 10):
+                raise ValueError(f'{section_title}.{criterion}分数超出范围: {subscore}')
+            if not isinstance(comments, str) or not comments.strip():
+                raise ValueError(f'{section_title}.{criterion}评语不能为空')
+
+            section_comments.append(f'{criterion}: {comments.strip()}')
+
+        detailed_comments.append(f'\n{section_title}:\n' + '\n'.join(section_comments))
+
+    # 添加抄袭检测和历史比较结果
+    plagiarism_text = f"\n\n抄袭检测:\n检测结果: {'可能存在抄袭' if plagiarism_check.get('is_plagiarized') else '未发现抄袭问题'}\n评语: {plagiarism_check.get('comments', '')}"
+
+    historical_text = f"\n\n与历史论文比较:\n水平变化: {historical_comparison.get('improvement', 'unchanged')}\n评语: {historical_comparison.get('comments', '')}"
+
+    full_comments = overall_comments + '\n\n详细评价:\n' + '\n'.join(detailed_comments) + plagiarism_text + historical_text
+    logger.info(f'评价结果: 分数={score}, 评语长度={len(full_comments)}')
+    return float(score), full_comments, plagiarism_check, historical_comparison
+
+
+def _save_evaluation(paper_type: PaperType,
+                     target_file: str,
+                     target_path: str,
+                     model_name: str,
+                     evaluation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    保存论文记录和评价记录
+    :return: 评价接口返回的结果
+    """
+    score, full_comments, plagiarism_check, historical_comparison = _format_comments(evaluation)
+
+    db = SessionLocal()
+    try:
+        # 创建论文记录
+        paper = Paper(
+            title=target_file,  # 暂时使用文件名作为标题
+            file_path=target_path,
+            paper_type=paper_type,
+            status='pending'
+        )
+        db.add(paper)
+        db.flush()
+
+        # 创建评价记录
+        record = Evaluation(
+            paper_id=paper.id,
+            score=score,
+            comments=full_comments,
+            model_name=model_name
+        )
+        db.add(record)
+        db.commit()
+        logger.info(f'评价结果已保存到数据库, 论文ID: {paper.id}, 评价ID: {record.id}')
+
+        return {
+            'id': record.id,
+            'paper_id': record.paper_id,
+            'paper_title': paper.title,
+            'paper_type': paper_type.value,
+            'score': record.score,
+            'comments': record.comments,  # 直接使用完整的评价内容
+            'model_name': record.model_name,
+            'plagiarism_check': {
+                'is_plagiarized': plagiarism_check.get('is_plagiarized', False),
+                'comments': plagiarism_check.get('comments', '')
+            },
+            'historical_comparison': {
+                'improvement': historical_comparison.get('improvement', 'unchanged'),
+                'comments': historical_comparison.get('comments', '')
+            },
+            'message': '论文评价完成'
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_evaluation(paper_type: PaperType,
+                         target_file: str,
+                         target_path: str,
+                         model_name: str,
+                         progress: Optional[EvaluationProgress] = None) -> Dict[str, Any]:
+    """
+    执行论文评价：提取文本 → 读取参考文献 → 检索历史论文 → 模型评价 → 保存结果。
+    阻塞操作都在线程中执行，不阻塞事件循环
+    :param paper_type: 论文类型
+    :param target_file: 论文文件名
+    :param target_path: 论文文件路径
+    :param model_name: 评价使用的模型
+    :param progress: 进度回调
+    :return: 评价结果
+    """
+    progress = progress or EvaluationProgress()
+
+    # 读取文件内容
+    await progress.stage(STAGE_EXTRACT)
+    try:
+        paper_text = await asyncio.to_thread(DocumentProcessor.process_document, target_path)
+        if not paper_text:
+            raise ValueError('无法提取文件内容')
+    except Exception as e:
+        logger.error(f'读取文件内容失败: {str(e)}')
+        raise HTTPException(
+            status_code=400,
+            detail=f'读取文件内容失败: {str(e)}'
+        )
+
+    # 获取参考文献
+    await progress.stage(STAGE_REFERENCES)
+    try:
+        reference_texts = await asyncio.to_thread(_load_reference_texts)
+    except Exception as e:
+        logger.error(f'获取参考文献失败: {str(e)}')
+        raise HTTPException(
+            status_code=500,
+            detail=f'获取参考文献失败: {str(e)}'
+        )
+
+    # 获取同类型的历年论文作为比对材料
+    await progress.stage(STAGE_HISTORICAL)
+    try:
+        # 当前论文切分为文本块编码一次，逐块检索同类型的历史论文并按文档聚合
+        vector_store = VectorStore()
+        query_vectors = await vector_store.aencode_document(paper_text)
+        hits = await asyncio.to_thread(
+            vector_store.search_documents,
+            query_vectors,
+            top_k=settings.SIMILARITY_SEARCH_TOP_K,
+            filter={"paper_type": paper_type.value}
+        )
+        logger.info(f'从向量索引中检索到 {len(hits)} 篇同类型历史论文')
+        historical_papers, plagiarism_results = await asyncio.to_thread(_collect_historical, paper_type, hits)
+        logger.info(f'选择了 {len(historical_papers)} 篇最相似的历史论文作为参考')
+    except Exception as e:
+        logger.error(f'获取历史论文失败: {str(e)}')
+        # 不中断评价流程，只记录错误
+        historical_papers, plagiarism_results = [], []
+
+    logger.info(f'最终获取到 {len(reference_texts)} 篇知识库参考文献和 {len(historical_papers)} 篇历史论文')
+
+    # 评价论文
+    try:
+        await progress.stage(STAGE_GENERATE)
+        metrics = GenerationMetrics()
+        evaluation = await ollama_client.evaluate_paper(
+            paper_text=paper_text,
+            paper_type=paper_type,
+            reference_texts=reference_texts,
+            historical_papers=historical_papers,
+            plagiarism_results=plagiarism_results,
+            model_name=model_name,
+            on_token=progress.on_token,
+            metrics=metrics
+        )
+
+        await progress.stage(STAGE_SAVE)
+        result = await asyncio.to_thread(_save_evaluation, paper_type, target_file, target_path, model_name, evaluation)
+        # 首个token耗时和生成速度随结果返回
+        result['generation'] = metrics.to_dict()
+        return result
+
+    except asyncio.CancelledError:
+        logger.info(f'评价已取消: {target_file}')
+        raise
+    except ValueError as e:
+        logger.error(f'评价论文失败: {str(e)}')
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f'评价过程发生未知错误: {str(e)}')
+        raise HTTPException(
+            status_code=500,
+            detail=f'评价失败: {str(e)}'
+        )
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """将事件转换为 Server-Sent Events 格式"""
+    data = json.dumps(event["data"], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class StreamProgress(EvaluationProgress):
+    """同步评价接口的流式进度：阶段和模型输出按顺序放入队列，由接口边生成边推送给客户端"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._event_id = 0
+
+    async def stage(self, stage: str) -> None:
+        self._put(EVENT_STAGE, {"stage": stage, "progress": _STAGE_PROGRESS[stage]})
+
+    @property
+    def on_token(self) -> Callable[[str], None]:
+        return self._token
+
+    def _token(self, text: str) -> None:
+        self._loop.call_soon_threadsafe(self._put, EVENT_TOKEN, {"text": text})
+
+    def _put(self, event_type: str, data: Optional[Dict[str, Any]]) -> None:
+        self._event_id += 1
+        self._queue.put_nowait({"id": self._event_id, "type": event_type, "data": data})
+
+    async def run(self, evaluation: Awaitable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        执行评价并依次产出事件，最后一个事件为结果或错误；迭代中途停止（客户端断开）时取消评价
+        :param evaluation: run_evaluation 协程，progress 参数为本对象
+        :return: 事件的异步迭代器，每个事件为 {"id", "type", "data"}
+        """
+        task = asyncio.ensure_future(evaluation)
+        # 评价结束后放入结束标记，排在之前的所有事件之后
+        task.add_done_callback(lambda _: self._loop.call_soon(self._queue.put_nowait, None))
+        try:
+            while True:
+                event = await self._queue.get()
+                if event is None:
+                    break
+                yield event
+
+            try:
+                result = task.result()
+            except HTTPException as e:
+                self._put(EVENT_ERROR, {"status": STATUS_FAILED, "error": str(e.detail)})
+            except Exception as e:
+                logger.exception(e)
+                self._put(EVENT_ERROR, {"status": STATUS_FAILED, "error": str(e)})
+            else:
+                self._put(EVENT_RESULT, {"status": STATUS_SUCCEEDED, "result": result})
+            yield self._queue.get_nowait()
+        finally:
+            if not task.done():
+                logger.info('客户端已断开连接，取消正在进行的评价')
+                task.cancel()
+
+
+def job_to_dict(job: EvaluationJob) -> Dict[str, Any]:
+    """
+    将评价任务转换为接口返回的字典
+    :param job: 评价任务
+    :return: 任务状态字典，result 为解析后的评价结果
+    """
+    return {
+        "id": job.id,
+        "paper_type": job.paper_type,
+        "file_name": job.file_name,
+        "model_name": job.model_name,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": round(job.progress or 0.0, 4),
+        "partial_output": job.partial_output or "",
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "last_event_id": job.last_event_id or 0,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class _JobChannel:
+    """单个运行中任务的事件记录：事件ID从 base+1 递增，断线重连的客户端按ID补发错过的事件"""
+
+    def __init__(self, base: int = 0):
+        """
+        :param base: 之前执行时已分配的事件ID上限，本次执行的事件ID从其后开始
+        """
+        self.base = base
+        self.reserved = base
+        self.events: List[Dict[str, Any]] = []
+        self.state: Dict[str, Any] = {"status": STATUS_QUEUED, "stage": None, "progress": 0.0}
+        self.output: List[str] = []
+        self.tokens = 0
+        self.finished = False
+        self.flushed_at = 0.0
+        self.flushing = False
+        # 进行中的输出保存任务，保留引用避免被回收，任务结束时等待其完成
+        self.flush_task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def last_id(self) -> int:
+        """最后一个事件的ID"""
+        return self.base + len(self.events)
+
+    def reservation(self) -> int:
+        """在当前事件ID之后预留一段，返回要写入数据库的ID上限；写入成功后再调用 confirm"""
+        return self.last_id + _EVENT_ID_RESERVE
+
+    def confirm(self, reserved: int) -> None:
+        """记录已写入数据库的事件ID上限（写入失败时不调用，之后的输出会继续尝试提前保存）"""
+        self.reserved = max(self.reserved, reserved)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> None:
+        self.events.append({"id": self.last_id + 1, "type": event_type, "data": data})
+        # 唤醒所有等待中的订阅者，之后的等待使用新的事件对象
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+    def close(self) -> None:
+        """任务结束，唤醒订阅者让事件流结束"""
+        self.finished = True
+        self._changed.set()
+
+
+class _JobProgress(EvaluationProgress):
+    """评价任务的进度回调：记录阶段和进度，并把模型输出推送给订阅者"""
+
+    def __init__(self, manager: 'EvaluationJobManager', job_id: int, loop: asyncio.AbstractEventLoop):
+        self._manager = manager
+        self._job_id = job_id
+        self._loop = loop
+
+    async def stage(self, stage: str) -> None:
+        await self._manager._set_stage(self._job_id, stage)
+
+    @property
+    def on_token(self) -> Callable[[str], None]:
+        return self._token
+
+    def _token(self, text: str) -> None:
+        # 可能在工作线程中调用，统一转到事件循环中处理
+        self._loop.call_soon_threadsafe(self._manager._on_token, self._job_id, text)
+
+
+class EvaluationJobManager:
+    """
+    异步评价任务：任务和结果保存在数据库中，运行中的任务在内存中保留事件记录，
+    客户端通过 SSE 或 WebSocket 订阅阶段进度和模型输出，断线后按最后收到的事件ID恢复
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        """
+        :param workers: 同时执行的任务数，默认取 EVALUATION_JOB_WORKERS
+        """
+        self.workers = workers or settings.EVALUATION_JOB_WORKERS
+        self._channels: Dict[int, _JobChannel] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def start(self) -> None:
+        """恢复上次退出时未完成的任务（从头执行，文本提取和编码会命中缓存）"""
+        self._slots = asyncio.Semaphore(self.workers)
+        jobs = await asyncio.to_thread(self._unfinished_jobs)
+        for job_id, last_event_id in jobs:
+            self._launch(job_id, last_event_id)
+        if jobs:
+            logger.info(f"已恢复 {len(jobs)} 个未完成的评价任务")
+
+    async def stop(self) -> None:
+        """取消运行中的任务，任务保留为未完成状态，下次启动时重新执行"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, db, paper_type: PaperType, target_file: str, target_path: str, model_name: str) -> EvaluationJob:
+        """
+        创建评价任务并开始执行
+        :param db: 数据库会话
+        :param paper_type: 论文类型
+        :param target_file: 论文文件名
+        :param target_path: 论文文件路径
+        :param model_name: 评价使用的模型
+        :return: 评价任务
+        """
+        job = EvaluationJob(
+            paper_type=paper_type.value,
+            file_name=target_file,
+            file_path=target_path,
+            model_name=model_name,
+            status=STATUS_QUEUED
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._launch(job.id)
+        return job
+
+    @staticmethod
+    def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        查询评价任务
+        :param job_id: 任务ID
+        :return: 任务状态字典，不存在时返回None
+        """
+        db = SessionLocal()
+        try:
+            job = db.query(EvaluationJob).filter(EvaluationJob.id == job_id).first()
+            return job_to_dict(job) if job else None
+        finally:
+            db.close()
+
+    async def events(self, job_id: int, last_event_id: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        订阅任务事件：首次连接先收到当前状态的快照，之后依次收到阶段、模型输出和最终结果；
+        提供 last_event_id 时只补发之后的事件。任务结束后事件流结束
+        :param job_id: 任务ID
+        :param last_event_id: 客户端最后收到的事件ID
+        """
+        job = await asyncio.to_thread(self.get_job, job_id)
+        if job is None:
+            return
+        channel = self._channels.get(job_id)
+        if channel is None or last_event_id is None or not channel.base <= last_event_id <= channel.last_id:
+            # 快照和事件位置在同一时刻读取，之后的事件不会遗漏或重复
+            if channel is None:
+                yield {"id": job["last_event_id"], "type": EVENT_SNAPSHOT, "data": job}
+                return
+            job.update(channel.state)
+            job["partial_output"] = "".join(channel.output)
+            job["last_event_id"] = channel.last_id
+            yield {"id": channel.last_id, "type": EVENT_SNAPSHOT, "data": job}
+            cursor = len(channel.events)
+        else:
+            cursor = last_event_id - channel.base
+
+        while True:
+            while cursor < len(channel.events):
+                event = channel.events[cursor]
+                cursor += 1
+                yield event
+            if channel.finished:
+                return
+            await channel.wait()
+
+    def _launch(self, job_id: int, last_event_id: int = 0) -> None:
+        self._channels[job_id] = _JobChannel(last_event_id or 0)
+        task = asyncio.create_task(self._run(job_id), name=f"evaluation-{job_id}")
+        self._tasks[job_id] = task
+
+    @staticmethod
+    def _unfinished_jobs() -> List[Tuple[int, int]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(EvaluationJob.id, EvaluationJob.last_event_id).filter(
+                EvaluationJob.status.in_([STATUS_QUEUED, STATUS_RUNNING])
+            ).order_by(EvaluationJob.id).all()
+            return [(job_id, last_event_id) for job_id, last_event_id in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load_params(job_id: int) -> Tuple[PaperType, str, str, str]:
+        db = SessionLocal()
+        try:
+            job = db.query(EvaluationJob).filter(EvaluationJob.id == job_id).first()
+            return PaperType(job.paper_type), job.file_name, job.file_path, job.model_name
+        finally:
+            db.close()
+
+    @staticmethod
+    def _update_job(job_id: int, **values) -> None:
+        """更新任务字段"""
+        db = SessionLocal()
+        try:
+            values["updated_at"] = datetime.utcnow()
+            db.query(EvaluationJob).filter(EvaluationJob.id == job_id).update(values, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _run(self, job_id: int) -> None:
+        """执行评价任务并记录结果"""
+        channel = self._channels[job_id]
+        try:
+            async with self._slots:
+                # 任何异常都使任务结束为失败状态并通知订阅者，避免任务一直停留在排队或运行中
+                try:
+                    params = await asyncio.to_thread(self._load_params, job_id)
+                    channel.state["status"] = STATUS_RUNNING
+                    reserved = channel.reservation()
+                    await asyncio.to_thread(
+                        self._update_job, job_id, status=STATUS_RUNNING, partial_output=None, error=None,
+                        last_event_id=reserved
+                    )
+                    channel.confirm(reserved)
+                    logger.info(f"开始评价任务 {job_id}: {params[1]}")
+
+                    progress = _JobProgress(self, job_id, asyncio.get_running_loop())
+                    result = await run_evaluation(*params, progress=progress)
+                except asyncio.CancelledError:
+                    raise
+                except HTTPException as e:
+                    await self._finish(job_id, error=str(e.detail))
+                except Exception as e:
+                    logger.exception(e)
+                    await self._finish(job_id, error=str(e) or type(e).__name__)
+                else:
+                    await self._finish(job_id, result=result)
+        except asyncio.CancelledError:
+            logger.info(f"评价任务 {job_id} 已中断，将在下次启动时重新执行")
+            raise
+        finally:
+            channel.close()
+            if channel.flush_task is not None:
+                await asyncio.gather(channel.flush_task, return_exceptions=True)
+            self._channels.pop(job_id, None)
+            self._tasks.pop(job_id, None)
+
+    async def _finish(self, job_id: int, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        """保存任务结果并通知订阅者"""
+        channel = self._channels[job_id]
+        now = datetime.utcnow()
+        # 结束事件的ID即为最终的事件ID
+        values = {"partial_output": "".join(channel.output), "finished_at": now, "last_event_id": channel.last_id + 1}
+        try:
+            if error is None:
+                values.update(status=STATUS_SUCCEEDED, progress=1.0, result=json.dumps(result, ensure_ascii=False))
+            else:
+                logger.error(f"评价任务 {job_id} 失败: {error}")
+                values.update(status=STATUS_FAILED, error=error)
+            await asyncio.to_thread(self._update_job, job_id, **values)
+        except Exception as e:
+            logger.error(f"保存评价任务结果失败: {str(e)}")
+
+        channel.state["status"] = values["status"]
+        if error is None:
+            channel.state["progress"] = 1.0
+            channel.publish(EVENT_RESULT, {"status": STATUS_SUCCEEDED, "result": result})
+        else:
+            channel.publish(EVENT_ERROR, {"status": STATUS_FAILED, "error": error})
+
+    async def _set_stage(self, job_id: int, stage: str) -> None:
+        """记录任务进入新阶段"""
+        channel = self._channels[job_id]
+        channel.state.update(stage=stage, progress=_STAGE_PROGRESS[stage])
+        channel.publish(EVENT_STAGE, {"stage": stage, "progress": _STAGE_PROGRESS[stage]})
+        reserved = channel.reservation()
+        await asyncio.to_thread(
+            self._update_job, job_id, stage=stage, progress=_STAGE_PROGRESS[stage], last_event_id=reserved
+        )
+        channel.confirm(reserved)
+
+    def _on_token(self, job_id: int, text: str) -> None:
+        """收到模型输出：推送给订阅者，并定期写入数据库供断线恢复"""
+        channel = self._channels.get(job_id)
+        if channel is None or channel.finished:
+            return
+        channel.output.append(text)
+        channel.tokens += 1
+        # 生成阶段的进度按已输出的token数估算
+        start = _STAGE_PROGRESS[STAGE_GENERATE]
+        channel.state["progress"] = start + (_STAGE_PROGRESS[STAGE_SAVE] - start) * min(channel.tokens / _EXPECTED_TOKENS, 1.0)
+        channel.publish(EVENT_TOKEN, {"text": text, "progress": round(channel.state["progress"], 4)})
+
+        now = time.monotonic()
+        due = now - channel.flushed_at >= settings.EVALUATION_FLUSH_INTERVAL
+        # 预留的事件ID即将用完时提前保存
+        if not channel.flushing and (due or channel.last_id >= channel.reserved - _EVENT_ID_RESERVE // 2):
+            channel.flushing = True
+            channel.flushed_at = now
+            channel.flush_task = asyncio.create_task(self._flush_output(job_id, channel))
+
+    @staticmethod
+    def _save_output(job_id: int, output: str, progress: float, last_event_id: int) -> None:
+        """保存运行中任务的模型输出；任务已结束时不再覆盖最终状态"""
+        db = SessionLocal()
+        try:
+            db.query(EvaluationJob).filter(
+                EvaluationJob.id == job_id, EvaluationJob.status == STATUS_RUNNING
+            ).update({
+                "partial_output": output,
+                "progress": progress,
+                "last_event_id": last_event_id,
+                "updated_at": datetime.utcnow()
+            }, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _flush_output(self, job_id: int, channel: _JobChannel) -> None:
+        reserved = channel.reservation()
+        try:
+            await asyncio.to_thread(
+                self._save_output, job_id, "".join(channel.output), channel.state["progress"], reserved
+            )
+            channel.confirm(reserved)
+        except Exception as e:
+            logger.warning(f"保存评价任务输出失败: {str(e)}")
+        finally:
+            channel.flushing = False
+
+
+_manager: Optional[EvaluationJobManager] = None
+
+
+def get_manager() -> EvaluationJobManager:
+    """获取共享的评价任务管理器"""
+    global _manager
+    if _manager is None:
+        _manager = EvaluationJobManager()
+    return _manager
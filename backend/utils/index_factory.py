@@ -0,0 +1,195 @@
+import math
+import logging
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 支持的索引类型
+INDEX_FLAT = "flat"
+INDEX_IVF_FLAT = "ivf_flat"
+INDEX_IVF_PQ = "ivf_pq"
+INDEX_HNSW = "hnsw"
+INDEX_TYPES = (INDEX_FLAT, INDEX_IVF_FLAT, INDEX_IVF_PQ, INDEX_HNSW)
+
+
+def select_index_type(ntotal: int) -> str:
+    """
+    根据配置和向量数量选择索引类型
+    :param ntotal: 当前向量数量
+    :return: 索引类型
+    """
+    configured = settings.VECTOR_INDEX_TYPE
+    if configured != "auto":
+        if configured not in INDEX_TYPES:
+            raise ValueError(f"不支持的索引类型: {configured}")
+        # IVF索引需要足够的训练样本，数据量不足时先使用精确索引
+        if configured in (INDEX_IVF_FLAT, INDEX_IVF_PQ) and ntotal < settings.VECTOR_IVF_MIN_TRAIN:
+            return INDEX_FLAT
+        return configured
+
+    if ntotal >= settings.VECTOR_IVF_PQ_THRESHOLD:
+        return INDEX_IVF_PQ
+    if ntotal >= settings.VECTOR_IVF_THRESHOLD:
+        return INDEX_IVF_FLAT
+    return INDEX_FLAT
+
+
+def suggest_nlist(ntotal: int) -> int:
+    """IVF聚类中心数量：约为 4*sqrt(N)"""
+    return int(min(65536, max(16, 4 * math.sqrt(max(ntotal, 1)))))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """选择不超过配置值且能整除向量维度的PQ子量化器数量"""
+    m = min(settings.VECTOR_PQ_M, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def build_index(index_type: str, dimension: int, metric: int, ntotal: int = 0) -> faiss.Index:
+    """
+    创建空索引（IVF类索引尚未训练）
+    :param index_type: 索引类型
+    :param dimension: 向量维度
+    :param metric: faiss.METRIC_INNER_PRODUCT 或 faiss.METRIC_L2
+    :param ntotal: 预计向量数量，用于确定IVF聚类中心数量
+    :return: 支持按文档ID增删的索引
+    """
+    if index_type == INDEX_FLAT:
+        base = faiss.IndexFlatIP(dimension) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dimension)
+        return faiss.IndexIDMap2(base)
+    if index_type == INDEX_HNSW:
+        base = faiss.IndexHNSWFlat(dimension, settings.VECTOR_HNSW_M, metric)
+        base.hnsw.efConstruction = settings.VECTOR_HNSW_EF_CONSTRUCTION
+        base.hnsw.efSearch = settings.VECTOR_HNSW_EF_SEARCH
+        return faiss.IndexIDMap2(base)
+
+    # IVF索引原生支持自定义ID，不再包装IDMap
+    nlist = suggest_nlist(ntotal)
+    quantizer = faiss.IndexFlatIP(dimension) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dimension)
+    if index_type == INDEX_IVF_FLAT:
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+    elif index_type == INDEX_IVF_PQ:
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension), 8, metric)
+    else:
+        raise ValueError(f"不支持的索引类型: {index_type}")
+    index.nprobe = settings.VECTOR_IVF_NPROBE
+    # 保持量化器对象存活（swig不会自动持有引用）
+    index.own_fields = True
+    quantizer.this.disown()
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """识别索引类型"""
+    if isinstance(index, faiss.IndexIDMap2):
+        base = faiss.downcast_index(index.index)
+        return INDEX_HNSW if isinstance(base, faiss.IndexHNSW) else INDEX_FLAT
+    if isinstance(index, faiss.IndexIVFPQ):
+        return INDEX_IVF_PQ
+    if isinstance(index, faiss.IndexIVF):
+        return INDEX_IVF_FLAT
+    return INDEX_FLAT
+
+
+def prepare_loaded_index(index: faiss.Index) -> faiss.Index:
+    """为从磁盘读取的IVF索引启用按ID重建向量所需的哈希直接映射"""
+    if isinstance(index, faiss.IndexIVF) and index.direct_map.type != faiss.DirectMap.Hashtable:
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+
+def all_ids(index: faiss.Index) -> np.ndarray:
+    """
+    获取索引中所有向量的文档ID
+    """
+    if isinstance(index, faiss.IndexIVF):
+        invlists = index.invlists
+        chunks = []
+        for list_no in range(index.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                chunks.append(np.array(faiss.rev_swig_ptr(invlists.get_ids(list_no), size), dtype=np.int64))
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+    return faiss.vector_to_array(index.id_map).astype(np.int64)
+
+
+def reconstruct_all(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    取出索引中的全部向量（IVF-PQ索引得到的是量化后的近似向量）
+    :return: (文档ID数组, 向量矩阵)
+    """
+    ids = all_ids(index)
+    if not len(ids):
+        return ids, np.zeros((0, index.d), dtype=np.float32)
+    if isinstance(index, faiss.IndexIDMap2):
+        # ID映射中的顺序与底层索引的存储顺序一致
+        return ids, faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    return ids, index.reconstruct_batch(ids)
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    """HNSW图不支持删除，只能重建"""
+    return index_type_of(index) != INDEX_HNSW
+
+
+def populate_index(index: faiss.Index, ids: np.ndarray, vectors: np.ndarray) -> faiss.Index:
+    """
+    训练（如需要）并写入向量
+    :param index: build_index 创建的空索引
+    :param ids: 文档ID数组
+    :param vectors: 已按度量方式处理过的向量矩阵
+    :return: 写入完成的索引
+    """
+    if not index.is_trained:
+        sample = vectors
+        max_train = index.nlist * 256
+        if len(vectors) > max_train:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), max_train, replace=False)]
+        logger.info(f'开始训练 {index_type_of(index)} 索引，样本数: {len(sample)}, 聚类中心: {index.nlist}')
+        index.train(sample)
+    if isinstance(index, faiss.IndexIVF):
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def search_params(index: faiss.Index,
+                  nprobe: Optional[int] = None,
+                  ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+    """
+    生成单次查询的检索参数，用于在召回率和延迟之间取舍
+    :param index: 索引
+    :param nprobe: IVF索引每次查询访问的聚类数，越大召回率越高
+    :param ef_search: HNSW索引查询时的候选列表长度，越大召回率越高
+    :return: 检索参数，精确索引返回None
+    """
+    index_type = index_type_of(index)
+    if index_type in (INDEX_IVF_FLAT, INDEX_IVF_PQ):
+        return faiss.SearchParametersIVF(nprobe=min(nprobe or settings.VECTOR_IVF_NPROBE, index.nlist))
+    if index_type == INDEX_HNSW:
+        return faiss.SearchParametersHNSW(efSearch=ef_search or settings.VECTOR_HNSW_EF_SEARCH)
+    return None
+
+
+def needs_rebuild(index: faiss.Index) -> Optional[str]:
+    """
+    判断当前索引是否需要切换类型或重新训练
+    :return: 需要切换到的索引类型，不需要时返回None
+    """
+    ntotal = index.ntotal
+    current = index_type_of(index)
+    target = select_index_type(ntotal)
+    if target != current:
+        return target
+    # 数据量增长后聚类中心过少会导致每个聚类过大，按新的数据量重新训练
+    if isinstance(index, faiss.IndexIVF) and suggest_nlist(ntotal) >= index.nlist * settings.VECTOR_IVF_RETRAIN_GROWTH:
+        return target
+    return None
@@ -0,0 +1,447 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from backend.core.config import settings
+from backend.database import SessionLocal, IngestionJob, Paper
+from backend.knowledge import KnowledgeBase
+from backend.utils.document_processor import DocumentProcessor
+from backend.utils.vector_store import VectorStore, make_doc_id
+
+logger = logging.getLogger(__name__)
+
+# 任务类型
+KIND_PAPER = "paper"
+KIND_KNOWLEDGE = "knowledge"
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+# 处理阶段及各阶段开始时的进度
+STAGE_EXTRACT = "extract"
+STAGE_CHUNK = "chunk"
+STAGE_EMBED = "embed"
+STAGE_INDEX = "index"
+_STAGE_PROGRESS = {
+    STAGE_EXTRACT: 0.0,
+    STAGE_CHUNK: 0.4,
+    STAGE_EMBED: 0.45,
+    STAGE_INDEX: 0.9
+}
+
+# 上传后、导入完成前论文记录的状态
+PAPER_STATUS_PROCESSING = "processing"
+# 导入多次重试后仍失败的论文记录状态，记录和文件保留，可以手动重试
+PAPER_STATUS_FAILED = "failed"
+
+
+def job_to_dict(job: IngestionJob) -> Dict[str, Any]:
+    """
+    将导入任务转换为接口返回的字典
+    :param job: 导入任务
+    :return: 任务状态字典
+    """
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "target_id": job.target_id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": round(job.progress or 0.0, 4),
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class IngestionQueue:
+    """
+    文档导入队列：任务保存在数据库中，由事件循环中的工作协程依次完成提取、分块、编码和写入索引。
+    服务重启后，未完成的任务会重新排队
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        """
+        :param workers: 工作协程数，默认取 INGESTION_WORKERS
+        """
+        self.workers = workers or settings.INGESTION_WORKERS
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """启动工作协程，并把上次退出时处理中的任务重新排队"""
+        if self._tasks:
+            return
+        recovered = await asyncio.to_thread(self._requeue_running)
+        if recovered:
+            logger.info(f"已重新排队 {recovered} 个未完成的导入任务")
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingestion-{i}") for i in range(self.workers)
+        ]
+        logger.info(f"文档导入队列已启动，工作数: {self.workers}")
+
+    async def stop(self) -> None:
+        """停止工作协程，处理中的任务在下次启动时重新执行"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks:
+            logger.info("文档导入队列已停止")
+
+    def enqueue(self, db, kind: str, target_id: int, file_path: str) -> IngestionJob:
+        """
+        在调用方的数据库会话中创建导入任务，调用方提交后调用 notify 唤醒工作协程
+        :param db: 数据库会话
+        :param kind: 任务类型，paper 或 knowledge
+        :param target_id: 论文或知识库文档的主键
+        :param file_path: 已保存的文件路径
+        :return: 导入任务
+        """
+        job = IngestionJob(
+            kind=kind,
+            target_id=target_id,
+            file_path=file_path,
+            status=STATUS_QUEUED,
+            max_attempts=settings.INGESTION_MAX_ATTEMPTS
+        )
+        db.add(job)
+        db.flush()
+        return job
+
+    def notify(self) -> None:
+        """通知工作协程有新任务"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        查询导入任务状态
+        :param job_id: 任务ID
+        :return: 任务状态字典，不存在时返回None
+        """
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+            return job_to_dict(job) if job else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def retry(job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        手动重试失败的导入任务：重置尝试次数并重新排队，调用后需要 notify 唤醒工作协程
+        :param job_id: 任务ID
+        :return: 任务状态字典，不存在时返回None
+        """
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+            if job is None:
+                return None
+            if job.status != STATUS_FAILED:
+                raise ValueError(f"只能重试失败的导入任务，当前状态: {job.status}")
+            if not os.path.exists(job.file_path):
+                raise ValueError("上传的文件已不存在，无法重试")
+            now = datetime.utcnow()
+            job.status = STATUS_QUEUED
+            job.stage = None
+            job.progress = 0.0
+            job.attempts = 0
+            job.error = None
+            job.next_attempt_at = now
+            job.finished_at = None
+            job.updated_at = now
+            if job.kind == KIND_PAPER:
+                db.query(Paper).filter(Paper.id == job.target_id).update(
+                    {"status": PAPER_STATUS_PROCESSING}, synchronize_session=False
+                )
+            db.commit()
+            logger.info(f"导入任务 {job_id} 已重新排队")
+            return job_to_dict(job)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """各状态的导入任务数"""
+        db = SessionLocal()
+        try:
+            rows = db.query(IngestionJob.status, func.count(IngestionJob.id)).group_by(IngestionJob.status).all()
+            return {status: count for status, count in rows}
+        finally:
+            db.close()
+
+    async def _worker(self) -> None:
+        """工作协程：领取任务并执行，队列为空时等待通知或定时检查"""
+        while True:
+            try:
+                job_id = await asyncio.to_thread(self._claim_next)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"领取导入任务失败: {str(e)}")
+                job_id = None
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.INGESTION_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job_id)
+
+    @staticmethod
+    def _requeue_running() -> int:
+        """把处理中的任务重新排队（服务异常退出时遗留）"""
+        db = SessionLocal()
+        try:
+            count = db.query(IngestionJob).filter(IngestionJob.status == STATUS_RUNNING).update(
+                {"status": STATUS_QUEUED, "next_attempt_at": datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+            return count
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _claim_next() -> Optional[int]:
+        """
+        领取一个到期的排队任务：用带状态条件的更新保证同一任务只被一个工作协程领取
+        :return: 任务ID，没有可领取的任务时返回None
+        """
+        db = SessionLocal()
+        try:
+            candidates = db.query(IngestionJob.id).filter(
+                IngestionJob.status == STATUS_QUEUED,
+                IngestionJob.next_attempt_at <= datetime.utcnow()
+            ).order_by(IngestionJob.id).limit(settings.INGESTION_WORKERS + 1).all()
+            for (job_id,) in candidates:
+                claimed = db.query(IngestionJob).filter(
+                    IngestionJob.id == job_id, IngestionJob.status == STATUS_QUEUED
+                ).update({
+                    "status": STATUS_RUNNING,
+                    "attempts": IngestionJob.attempts + 1,
+                    "stage": STAGE_EXTRACT,
+                    "progress": 0.0,
+                    "updated_at": datetime.utcnow()
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return job_id
+            return None
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _update_job(job_id: int, **values) -> None:
+        """更新任务字段"""
+        db = SessionLocal()
+        try:
+            values["updated_at"] = datetime.utcnow()
+            db.query(IngestionJob).filter(IngestionJob.id == job_id).update(values, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _set_stage(self, job_id: int, stage: str, progress: Optional[float] = None) -> None:
+        """记录任务当前阶段和进度"""
+        await asyncio.to_thread(
+            self._update_job, job_id, stage=stage,
+            progress=_STAGE_PROGRESS[stage] if progress is None else progress
+        )
+
+    @staticmethod
+    def _load_job(job_id: int) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+            return job_to_dict(job) | {"file_path": job.file_path}
+        finally:
+            db.close()
+
+    async def _run(self, job_id: int) -> None:
+        """
+        执行导入任务：提取 → 分块 → 编码 → 写入索引，失败时按重试次数重新排队或标记失败
+        :param job_id: 任务ID
+        """
+        job = await asyncio.to_thread(self._load_job, job_id)
+        logger.info(f"开始导入任务 {job_id}: {job['kind']} {job['target_id']}, 第 {job['attempts']} 次尝试")
+        try:
+            await self._ingest(job)
+        except asyncio.CancelledError:
+            # 服务关闭：任务保留为排队状态，下次启动时重新执行
+            await asyncio.to_thread(self._update_job, job_id, status=STATUS_QUEUED)
+            raise
+        except Exception as e:
+            logger.error(f"导入任务 {job_id} 失败: {str(e)}")
+            await asyncio.to_thread(self._handle_failure, job, str(e))
+
+    async def _ingest(self, job: Dict[str, Any]) -> None:
+        """按阶段处理单个导入任务"""
+        job_id = job["id"]
+        file_path = job["file_path"]
+        vector_store = VectorStore()
+
+        # 1. 提取文本（PDF提取和OCR在进程池中进行）
+        text = await asyncio.to_thread(DocumentProcessor.process_document, file_path)
+        if not text or not text.strip():
+            raise ValueError("未能从文档中提取到文本")
+
+        # 2. 切分文本块
+        await self._set_stage(job_id, STAGE_CHUNK)
+        chunks = vector_store.chunk_document(text)
+
+        # 3. 分段编码，按已完成的文本块数更新进度
+        await self._set_stage(job_id, STAGE_EMBED)
+        step = max(settings.EMBEDDING_BATCH_SIZE * 4, 1)
+        parts = []
+        span = _STAGE_PROGRESS[STAGE_INDEX] - _STAGE_PROGRESS[STAGE_EMBED]
+        for start in range(0, len(chunks), step):
+            parts.append(await vector_store.aencode(chunks[start:start + step]))
+            done = min(start + step, len(chunks))
+            await self._set_stage(job_id, STAGE_EMBED, _STAGE_PROGRESS[STAGE_EMBED] + span * done / len(chunks))
+        vectors = np.vstack(parts)
+
+        # 4. 写入索引并更新论文或知识库记录
+        await self._set_stage(job_id, STAGE_INDEX)
+        doc_id = make_doc_id(job["kind"], job["target_id"])
+        metadata = await asyncio.to_thread(self._target_metadata, job)
+        if metadata is None:
+            raise LookupError(f"导入目标记录已删除: {job['kind']} {job['target_id']}")
+        await vector_store.aadd_vectors(vectors, metadata, doc_id=doc_id)
+        if not await asyncio.to_thread(self._finish, job, text, doc_id):
+            # 导入过程中记录被删除，移除刚写入的向量
+            await asyncio.to_thread(vector_store.remove_ids, [doc_id])
+            raise LookupError(f"导入目标记录已删除: {job['kind']} {job['target_id']}")
+        logger.info(f"导入任务 {job_id} 完成，文本块数: {len(chunks)}")
+
+    @staticmethod
+    def _target_metadata(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """生成写入向量存储的元数据，与同步上传时保持一致"""
+        db = SessionLocal()
+        try:
+            if job["kind"] == KIND_PAPER:
+                paper = db.query(Paper).filter(Paper.id == job["target_id"]).first()
+                if not paper:
+                    return None
+                return {"file_path": paper.file_path, "paper_type": paper.paper_type.value, "paper_id": paper.id}
+            knowledge = db.query(KnowledgeBase).filter(KnowledgeBase.id == job["target_id"]).first()
+            if not knowledge:
+                return None
+            return {"file_path": knowledge.file_path, "knowledge_id": knowledge.id}
+        finally:
+            db.close()
+
+    @staticmethod
+    def _finish(job: Dict[str, Any], text: str, doc_id: int) -> bool:
+        """
+        导入成功：更新论文或知识库记录，并把任务标记为完成
+        :return: 目标记录是否仍然存在
+        """
+        db = SessionLocal()
+        try:
+            if job["kind"] == KIND_PAPER:
+                target = db.query(Paper).filter(Paper.id == job["target_id"]).first()
+                if target:
+                    target.vector = str(doc_id)
+                    target.status = 'pending'
+            else:
+                target = db.query(KnowledgeBase).filter(KnowledgeBase.id == job["target_id"]).first()
+                if target:
+                    target.vector = text
+            if not target:
+                return False
+            now = datetime.utcnow()
+            db.query(IngestionJob).filter(IngestionJob.id == job["id"]).update({
+                "status": STATUS_SUCCEEDED,
+                "progress": 1.0,
+                "error": None,
+                "finished_at": now,
+                "updated_at": now
+            }, synchronize_session=False)
+            db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _handle_failure(job: Dict[str, Any], error: str) -> None:
+        """
+        任务失败：未超过重试次数时延迟重新排队；否则把任务和论文记录标记为失败，
+        保留上传的记录和文件（失败可能只是暂时的，如Ollama或编码模型不可用），可以通过接口手动重试
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            if job["attempts"] < job["max_attempts"] and not error.startswith("导入目标记录已删除"):
+                delay = settings.INGESTION_RETRY_DELAY * job["attempts"]
+                db.query(IngestionJob).filter(IngestionJob.id == job["id"]).update({
+                    "status": STATUS_QUEUED,
+                    "error": error,
+                    "next_attempt_at": now + timedelta(seconds=delay),
+                    "updated_at": now
+                }, synchronize_session=False)
+                db.commit()
+                logger.info(f"导入任务 {job['id']} 将在 {delay} 秒后重试")
+                return
+
+            db.query(IngestionJob).filter(IngestionJob.id == job["id"]).update({
+                "status": STATUS_FAILED,
+                "error": error,
+                "finished_at": now,
+                "updated_at": now
+            }, synchronize_session=False)
+            if job["kind"] == KIND_PAPER:
+                db.query(Paper).filter(Paper.id == job["target_id"]).update(
+                    {"status": PAPER_STATUS_FAILED}, synchronize_session=False
+                )
+            db.commit()
+            logger.error(f"导入任务 {job['id']} 失败，共尝试 {job['attempts']} 次，记录和文件已保留，可以手动重试")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"更新导入任务状态失败: {str(e)}")
+        finally:
+            db.close()
+
+
+_queue: Optional[IngestionQueue] = None
+
+
+def get_queue() -> IngestionQueue:
+    """获取共享的文档导入队列"""
+    global _queue
+    if _queue is None:
+        _queue = IngestionQueue()
+    return _queue
@@ -0,0 +1,371 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+from backend.core.config import OCR_LANGUAGES, settings
+from backend.utils.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# OCR模式
+OCR_MODE_COMBINED = "combined"  # 组合语言模型识别一次
+OCR_MODE_DETECT = "detect"  # 脚本检测后用单一语言模型识别一次
+OCR_MODE_SEQUENTIAL = "sequential"  # 逐个语言重试（旧行为）
+OCR_MODES = (OCR_MODE_COMBINED, OCR_MODE_DETECT, OCR_MODE_SEQUENTIAL)
+
+# Tesseract OSD 检测出的脚本与语言模型的对应关系
+_SCRIPT_LANGUAGES = {
+    "Han": "chi_sim",
+    "Latin": "eng"
+}
+
+# 当前进程的OCR结果缓存和OCR配置标识
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+_config_tag: Optional[str] = None
+
+
+def _init_worker() -> None:
+    """OCR工作进程初始化：限制Tesseract自身的线程数，避免与进程池争抢CPU"""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def preprocess(image: Image.Image):
+    """
+    OCR前的图像预处理：灰度化、二值化、降噪
+    :param image: 页面图像
+    :return: 预处理后的灰度图（numpy数组）
+    """
+    import cv2
+    import numpy as np
+
+    # 转换为OpenCV格式
+    img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    # 1. 转换为灰度图
+    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
+    # 2. 二值化
+    _, binary = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # 3. 降噪
+    return cv2.fastNlMeansDenoising(binary)
+
+
+def detect_language(bitmap) -> str:
+    """
+    用Tesseract的文字方向和脚本检测（OSD）判断页面的主要文字，只返回对应的单一语言模型
+    :param bitmap: 预处理后的图像
+    :return: Tesseract语言参数，无法判断时返回组合语言模型
+    """
+    combined = "+".join(OCR_LANGUAGES)
+    try:
+        osd = pytesseract.image_to_osd(Image.fromarray(bitmap), output_type=pytesseract.Output.DICT)
+        lang = _SCRIPT_LANGUAGES.get(osd.get("script"))
+        return lang if lang in OCR_LANGUAGES else combined
+    except Exception as e:
+        logger.debug(f"脚本检测失败，使用组合语言模型: {str(e)}")
+        return combined
+
+
+def ocr_image(bitmap, page_no: int = 0, mode: Optional[str] = None) -> str:
+    """
+    对预处理后的图像做OCR
+    :param bitmap: 预处理后的图像
+    :param page_no: 页码（从0开始，仅用于日志）
+    :param mode: OCR模式，默认取 OCR_MODE：
+                 combined 使用组合语言模型（如 chi_sim+eng）识别一次，中英混排页面不会丢失任何一种语言；
+                 detect 先做脚本检测，再用对应的单一语言模型识别一次；
+                 sequential 依次尝试各语言，取第一个非空结果（旧行为）
+    :return: 识别出的文本
+    """
+    mode = mode or settings.OCR_MODE
+    if mode == OCR_MODE_SEQUENTIAL:
+        languages = list(OCR_LANGUAGES)
+    elif mode == OCR_MODE_DETECT:
+        languages = [detect_language(bitmap)]
+    elif mode == OCR_MODE_COMBINED:
+        languages = ["+".join(OCR_LANGUAGES)]
+    else:
+        raise ValueError(f"不支持的OCR模式: {mode}")
+
+    for lang in languages:
+        try:
+            page_text = pytesseract.image_to_string(
+                Image.fromarray(bitmap),
+                lang=lang,
+                config='--psm 1 --oem 3'
+            )
+            if page_text.strip():
+                return page_text
+        except Exception as e:
+            logger.warning(f"OCR处理失败 (页面 {page_no + 1}, 语言: {lang}): {str(e)}")
+            continue
+    return ""
+
+
+def _get_cache() -> Optional[DiskCache]:
+    """获取OCR结果缓存（每个进程各自打开同一个SQLite文件），未启用时返回None"""
+    global _cache
+    if not settings.OCR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+                _cache = DiskCache(
+                    os.path.join(base_dir, settings.OCR_CACHE_PATH),
+                    max_bytes=settings.OCR_CACHE_MAX_MB * 1024 * 1024
+                )
+    return _cache
+
+
+def _ocr_config_tag() -> str:
+    """OCR配置标识：模式、语言、Tesseract参数和版本，任何一项变化都会使缓存失效"""
+    global _config_tag
+    if _config_tag is None:
+        try:
+            version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            version = "unknown"
+        _config_tag = f"{settings.OCR_MODE}|{'+'.join(OCR_LANGUAGES)}|psm1-oem3|tesseract-{version}"
+    return _config_tag
+
+
+def ocr_cache_key(bitmap) -> str:
+    """
+    OCR缓存键：预处理后页面位图的哈希 + OCR配置
+    :param bitmap: 预处理后的图像
+    :return: 缓存键
+    """
+    digest = hashlib.sha256()
+    digest.update(str(bitmap.shape).encode('utf-8'))
+    digest.update(bitmap.tobytes())
+    return f"{_ocr_config_tag()}:{digest.hexdigest()}"
+
+
+def ocr_pdf_page(file_path: str, page_no: int) -> Tuple[str, float, bool]:
+    """
+    在工作进程中对PDF的单个页面做OCR：只渲染该页，处理完即释放图像，内存占用与总页数无关；
+    位图和OCR配置都相同的页面直接使用缓存的识别结果
+    :param file_path: PDF文件路径
+    :param page_no: 页码（从0开始）
+    :return: (识别出的文本, OCR耗时秒数, 是否命中缓存)
+    """
+    started = time.perf_counter()
+    try:
+        from pdf2image import convert_from_path
+
+        images = convert_from_path(
+            file_path, dpi=settings.OCR_DPI, first_page=page_no + 1, last_page=page_no + 1
+        )
+        if not images:
+            return "", time.perf_counter() - started, False
+        bitmap = preprocess(images[0])
+        del images
+    except Exception as e:
+        logger.warning(f"页面渲染失败 (页面 {page_no + 1}): {str(e)}")
+        return "", time.perf_counter() - started, False
+
+    cache = None
+    cache_key = None
+    try:
+        cache = _get_cache()
+        if cache is not None:
+            cache_key = ocr_cache_key(bitmap)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached.decode('utf-8'), time.perf_counter() - started, True
+    except Exception as e:
+        logger.warning(f"读取OCR缓存失败: {str(e)}")
+        cache_key = None
+
+    text = ocr_image(bitmap, page_no)
+    if cache_key and text:
+        try:
+            cache.set(cache_key, text.encode('utf-8'))
+        except Exception as e:
+            logger.warning(f"写入OCR缓存失败: {str(e)}")
+    return text, time.perf_counter() - started, False
+
+
+class OcrPipeline:
+    """
+    流式OCR：按页提交到进程池，同时在处理中的页数有上限，
+    每个工作进程只渲染当前处理的页面，内存占用不随文档页数增长
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        """
+        :param workers: 工作进程数，默认取 OCR_WORKERS（0表示 min(4, CPU核数)）
+        :param max_pending: 同时排队和处理中的最大页数，默认为工作进程数的2倍
+        """
+        self.workers = workers or settings.OCR_WORKERS or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.workers * 2
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        # 缓存命中统计（缓存在工作进程中读写，命中情况随结果返回）
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._stats_lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        logger.info(f"OCR进程池已创建，进程数: {self.workers}, 最大排队页数: {self.max_pending}")
+
+    def submit(self, file_path: str, page_no: int) -> Future:
+        """
+        提交单页OCR任务，排队页数达到上限时阻塞等待
+        :param file_path: PDF文件路径
+        :param page_no: 页码（从0开始）
+        :return: 结果为 (文本, 耗时秒数) 的Future
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(ocr_pdf_page, file_path, page_no)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future) -> None:
+        """任务完成后释放排队名额，并统计缓存命中情况"""
+        self._slots.release()
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._stats_lock:
+            if future.result()[2]:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("OCR进程池已关闭")
+
+
+_pipeline: Optional[OcrPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> OcrPipeline:
+    """获取共享的OCR流水线，首次调用时创建"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = OcrPipeline()
+    return _pipeline
+
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    获取OCR缓存的统计信息：命中次数来自OCR流水线，条目数和占用空间来自缓存文件
+    """
+    cache = _get_cache()
+    if cache is None:
+        return {"enabled": False}
+    stats = cache.stats()
+    pipeline = _pipeline
+    if pipeline is not None:
+        lookups = pipeline.cache_hits + pipeline.cache_misses
+        stats.update({
+            "hits": pipeline.cache_hits,
+            "misses": pipeline.cache_misses,
+            "hit_rate": round(pipeline.cache_hits / lookups, 4) if lookups else 0.0
+        })
+    return {"enabled": True, **stats}
+
+
+def shutdown() -> None:
+    """关闭共享的OCR流水线"""
+    global _pipeline
+    with _pipeline_lock:
+        pipeline, _pipeline = _pipeline, None
+    if pipeline:
+        pipeline.shutdown()
+
+
+def _normalize_for_cer(text: str) -> str:
+    """计算字符错误率前去掉所有空白，避免换行和空格差异影响结果"""
+    return "".join(text.split())
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    字符错误率：编辑距离 / 参考文本长度
+    :param reference: 参考文本
+    :param hypothesis: 识别结果
+    :return: 字符错误率
+    """
+    reference = _normalize_for_cer(reference)
+    hypothesis = _normalize_for_cer(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_char != hyp_char)
+            )
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def benchmark(sample_dir: str, modes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    比较各OCR模式的耗时和字符错误率
+    :param sample_dir: 样例目录，每张扫描图像（.png/.jpg/.tif）旁放置同名的 .txt 作为参考文本
+    :param modes: 要比较的OCR模式，默认全部
+    :return: 每个模式的总耗时、平均每页耗时和平均字符错误率
+    """
+    samples = []
+    for name in sorted(os.listdir(sample_dir)):
+        stem, ext = os.path.splitext(name)
+        truth_path = os.path.join(sample_dir, stem + ".txt")
+        if ext.lower() in (".png", ".jpg", ".jpeg", ".tif", ".tiff") and os.path.exists(truth_path):
+            with open(truth_path, 'r', encoding='utf-8') as f:
+                reference = f.read()
+            with Image.open(os.path.join(sample_dir, name)) as image:
+                samples.append((name, preprocess(image.convert("RGB")), reference))
+    if not samples:
+        raise ValueError(f"样例目录中没有带参考文本的图像: {sample_dir}")
+
+    results = []
+    for mode in modes or OCR_MODES:
+        started = time.perf_counter()
+        errors = [character_error_rate(reference, ocr_image(bitmap, mode=mode)) for _, bitmap, reference in samples]
+        elapsed = time.perf_counter() - started
+        results.append({
+            "mode": mode,
+            "pages": len(samples),
+            "seconds": round(elapsed, 3),
+            "seconds_per_page": round(elapsed / len(samples), 3),
+            "cer": round(sum(errors) / len(errors), 4)
+        })
+        logger.info(f"OCR模式性能: {results[-1]}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="比较各OCR模式的耗时和字符错误率")
+    parser.add_argument("sample_dir", help="样例目录：扫描图像及同名 .txt 参考文本")
+    parser.add_argument("--modes", default=",".join(OCR_MODES), help="逗号分隔的OCR模式")
+    args = parser.parse_args()
+
+    for row in benchmark(args.sample_dir, args.modes.split(",")):
+        print(json.dumps(row, ensure_ascii=False))
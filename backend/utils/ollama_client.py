@@ -1,17 +1,365 @@
 import requests
+import httpx
 import json
+import asyncio
 import logging
 import re
-from typing import Dict, Any, Optional
-from fastapi import HTTPException
+import time
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, Iterator, Optional, TypeVar
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from fastapi import HTTPException, Request
 from backend.core.config import settings
-from sqlalchemy.orm import Session
-from backend.database import get_db as get_model_db, ModelConfig
+from backend.utils.config_cache import get_config_cache
 
 logger = logging.getLogger(__name__)
 
-class OllamaClient:
-    """Ollama API客户端"""
+
+class _TransportStats:
+    """Ollama请求的连接复用统计：新建连接数远小于请求数说明连接被复用"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+
+    def request_sent(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+
+_transport_stats = _TransportStats()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _transport_stats.connection_opened()
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _transport_stats.connection_opened()
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    """连接池适配器：统计新建的连接数"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool
+        }
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    获取所有OllamaClient共享的HTTP会话：连接保持长连接并在请求之间复用，
+    每个服务器的连接数不超过 OLLAMA_POOL_MAXSIZE
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = _PooledAdapter(
+                    pool_connections=settings.OLLAMA_POOL_CONNECTIONS,
+                    pool_maxsize=settings.OLLAMA_POOL_MAXSIZE,
+                    pool_block=True
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def close_session() -> None:
+    """关闭共享的HTTP会话，释放所有连接"""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    获取所有AsyncOllamaClient共享的异步HTTP客户端（需在事件循环中调用），
+    连接数上限与同步会话一致
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_POOL_CONNECTIONS * settings.OLLAMA_POOL_MAXSIZE,
+                max_keepalive_connections=settings.OLLAMA_POOL_MAXSIZE
+            ),
+            timeout=httpx.Timeout(
+                settings.OLLAMA_READ_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT, pool=None
+            )
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """关闭共享的异步HTTP客户端"""
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+
+
+async def _trace_connection(event_name: str, info: Dict[str, Any]) -> None:
+    """httpx连接事件回调：统计新建的连接数"""
+    if event_name == "connection.connect_tcp.complete":
+        _transport_stats.connection_opened()
+
+
+def transport_stats() -> Dict[str, Any]:
+    """Ollama请求数、新建连接数和连接复用率"""
+    sent = _transport_stats.requests
+    opened = _transport_stats.connections_opened
+    return {
+        "requests": sent,
+        "connections_opened": opened,
+        "connections_reused": max(sent - opened, 0),
+        "reuse_rate": round(max(sent - opened, 0) / sent, 4) if sent else 0.0,
+        "pool_maxsize": settings.OLLAMA_POOL_MAXSIZE
+    }
+
+
+class _ModelInventory:
+    """
+    模型列表缓存：按服务器地址缓存 /api/tags 的结果，超过 OLLAMA_MODEL_CACHE_TTL 后重新获取；
+    同一服务器同时只有一个获取请求，并发的调用方共享其结果
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._sync_flights: Dict[str, '_Flight'] = {}
+        self._async_flights: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.fetches = 0
+
+    def _cached(self, base_url: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(base_url)
+        if entry and time.monotonic() - entry[0] < settings.OLLAMA_MODEL_CACHE_TTL:
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def _store(self, base_url: str, models: Dict[str, Any]) -> None:
+        with self._lock:
+            self.fetches += 1
+            # 获取失败时的空列表不缓存，下次调用重新获取
+            if models.get('models'):
+                self._entries[base_url] = (time.monotonic(), models)
+
+    def get(self, base_url: str, fetch: Callable[[], Dict[str, Any]], refresh: bool = False) -> Dict[str, Any]:
+        """
+        获取模型列表（同步）
+        :param base_url: 服务器地址
+        :param fetch: 实际请求模型列表的函数
+        :param refresh: 是否忽略缓存
+        """
+        with self._lock:
+            cached = None if refresh else self._cached(base_url)
+            if cached is not None:
+                return cached
+            flight = self._sync_flights.get(base_url)
+            leader = flight is None
+            if leader:
+                flight = self._sync_flights[base_url] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+            self._store(base_url, flight.result)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._sync_flights.pop(base_url, None)
+            flight.done.set()
+
+    async def aget(self, base_url: str, fetch: Callable[[], Awaitable[Dict[str, Any]]], refresh: bool = False) -> Dict[str, Any]:
+        """
+        获取模型列表（异步），调用方被取消时进行中的获取请求继续为其他调用方服务
+        :param base_url: 服务器地址
+        :param fetch: 实际请求模型列表的协程函数
+        :param refresh: 是否忽略缓存
+        """
+        cached = None if refresh else self._cached(base_url)
+        if cached is not None:
+            return cached
+        task = self._async_flights.get(base_url)
+        if task is None:
+            task = asyncio.ensure_future(self._afetch(base_url, fetch))
+            self._async_flights[base_url] = task
+            task.add_done_callback(lambda _: self._async_flights.pop(base_url, None))
+        return await asyncio.shield(task)
+
+    async def _afetch(self, base_url: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        models = await fetch()
+        self._store(base_url, models)
+        return models
+
+    def invalidate(self, base_url: Optional[str] = None) -> None:
+        """
+        清除缓存
+        :param base_url: 服务器地址，为空时清除所有服务器的缓存
+        """
+        with self._lock:
+            if base_url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(base_url, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "fetches": self.fetches, "servers": len(self._entries)}
+
+
+class _Flight:
+    """进行中的同步获取请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[Exception] = None
+
+
+_inventory = _ModelInventory()
+
+
+def invalidate_models(base_url: Optional[str] = None) -> None:
+    """清除模型列表缓存，服务器地址或模型配置变化时调用"""
+    _inventory.invalidate(base_url)
+    logger.info(f'模型列表缓存已清除: {base_url or "全部服务器"}')
+
+
+def model_cache_stats() -> Dict[str, Any]:
+    """模型列表缓存的命中次数和实际请求次数"""
+    return _inventory.stats()
+
+
+class GenerationMetrics:
+    """
+    单次生成请求的性能指标：首个token耗时（TTFT）和生成速度；
+    Ollama在最后一段输出中返回 eval_count/eval_duration 时以其为准，否则按收到的文本段数和时间计算
+    """
+
+    def __init__(self):
+        self.model: Optional[str] = None
+        self.ttft: Optional[float] = None
+        self.tokens = 0
+        self.tokens_per_second: Optional[float] = None
+        self.total_seconds: Optional[float] = None
+        self._started = 0.0
+        self._first_token = 0.0
+
+    def _start(self, model: str) -> None:
+        self.model = model
+        self._started = time.perf_counter()
+
+    def _token(self) -> None:
+        if self.ttft is None:
+            self._first_token = time.perf_counter()
+            self.ttft = self._first_token - self._started
+        self.tokens += 1
+
+    def _finish(self, chunk: Optional[Dict[str, Any]]) -> None:
+        now = time.perf_counter()
+        self.total_seconds = now - self._started
+        eval_count = (chunk or {}).get('eval_count')
+        eval_duration = (chunk or {}).get('eval_duration')  # 纳秒
+        if eval_count and eval_duration:
+            self.tokens = eval_count
+            self.tokens_per_second = eval_count / (eval_duration / 1e9)
+        elif self.ttft is not None and now > self._first_token:
+            self.tokens_per_second = self.tokens / (now - self._first_token)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "ttft": round(self.ttft, 4) if self.ttft is not None else None,
+            "tokens": self.tokens,
+            "tokens_per_second": round(self.tokens_per_second, 2) if self.tokens_per_second is not None else None,
+            "total_seconds": round(self.total_seconds, 4) if self.total_seconds is not None else None
+        }
+
+
+class _GenerationStats:
+    """所有生成请求的性能指标汇总"""
+
+    def __init__(self):
+        self.requests = 0
+        self._ttft_total = 0.0
+        self._ttft_count = 0
+        self._rate_total = 0.0
+        self._rate_count = 0
+        self.last: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def record(self, metrics: GenerationMetrics) -> None:
+        with self._lock:
+            self.requests += 1
+            if metrics.ttft is not None:
+                self._ttft_total += metrics.ttft
+                self._ttft_count += 1
+            if metrics.tokens_per_second is not None:
+                self._rate_total += metrics.tokens_per_second
+                self._rate_count += 1
+            self.last = metrics.to_dict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "avg_ttft": round(self._ttft_total / self._ttft_count, 4) if self._ttft_count else None,
+                "avg_tokens_per_second": round(self._rate_total / self._rate_count, 2) if self._rate_count else None,
+                "last": self.last
+            }
+
+
+_generation_stats = _GenerationStats()
+
+
+def _record_generation(metrics: GenerationMetrics, chunk: Optional[Dict[str, Any]]) -> None:
+    """生成结束时计算并汇总本次请求的指标"""
+    metrics._finish(chunk)
+    _generation_stats.record(metrics)
+    logger.info(f'生成完成: 模型 {metrics.model}, 首个token耗时 {metrics.ttft}s, '
+                f'共 {metrics.tokens} 个token, 速度 {metrics.tokens_per_second} tokens/s')
+
+
+def generation_stats() -> Dict[str, Any]:
+    """生成请求的平均首个token耗时、平均生成速度和最近一次请求的指标"""
+    return _generation_stats.stats()
+
+
+class _OllamaBase:
+    """Ollama客户端的公共部分：配置读取、请求数据构造、提示词和响应解析"""
     
     def __init__(self, base_url: Optional[str] = None):
         """
@@ -22,19 +370,11 @@ class OllamaClient:
         self._config = None
     
     def _load_config(self) -> None:
-        """从数据库加载配置"""
+        """从进程内的配置缓存读取配置，版本号未变化时不查询数据库"""
         if self._base_url is not None:
             return
 
-        try:
-            db = next(get_model_db())
-            config = db.query(ModelConfig).first()
-            if config:
-                self._config = config
-                logger.info(f'从数据库加载配置: {config}')
-        except Exception as e:
-            logger.error(f'加载配置失败: {str(e)}')
-            self._config = None
+        self._config = get_config_cache().get()
     
     @property
     def base_url(self) -> str:
@@ -80,233 +420,119 @@ class OllamaClient:
         if self._config:
             return self._config.max_tokens
         return 2000
-        
-    def _make_request(self, endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Any:
-        """
-        发送请求到 Ollama API
-        """
-        # 如果端点已经包含 api，则不再添加
+
+    def _api_url(self, endpoint: str) -> str:
+        """拼接API地址，端点已经包含 api 时不再添加"""
         if not endpoint.startswith('api/'):
             endpoint = f'api/{endpoint}'
-            
-        url = f"{self.base_url}/{endpoint}"
-        timeout = 30  # 设置 30 秒超时
-        
-        try:
-            logger.info(f'发送 {method} 请求到 {url}')
-            if data:
-                logger.info(f'请求数据: {data}')
-                
-            if method == "GET":
-                response = requests.get(url, timeout=timeout)
-            elif method == "POST":
-                response = requests.post(url, json=data, timeout=120)  # 增加超时时间到120秒
-            else:
-                raise ValueError(f"不支持的请求方法: {method}")
-                
-            if response.status_code != 200:
-                error_msg = f'服务器响应错误 {response.status_code}: {response.text}'
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-                
-            try:
-                result = response.json()
-                logger.info(f'响应数据: {result}')
-                return result
-            except json.JSONDecodeError as e:
-                error_msg = f'响应中没有找到JSON格式的内容\n响应状态码: {response.status_code}\n响应内容: {response.text}\n错误信息: {str(e)}'
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            
-            if isinstance(result, dict) and 'error' in result:
-                error_msg = f'服务器错误: {result["error"]}'
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            if not result:
-                error_msg = '服务器返回空响应'
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-                
-            return result
-            
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f'连接失败: {str(e)}')
-            raise ValueError(f'无法连接到Ollama服务器，请确保服务器地址正确且服务器已启动')
-        except requests.exceptions.Timeout as e:
-            logger.error(f'请求超时: {str(e)}')
-            raise ValueError('请求超时，请检查服务器状态')
-        except requests.exceptions.RequestException as e:
-            logger.error(f'请求失败: {str(e)}')
-            raise ValueError(f'请求失败: {str(e)}')
-        except json.JSONDecodeError as e:
-            logger.error(f'解析响应失败: {str(e)}')
-            raise HTTPException(
-                status_code=500,
-                detail=f'解析响应失败: {str(e)}'
-            )
+        return f"{self.base_url}/{endpoint}"
     
-    def list_models(self) -> Dict[str, Any]:
-        """
-        获取已安装的Ollama模型列表
-        返回格式：{"models": [{"name": "模型名称", "size": 模型大小}]}
-        """
-        try:
-            response = self._make_request('tags')
-            logger.info(f'从服务器获取到的原始响应: {response}')
-            
-            if not response:
-                logger.error('服务器返回空响应')
-                return {"models": []}
-            
-            if not isinstance(response, dict):
-                logger.error(f'响应不是字典格式: {type(response)}')
-                return {"models": []}
-            
-            # 将 Ollama API 的响应格式转换为我们需要的格式
-            models = [{
-                'name': model.get('name', ''),  # 显示名称
-                'model': model.get('name', ''),  # 模型标识符
-                'size': model.get('size', 0)
-            } for model in response.get('models', [])]
-            
-            logger.info(f'处理后的模型列表: {models}')
-            return {'models': models}
-            
-        except Exception as e:
-            logger.error(f'获取模型列表失败: {str(e)}')
+    @staticmethod
+    def _format_models(response: Any) -> Dict[str, Any]:
+        """将 Ollama /api/tags 的响应转换为 {"models": [...]}"""
+        logger.info(f'从服务器获取到的原始响应: {response}')
+        
+        if not response:
+            logger.error('服务器返回空响应')
             return {"models": []}
+        
+        if not isinstance(response, dict):
+            logger.error(f'响应不是字典格式: {type(response)}')
+            return {"models": []}
+        
+        # 将 Ollama API 的响应格式转换为我们需要的格式
+        models = [{
+            'name': model.get('name', ''),  # 显示名称
+            'model': model.get('name', ''),  # 模型标识符
+            'size': model.get('size', 0)
+        } for model in response.get('models', [])]
+        
+        logger.info(f'处理后的模型列表: {models}')
+        return {'models': models}
     
-    def check_model(self, model_name: str) -> bool:
-        """
-        检查模型是否已安装
-        """
-        try:
-            logger.info(f'检查模型是否可用: {model_name}')
-            models = self.list_models()
-            
-            if not models or 'models' not in models:
-                logger.error('获取模型列表失败')
-                return False
-                
-            available = any(model['model'] == model_name for model in models.get('models', []))
-            if not available:
-                logger.warning(f'模型 {model_name} 不可用')
-            else:
-                logger.info(f'模型 {model_name} 可用')
-            return available
-            
-        except Exception as e:
-            logger.error(f'检查模型时发生错误: {str(e)}')
+    @staticmethod
+    def _has_model(models: Dict[str, Any], model_name: str) -> bool:
+        return any(model['model'] == model_name for model in (models or {}).get('models', []))
+    
+    @staticmethod
+    def _model_available(models: Dict[str, Any], model_name: str) -> bool:
+        """判断模型是否在模型列表中"""
+        if not models or 'models' not in models:
+            logger.error('获取模型列表失败')
             return False
+            
+        available = any(model['model'] == model_name for model in models.get('models', []))
+        if not available:
+            logger.warning(f'模型 {model_name} 不可用')
+        else:
+            logger.info(f'模型 {model_name} 可用')
+        return available
     
-    def generate(self, 
-                prompt: str, 
-                model_name: str | None = None,
-                system_prompt: Optional[str] = None,
-                temperature: float | None = None,
-                max_tokens: int | None = None) -> str:
+    def _generate_payload(self,
+                          prompt: str,
+                          model_name: str | None,
+                          system_prompt: Optional[str],
+                          temperature: float | None,
+                          max_tokens: int | None,
+                          stream: bool) -> Dict[str, Any]:
         """
-        生成文本响应
-        :param prompt: 提示文本
-        :param model_name: 模型名称
-        :param system_prompt: 系统提示
-        :param temperature: 温度参数
-        :param max_tokens: 最大生成token数
-        :return: 生成的文本
+        验证参数并构造 /api/generate 的请求数据
         """
-        try:
-            # 参数验证和默认值设置
-            if not prompt:
-                raise ValueError("提示文本不能为空")
-            
-            model_name = model_name or self.default_model
-            if not model_name:
-                raise ValueError("未指定模型名称")
-                
-            temperature = temperature if temperature is not None else self.temperature
-            max_tokens = max_tokens if max_tokens is not None else self.max_tokens
-            
-            # 检查模型是否存在
-            if not self.check_model(model_name):
-                raise ValueError(f"模型 {model_name} 不存在或无法访问")
-            
-            # 准备请求数据
-            data = {
-                "model": model_name,
-                "prompt": prompt,
-                "stream": False
-            }
-            
-            if system_prompt:
-                data["system"] = system_prompt
-            
-            if temperature is not None:
-                data["temperature"] = temperature
-                
-            if max_tokens is not None:
-                data["num_predict"] = max_tokens
-            
-            # 发送请求
-            logger.info(f'使用模型 {model_name} 生成文本')
-            logger.debug(f'请求数据: {data}')
-            
-            try:
-                response = self._make_request('generate', method="POST", data=data)
-                logger.debug(f'原始响应: {response}')
-            except Exception as e:
-                logger.error(f'请求失败: {str(e)}')
-                raise ValueError(f'无法连接到 Ollama 服务器: {str(e)}')
+        if not prompt:
+            raise ValueError("提示文本不能为空")
+        
+        model_name = model_name or self.default_model
+        if not model_name:
+            raise ValueError("未指定模型名称")
             
-            if not response:
-                raise ValueError('服务器返回空响应')
-                
-            if isinstance(response, dict):
-                if 'error' in response:
-                    raise ValueError(f'服务器错误: {response["error"]}')
-                if 'response' in response:
-                    return response['response']
-                    
-            # 如果响应不是字典或没有response字段，返回原始响应
-            return str(response)
+        temperature = temperature if temperature is not None else self.temperature
+        max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+        
+        data = {
+            "model": model_name,
+            "prompt": prompt,
+            "stream": stream
+        }
+        
+        if system_prompt:
+            data["system"] = system_prompt
+        
+        if temperature is not None:
+            data["temperature"] = temperature
             
-        except ValueError as e:
-            logger.error(f'生成文本失败: {str(e)}')
-            raise ValueError(str(e))
-        except Exception as e:
-            logger.error(f'生成文本失败: {str(e)}')
-            raise ValueError(f'生成文本失败: {str(e)}')
+        if max_tokens is not None:
+            data["num_predict"] = max_tokens
+        return data
     
-    def evaluate_paper(self, 
-                      paper_text: str, 
-                      paper_type: str,
-                      reference_texts: list[str],
-                      historical_papers: list[dict] = None,
-                      plagiarism_results: list[dict] = None,
-                      model_name: str | None = None) -> Dict[str, Any]:
+    @staticmethod
+    def _stream_chunk(line: str) -> Dict[str, Any]:
         """
-        评价论文
-        :param paper_text: 论文文本
-        :param paper_type: 论文类型（本科/硕士/博士）
-        :param reference_texts: 参考文献列表
-        :param model_name: 使用的模型名称
-        :return: 评价结果，包含分数和评语
+        解析流式响应的一行（NDJSON）
+        :return: 该段输出，response 为文本片段，done 为真时附带本次生成的统计信息
         """
-        # 验证参数
+        chunk = json.loads(line)
+        if 'error' in chunk:
+            raise ValueError(f'服务器错误: {chunk["error"]}')
+        return chunk
+    
+    @staticmethod
+    def _check_evaluation_args(paper_text: str, paper_type: str) -> None:
+        """验证评价参数"""
         if not paper_text:
             raise ValueError('论文文本不能为空')
         if not paper_type:
             raise ValueError('论文类型不能为空')
-        
-        # 检查模型
-        model_name = model_name or self.default_model
-        if not model_name:
-            raise ValueError('未选择模型')
-        
-        logger.info(f'使用模型: {model_name}')
-        
-        if not self.check_model(model_name):
-            raise ValueError(f'模型 {model_name} 不可用')
-        
+    
+    @staticmethod
+    def _build_evaluation_prompts(paper_text: str,
+                                  paper_type: str,
+                                  reference_texts: list[str],
+                                  historical_papers: list[dict] = None,
+                                  plagiarism_results: list[dict] = None) -> tuple:
+        """
+        构造论文评价的提示词
+        :return: (提示文本, 系统提示)
+        """
         # 获取论文类型名称
         paper_type_map = {
             'undergraduate': '本科',
@@ -339,6 +565,8 @@ class OllamaClient:
                 plagiarism_text += f"\n抄袭可能性 {i+1}:\n"
                 plagiarism_text += f"论文标题: {result['title']}\n"
                 plagiarism_text += f"相似度: {result['similarity']:.4f}\n"
+                if 'coverage' in result:
+                    plagiarism_text += f"相似片段占比: {result['coverage']:.2%}\n"
         
         # 准备提示文本
         prompt = f"""
@@ -510,100 +738,361 @@ class OllamaClient:
         {' '.join(ref[:500] for ref in reference_texts[:3]) if reference_texts else 'No references'}
         """
 
+        return prompt, system_prompt
+    
+    @staticmethod
+    def _parse_evaluation(response: str) -> Dict[str, Any]:
+        """
+        从模型响应中提取并验证评价结果的JSON
+        :param response: 模型生成的文本
+        :return: 评价结果
+        """
         try:
-            # 生成评价
-            response = self.generate(
-                prompt=prompt,
-                model_name=model_name,
-                system_prompt=system_prompt,
-                temperature=0.3,
-                max_tokens=2000
-            )
-            
-            logger.info('成功获取模型响应: ' + response)
-            
-            # 解析和验证响应
-            try:
-                # 尝试查找JSON内容
-                start = response.find('{')
-                end = response.rfind('}')
-                logger.info(f'原始响应: {response}')
-                logger.info(f'JSON开始位置: {start}, 结束位置: {end}')
-                
-                if start >= 0 and end >= 0:
-                    json_str = response[start:end+1]
-                    logger.info(f'提取的JSON字符串: {json_str}')
-                    result = json.loads(json_str)
-                    logger.info(f'解析后的JSON对象: {result}')
-                else:
-                    raise ValueError('响应中未找到JSON内容')
-                
-                # 验证基本结构
-                required_fields = [
-                    'score',
-                    'academic_evaluation',
-                    'ethical_evaluation',
-                    'technical_analysis',
-                    'format_evaluation',
-                    'overall_comments'
-                ]
-                
-                for field in required_fields:
-                    if field not in result:
-                        raise ValueError(f'缺少必需字段: {field}')
-                
-                # 验证分数范围
-                score = result.get('score')
-                if not isinstance(score, (int, float)) or not (65 <= score <= 98):
-                    raise ValueError(f'总分 {score} 不在有效范围内(65-98)')
-                
-                # 验证各部分评价
-                sections = {
-                    'academic_evaluation': ['significance', 'innovation', 'methodology', 'results'],
-                    'ethical_evaluation': ['academic_integrity', 'research_ethics'],
-                    'technical_analysis': ['literature_review', 'data_analysis', 'contribution'],
-                    'format_evaluation': ['writing', 'structure']
-                }
+            # 尝试查找JSON内容
+            start = response.find('{')
+            end = response.rfind('}')
+            logger.info(f'原始响应: {response}')
+            logger.info(f'JSON开始位置: {start}, 结束位置: {end}')
+
+            if start >= 0 and end >= 0:
+                json_str = response[start:end+1]
+                logger.info(f'提取的JSON字符串: {json_str}')
+                result = json.loads(json_str)
+                logger.info(f'解析后的JSON对象: {result}')
+            else:
+                raise ValueError('响应中未找到JSON内容')
+
+            # 验证基本结构
+            required_fields = [
+                'score',
+                'academic_evaluation',
+                'ethical_evaluation',
+                'technical_analysis',
+                'format_evaluation',
+                'overall_comments'
+            ]
+
+            for field in required_fields:
+                if field not in result:
+                    raise ValueError(f'缺少必需字段: {field}')
+
+            # 验证分数范围
+            score = result.get('score')
+            if not isinstance(score, (int, float)) or not (65 <= score <= 98):
+                raise ValueError(f'总分 {score} 不在有效范围内(65-98)')
+
+            # 验证各部分评价
+            sections = {
+                'academic_evaluation': ['significance', 'innovation', 'methodology', 'results'],
+                'ethical_evaluation': ['academic_integrity', 'research_ethics'],
+                'technical_analysis': ['literature_review', 'data_analysis', 'contribution'],
+                'format_evaluation': ['writing', 'structure']
+            }
+
+            for section, criteria in sections.items():
+                if not isinstance(result[section], dict):
+                    raise ValueError(f'{section} 不是一个有效的对象')
+
+                for criterion in criteria:
+                    if criterion not in result[section]:
+                        raise ValueError(f'{section} 缺少 {criterion} 字段')
+
+                    item = result[section][criterion]
+                    if not isinstance(item, dict):
+                        raise ValueError(f'{section}.{criterion} 不是一个有效的对象')
+
+                    if 'score' not in item or 'comments' not in item:
+                        raise ValueError(f'{section}.{criterion} 缺少 score 或 comments 字段')
+
+                    # 验证分数
+                    subscore = item['score']
+                    if not isinstance(subscore, (int, float)) or not (1 <= subscore <= 10):
+                        raise ValueError(f'{section}.{criterion} 的分数 {subscore} 不在有效范围内(1-10)')
+
+                    # 验证评语
+                    comments = item['comments']
+                    if not isinstance(comments, str) or not comments.strip():
+                        raise ValueError(f'{section}.{criterion} 评语不能为空')
+
+            # 验证总体评价
+            if not isinstance(result['overall_comments'], str) or not result['overall_comments'].strip():
+                raise ValueError('总体评价不能为空')
+
+            return result
+
+        except json.JSONDecodeError as e:
+            logger.error(f'JSON解析失败: {str(e)}')
+            logger.error(f'原始响应: {response}')
+            raise ValueError('响应格式无效') from e
+
+        except ValueError as e:
+            logger.error(f'响应格式不正确: {str(e)}')
+            raise
+
+
+class OllamaClient(_OllamaBase):
+    """Ollama API客户端"""
+    
+    def _make_request(self, endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Any:
+        """
+        发送请求到 Ollama API
+        """
+        url = self._api_url(endpoint)
+        session = get_session()
+        
+        try:
+            logger.info(f'发送 {method} 请求到 {url}')
+            if data:
+                logger.info(f'请求数据: {data}')
                 
-                for section, criteria in sections.items():
-                    if not isinstance(result[section], dict):
-                        raise ValueError(f'{section} 不是一个有效的对象')
-                    
-                    for criterion in criteria:
-                        if criterion not in result[section]:
-                            raise ValueError(f'{section} 缺少 {criterion} 字段')
-                        
-                        item = result[section][criterion]
-                        if not isinstance(item, dict):
-                            raise ValueError(f'{section}.{criterion} 不是一个有效的对象')
-                        
-                        if 'score' not in item or 'comments' not in item:
-                            raise ValueError(f'{section}.{criterion} 缺少 score 或 comments 字段')
-                        
-                        # 验证分数
-                        subscore = item['score']
-                        if not isinstance(subscore, (int, float)) or not (1 <= subscore <= 10):
-                            raise ValueError(f'{section}.{criterion} 的分数 {subscore} 不在有效范围内(1-10)')
-                        
-                        # 验证评语
-                        comments = item['comments']
-                        if not isinstance(comments, str) or not comments.strip():
-                            raise ValueError(f'{section}.{criterion} 评语不能为空')
+            if method == "GET":
+                _transport_stats.request_sent()
+                response = session.get(
+                    url, timeout=(settings.OLLAMA_CONNECT_TIMEOUT, settings.OLLAMA_READ_TIMEOUT)
+                )
+            elif method == "POST":
+                _transport_stats.request_sent()
+                response = session.post(
+                    url, json=data, timeout=(settings.OLLAMA_CONNECT_TIMEOUT, settings.OLLAMA_GENERATE_TIMEOUT)
+                )
+            else:
+                raise ValueError(f"不支持的请求方法: {method}")
                 
-                # 验证总体评价
-                if not isinstance(result['overall_comments'], str) or not result['overall_comments'].strip():
-                    raise ValueError('总体评价不能为空')
+            if response.status_code != 200:
+                error_msg = f'服务器响应错误 {response.status_code}: {response.text}'
+                logger.error(error_msg)
+                raise ValueError(error_msg)
                 
+            try:
+                result = response.json()
+                logger.info(f'响应数据: {result}')
                 return result
-                
             except json.JSONDecodeError as e:
-                logger.error(f'JSON解析失败: {str(e)}')
-                logger.error(f'原始响应: {response}')
-                raise ValueError('响应格式无效') from e
+                error_msg = f'响应中没有找到JSON格式的内容\n响应状态码: {response.status_code}\n响应内容: {response.text}\n错误信息: {str(e)}'
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            
+            if isinstance(result, dict) and 'error' in result:
+                error_msg = f'服务器错误: {result["error"]}'
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            if not result:
+                error_msg = '服务器返回空响应'
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+                
+            return result
+            
+        except requests.exceptions.ConnectionError as e:
+            logger.error(f'连接失败: {str(e)}')
+            raise ValueError(f'无法连接到Ollama服务器，请确保服务器地址正确且服务器已启动')
+        except requests.exceptions.Timeout as e:
+            logger.error(f'请求超时: {str(e)}')
+            raise ValueError('请求超时，请检查服务器状态')
+        except requests.exceptions.RequestException as e:
+            logger.error(f'请求失败: {str(e)}')
+            raise ValueError(f'请求失败: {str(e)}')
+        except json.JSONDecodeError as e:
+            logger.error(f'解析响应失败: {str(e)}')
+            raise HTTPException(
+                status_code=500,
+                detail=f'解析响应失败: {str(e)}'
+            )
+    
+    def _stream_request(self, endpoint: str, data: Dict, metrics: GenerationMetrics) -> Iterator[str]:
+        """
+        以流式方式发送POST请求，逐行解析Ollama返回的JSON，每收到一段文本就产出一次
+        :param endpoint: API端点
+        :param data: 请求数据（stream 为 True）
+        :param metrics: 记录首个token耗时和生成速度
+        :return: 文本片段的迭代器
+        """
+        url = self._api_url(endpoint)
+        
+        try:
+            logger.info(f'发送流式 POST 请求到 {url}')
+            _transport_stats.request_sent()
+            metrics._start(data["model"])
+            with get_session().post(
+                url, json=data, stream=True,
+                timeout=(settings.OLLAMA_CONNECT_TIMEOUT, settings.OLLAMA_GENERATE_TIMEOUT)
+            ) as response:
+                if response.status_code != 200:
+                    error_msg = f'服务器响应错误 {response.status_code}: {response.text}'
+                    logger.error(error_msg)
+                    raise ValueError(error_msg)
                 
-            except ValueError as e:
-                logger.error(f'响应格式不正确: {str(e)}')
-                raise
+                chunk = None
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = self._stream_chunk(line)
+                    token = chunk.get('response', '')
+                    if token:
+                        metrics._token()
+                        yield token
+                    if chunk.get('done'):
+                        break
+                _record_generation(metrics, chunk)
+                
+        except requests.exceptions.ConnectionError as e:
+            logger.error(f'连接失败: {str(e)}')
+            raise ValueError(f'无法连接到Ollama服务器，请确保服务器地址正确且服务器已启动')
+        except requests.exceptions.Timeout as e:
+            logger.error(f'请求超时: {str(e)}')
+            raise ValueError('请求超时，请检查服务器状态')
+        except requests.exceptions.RequestException as e:
+            logger.error(f'请求失败: {str(e)}')
+            raise ValueError(f'请求失败: {str(e)}')
+        except json.JSONDecodeError as e:
+            logger.error(f'解析流式响应失败: {str(e)}')
+            raise ValueError(f'解析响应失败: {str(e)}')
+    
+    def list_models(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        获取已安装的Ollama模型列表，结果按服务器缓存 OLLAMA_MODEL_CACHE_TTL 秒
+        返回格式：{"models": [{"name": "模型名称", "size": 模型大小}]}
+        :param refresh: 是否忽略缓存重新获取
+        """
+        try:
+            return _inventory.get(
+                self.base_url, lambda: self._format_models(self._make_request('tags')), refresh
+            )
+            
+        except Exception as e:
+            logger.error(f'获取模型列表失败: {str(e)}')
+            return {"models": []}
+    
+    def check_model(self, model_name: str) -> bool:
+        """
+        检查模型是否已安装
+        """
+        try:
+            logger.info(f'检查模型是否可用: {model_name}')
+            models = self.list_models()
+            if not self._has_model(models, model_name):
+                # 缓存中没有时重新获取一次，模型可能刚刚安装
+                models = self.list_models(refresh=True)
+            return self._model_available(models, model_name)
+            
+        except Exception as e:
+            logger.error(f'检查模型时发生错误: {str(e)}')
+            return False
+    
+    def generate_stream(self,
+                        prompt: str,
+                        model_name: str | None = None,
+                        system_prompt: Optional[str] = None,
+                        temperature: float | None = None,
+                        max_tokens: int | None = None,
+                        metrics: Optional[GenerationMetrics] = None) -> Iterator[str]:
+        """
+        以流式方式生成文本，模型每输出一段文本就产出一次
+        :param prompt: 提示文本
+        :param model_name: 模型名称
+        :param system_prompt: 系统提示
+        :param temperature: 温度参数
+        :param max_tokens: 最大生成token数
+        :param metrics: 可选，生成结束后填入首个token耗时和生成速度
+        :return: 文本片段的迭代器
+        """
+        # 参数验证和默认值设置
+        data = self._generate_payload(prompt, model_name, system_prompt, temperature, max_tokens, stream=True)
+        model_name = data["model"]
+        
+        # 检查模型是否存在
+        if not self.check_model(model_name):
+            raise ValueError(f"模型 {model_name} 不存在或无法访问")
+        
+        logger.info(f'使用模型 {model_name} 生成文本')
+        logger.debug(f'请求数据: {data}')
+        yield from self._stream_request('generate', data, metrics or GenerationMetrics())
+    
+    def generate(self, 
+                prompt: str, 
+                model_name: str | None = None,
+                system_prompt: Optional[str] = None,
+                temperature: float | None = None,
+                max_tokens: int | None = None,
+                on_token: Optional[Callable[[str], None]] = None,
+                metrics: Optional[GenerationMetrics] = None) -> str:
+        """
+        生成文本响应
+        :param prompt: 提示文本
+        :param model_name: 模型名称
+        :param system_prompt: 系统提示
+        :param temperature: 温度参数
+        :param max_tokens: 最大生成token数
+        :param on_token: 可选，每收到一段文本回调一次
+        :param metrics: 可选，生成结束后填入首个token耗时和生成速度
+        :return: 生成的文本
+        """
+        try:
+            parts = []
+            for token in self.generate_stream(prompt, model_name, system_prompt, temperature, max_tokens, metrics):
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+            return ''.join(parts)
+            
+        except ValueError as e:
+            logger.error(f'生成文本失败: {str(e)}')
+            raise ValueError(str(e))
+        except Exception as e:
+            logger.error(f'生成文本失败: {str(e)}')
+            raise ValueError(f'生成文本失败: {str(e)}')
+    
+    def evaluate_paper(self, 
+                      paper_text: str, 
+                      paper_type: str,
+                      reference_texts: list[str],
+                      historical_papers: list[dict] = None,
+                      plagiarism_results: list[dict] = None,
+                      model_name: str | None = None,
+                      on_token: Optional[Callable[[str], None]] = None,
+                      metrics: Optional[GenerationMetrics] = None) -> Dict[str, Any]:
+        """
+        评价论文
+        :param paper_text: 论文文本
+        :param paper_type: 论文类型（本科/硕士/博士）
+        :param reference_texts: 参考文献列表
+        :param model_name: 使用的模型名称
+        :param on_token: 可选，模型输出的回调，用于向客户端推送生成进度
+        :param metrics: 可选，生成结束后填入首个token耗时和生成速度
+        :return: 评价结果，包含分数和评语
+        """
+        self._check_evaluation_args(paper_text, paper_type)
+        
+        # 检查模型
+        model_name = model_name or self.default_model
+        if not model_name:
+            raise ValueError('未选择模型')
+        
+        logger.info(f'使用模型: {model_name}')
+        
+        if not self.check_model(model_name):
+            raise ValueError(f'模型 {model_name} 不可用')
+        
+        prompt, system_prompt = self._build_evaluation_prompts(
+            paper_text, paper_type, reference_texts, historical_papers, plagiarism_results
+        )
+
+        try:
+            # 生成评价
+            response = self.generate(
+                prompt=prompt,
+                model_name=model_name,
+                system_prompt=system_prompt,
+                temperature=0.3,
+                max_tokens=2000,
+                on_token=on_token,
+                metrics=metrics
+            )
+            
+            logger.info('成功获取模型响应: ' + response)
+            
+            # 解析和验证响应
+            return self._parse_evaluation(response)
                 
         except Exception as e:
             logger.error(f'论文评价失败: {str(e)}')
@@ -691,3 +1180,311 @@ class OllamaClient:
             return False
             
         return True
+
+
+_T = TypeVar('_T')
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[_T], poll_interval: float = 1.0) -> _T:
+    """
+    等待协程完成，期间客户端断开连接时取消协程（进行中的Ollama请求随之关闭，服务器停止生成）
+    :param request: 当前请求
+    :param awaitable: 要执行的协程
+    :param poll_interval: 检查连接状态的间隔秒数
+    :return: 协程的结果
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info('客户端已断开连接，取消正在进行的请求')
+                task.cancel()
+                raise HTTPException(status_code=499, detail='客户端已断开连接')
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+class AsyncOllamaClient(_OllamaBase):
+    """
+    异步Ollama API客户端，接口与 OllamaClient 相同；
+    请求不阻塞事件循环，协程被取消时HTTP连接随之关闭
+    """
+    
+    def _load_config(self) -> None:
+        """只读取配置缓存中已有的快照，不在事件循环中查询数据库；快照由 load_config 刷新"""
+        if self._base_url is not None:
+            return
+
+        self._config = get_config_cache().peek()
+    
+    async def load_config(self) -> None:
+        """需要检查配置版本号时在线程中刷新配置缓存，之后的配置属性读取刷新后的快照"""
+        if self._base_url is not None:
+            return
+
+        self._config = await get_config_cache().aget()
+    
+    async def _make_request(self, endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Any:
+        """
+        发送请求到 Ollama API
+        """
+        url = self._api_url(endpoint)
+        client = get_async_client()
+        
+        try:
+            logger.info(f'发送 {method} 请求到 {url}')
+            if data:
+                logger.info(f'请求数据: {data}')
+                
+            if method == "GET":
+                _transport_stats.request_sent()
+                response = await client.get(url, extensions={"trace": _trace_connection})
+            elif method == "POST":
+                _transport_stats.request_sent()
+                response = await client.post(
+                    url, json=data,
+                    timeout=httpx.Timeout(settings.OLLAMA_GENERATE_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT, pool=None),
+                    extensions={"trace": _trace_connection}
+                )
+            else:
+                raise ValueError(f"不支持的请求方法: {method}")
+                
+            if response.status_code != 200:
+                error_msg = f'服务器响应错误 {response.status_code}: {response.text}'
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+                
+            try:
+                result = response.json()
+                logger.info(f'响应数据: {result}')
+                return result
+            except json.JSONDecodeError as e:
+                error_msg = f'响应中没有找到JSON格式的内容\n响应状态码: {response.status_code}\n响应内容: {response.text}\n错误信息: {str(e)}'
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            
+        except httpx.ConnectError as e:
+            logger.error(f'连接失败: {str(e)}')
+            raise ValueError(f'无法连接到Ollama服务器，请确保服务器地址正确且服务器已启动')
+        except httpx.TimeoutException as e:
+            logger.error(f'请求超时: {str(e)}')
+            raise ValueError('请求超时，请检查服务器状态')
+        except httpx.HTTPError as e:
+            logger.error(f'请求失败: {str(e)}')
+            raise ValueError(f'请求失败: {str(e)}')
+    
+    async def _stream_request(self, endpoint: str, data: Dict, metrics: GenerationMetrics) -> AsyncIterator[str]:
+        """
+        以流式方式发送POST请求，逐行解析Ollama返回的JSON，每收到一段文本就产出一次
+        :param endpoint: API端点
+        :param data: 请求数据（stream 为 True）
+        :param metrics: 记录首个token耗时和生成速度
+        :return: 文本片段的异步迭代器
+        """
+        url = self._api_url(endpoint)
+        
+        try:
+            logger.info(f'发送流式 POST 请求到 {url}')
+            _transport_stats.request_sent()
+            metrics._start(data["model"])
+            async with get_async_client().stream(
+                "POST", url, json=data,
+                timeout=httpx.Timeout(settings.OLLAMA_GENERATE_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT, pool=None),
+                extensions={"trace": _trace_connection}
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode('utf-8', errors='replace')
+                    error_msg = f'服务器响应错误 {response.status_code}: {body}'
+                    logger.error(error_msg)
+                    raise ValueError(error_msg)
+                
+                chunk = None
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = self._stream_chunk(line)
+                    token = chunk.get('response', '')
+                    if token:
+                        metrics._token()
+                        yield token
+                    if chunk.get('done'):
+                        break
+                _record_generation(metrics, chunk)
+                
+        except httpx.ConnectError as e:
+            logger.error(f'连接失败: {str(e)}')
+            raise ValueError(f'无法连接到Ollama服务器，请确保服务器地址正确且服务器已启动')
+        except httpx.TimeoutException as e:
+            logger.error(f'请求超时: {str(e)}')
+            raise ValueError('请求超时，请检查服务器状态')
+        except httpx.HTTPError as e:
+            logger.error(f'请求失败: {str(e)}')
+            raise ValueError(f'请求失败: {str(e)}')
+        except json.JSONDecodeError as e:
+            logger.error(f'解析流式响应失败: {str(e)}')
+            raise ValueError(f'解析响应失败: {str(e)}')
+    
+    async def list_models(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        获取已安装的Ollama模型列表，结果按服务器缓存 OLLAMA_MODEL_CACHE_TTL 秒
+        返回格式：{"models": [{"name": "模型名称", "size": 模型大小}]}
+        :param refresh: 是否忽略缓存重新获取
+        """
+        async def fetch() -> Dict[str, Any]:
+            return self._format_models(await self._make_request('tags'))
+        
+        await self.load_config()
+        try:
+            return await _inventory.aget(self.base_url, fetch, refresh)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f'获取模型列表失败: {str(e)}')
+            return {"models": []}
+    
+    async def check_model(self, model_name: str) -> bool:
+        """
+        检查模型是否已安装
+        """
+        try:
+            logger.info(f'检查模型是否可用: {model_name}')
+            models = await self.list_models()
+            if not self._has_model(models, model_name):
+                # 缓存中没有时重新获取一次，模型可能刚刚安装
+                models = await self.list_models(refresh=True)
+            return self._model_available(models, model_name)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f'检查模型时发生错误: {str(e)}')
+            return False
+    
+    async def generate_stream(self,
+                              prompt: str,
+                              model_name: str | None = None,
+                              system_prompt: Optional[str] = None,
+                              temperature: float | None = None,
+                              max_tokens: int | None = None,
+                              metrics: Optional[GenerationMetrics] = None) -> AsyncIterator[str]:
+        """
+        以流式方式生成文本，模型每输出一段文本就产出一次；迭代中途停止时需要调用 aclose() 及时关闭连接
+        :param prompt: 提示文本
+        :param model_name: 模型名称
+        :param system_prompt: 系统提示
+        :param temperature: 温度参数
+        :param max_tokens: 最大生成token数
+        :param metrics: 可选，生成结束后填入首个token耗时和生成速度
+        :return: 文本片段的异步迭代器
+        """
+        await self.load_config()
+        data = self._generate_payload(prompt, model_name, system_prompt, temperature, max_tokens, stream=True)
+        model_name = data["model"]
+        
+        # 检查模型是否存在
+        if not await self.check_model(model_name):
+            raise ValueError(f"模型 {model_name} 不存在或无法访问")
+        
+        logger.info(f'使用模型 {model_name} 生成文本')
+        logger.debug(f'请求数据: {data}')
+        stream = self._stream_request('generate', data, metrics or GenerationMetrics())
+        try:
+            async for token in stream:
+                yield token
+        finally:
+            await stream.aclose()
+    
+    async def generate(self,
+                       prompt: str,
+                       model_name: str | None = None,
+                       system_prompt: Optional[str] = None,
+                       temperature: float | None = None,
+                       max_tokens: int | None = None,
+                       on_token: Optional[Callable[[str], None]] = None,
+                       metrics: Optional[GenerationMetrics] = None) -> str:
+        """
+        生成文本响应
+        :param prompt: 提示文本
+        :param model_name: 模型名称
+        :param system_prompt: 系统提示
+        :param temperature: 温度参数
+        :param max_tokens: 最大生成token数
+        :param on_token: 可选，每收到一段文本回调一次
+        :param metrics: 可选，生成结束后填入首个token耗时和生成速度
+        :return: 生成的文本
+        """
+        try:
+            parts = []
+            async for token in self.generate_stream(prompt, model_name, system_prompt, temperature, max_tokens, metrics):
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+            return ''.join(parts)
+            
+        except asyncio.CancelledError:
+            logger.info('生成请求已取消')
+            raise
+        except ValueError as e:
+            logger.error(f'生成文本失败: {str(e)}')
+            raise
+        except Exception as e:
+            logger.error(f'生成文本失败: {str(e)}')
+            raise ValueError(f'生成文本失败: {str(e)}')
+    
+    async def evaluate_paper(self,
+                             paper_text: str,
+                             paper_type: str,
+                             reference_texts: list[str],
+                             historical_papers: list[dict] = None,
+                             plagiarism_results: list[dict] = None,
+                             model_name: str | None = None,
+                             on_token: Optional[Callable[[str], None]] = None,
+                             metrics: Optional[GenerationMetrics] = None) -> Dict[str, Any]:
+        """
+        评价论文
+        :param paper_text: 论文文本
+        :param paper_type: 论文类型（本科/硕士/博士）
+        :param reference_texts: 参考文献列表
+        :param model_name: 使用的模型名称
+        :param on_token: 可选，模型输出的回调，用于向客户端推送生成进度
+        :param metrics: 可选，生成结束后填入首个token耗时和生成速度
+        :return: 评价结果，包含分数和评语
+        """
+        self._check_evaluation_args(paper_text, paper_type)
+        
+        await self.load_config()
+        model_name = model_name or self.default_model
+        if not model_name:
+            raise ValueError('未选择模型')
+        
+        logger.info(f'使用模型: {model_name}')
+        
+        if not await self.check_model(model_name):
+            raise ValueError(f'模型 {model_name} 不可用')
+        
+        prompt, system_prompt = self._build_evaluation_prompts(
+            paper_text, paper_type, reference_texts, historical_papers, plagiarism_results
+        )
+        
+        try:
+            response = await self.generate(
+                prompt=prompt,
+                model_name=model_name,
+                system_prompt=system_prompt,
+                temperature=0.3,
+                max_tokens=2000,
+                on_token=on_token,
+                metrics=metrics
+            )
+            
+            logger.info('成功获取模型响应: ' + response)
+            return self._parse_evaluation(response)
+            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f'论文评价失败: {str(e)}')
+            raise
@@ -0,0 +1,132 @@
+import re
+import logging
+from typing import List
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 论文中常见的章节标题：第X章/节、中文序号、阿拉伯数字编号、摘要/参考文献等固定标题
+_HEADING_PATTERN = re.compile(
+    r'^\s*('
+    r'第[一二三四五六七八九十百零\d]+[章节部分篇]'
+    r'|[一二三四五六七八九十]+\s*[、.．]'
+    r'|\d+(\.\d+){0,3}\s+\S'
+    r'|摘\s*要|abstract|目\s*录|参考文献|references|致\s*谢|acknowledg|附\s*录|appendix'
+    r'|chapter\s+\d+'
+    r')',
+    re.IGNORECASE
+)
+
+# 句子结束符，切分窗口时尽量在这些位置断开
+_SENTENCE_END = re.compile(r'[。！？；!?;.\n]')
+
+
+def split_sections(text: str) -> List[str]:
+    """
+    按章节标题把文本切分为若干段
+    :param text: 文档全文
+    :return: 章节文本列表（标题保留在章节开头）
+    """
+    sections = []
+    current = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        # 标题行通常较短，避免把以数字开头的正文句子误判为标题
+        if current and len(stripped) <= 60 and _HEADING_PATTERN.match(stripped):
+            sections.append("\n".join(current))
+            current = []
+        current.append(stripped)
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+def _window_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """
+    滑动窗口切分，窗口末尾尽量对齐到句子边界
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            # 在窗口后半段寻找最后一个句子结束符
+            boundary = None
+            for match in _SENTENCE_END.finditer(text, start + chunk_size // 2, end):
+                boundary = match.end()
+            if boundary:
+                end = boundary
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def _split(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """
+    按给定块大小切分：较短的相邻章节合并，较长的章节用滑动窗口切分
+    """
+    chunks = []
+    buffer = ""
+    for section in split_sections(text):
+        if len(buffer) + len(section) + 1 <= chunk_size:
+            buffer = f"{buffer}\n{section}" if buffer else section
+            continue
+        if buffer:
+            chunks.append(buffer)
+            buffer = ""
+        if len(section) <= chunk_size:
+            buffer = section
+        else:
+            chunks.extend(_window_chunks(section, chunk_size, overlap))
+    if buffer:
+        chunks.append(buffer)
+    return chunks
+
+
+def chunk_text(text: str,
+               chunk_size: int = None,
+               overlap: int = None,
+               max_chunks: int = None) -> List[str]:
+    """
+    将长文档切分为带重叠的文本块：先按章节切分，较短的相邻章节合并，较长的章节再用滑动窗口切分
+    :param text: 文档全文
+    :param chunk_size: 每块的最大字符数
+    :param overlap: 相邻块之间重叠的字符数
+    :param max_chunks: 最多生成的块数，超出时增大块大小重新切分，不会丢弃文档末尾的内容
+    :return: 文本块列表
+    """
+    chunk_size = chunk_size or settings.CHUNK_SIZE
+    overlap = settings.CHUNK_OVERLAP if overlap is None else overlap
+    max_chunks = max_chunks or settings.CHUNK_MAX_PER_DOCUMENT
+
+    if not text or not text.strip():
+        return []
+
+    requested_size = chunk_size
+    # 文档过长时先按比例放大块大小，减少重新切分的次数
+    stride = max(chunk_size - overlap, 1)
+    if len(text) / stride > max_chunks:
+        scale = len(text) / stride / max_chunks
+        chunk_size = int(chunk_size * scale) + 1
+        overlap = int(overlap * scale)
+
+    chunks = _split(text, chunk_size, overlap)
+    # 窗口会回退到句子边界，实际块数可能仍超过上限：继续放大块大小直到块数不超过上限
+    while len(chunks) > max_chunks:
+        scale = len(chunks) / max_chunks * 1.1
+        chunk_size = int(chunk_size * scale) + 1
+        overlap = int(overlap * scale)
+        chunks = _split(text, chunk_size, overlap)
+
+    if chunk_size != requested_size:
+        logger.warning(f'文档长度 {len(text)} 字符超过块数上限 {max_chunks}，块大小调整为 {chunk_size} 字符，'
+                       f'共 {len(chunks)} 块；超出模型长度上限的部分在编码时会被截断')
+    return chunks
@@ -1,14 +1,67 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import json
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 import os
+import sqlite3
+import threading
+import asyncio
+import hashlib
 from backend.core.config import settings
+from backend.utils.vector_wal import VectorWAL, OP_ADD, OP_DELETE, OP_ADD_CHUNKS
+from backend.utils import index_factory, encoders
+from backend.utils.encoder_pool import EncoderPool
+from backend.utils.text_chunker import chunk_text
+from backend.utils.disk_cache import DiskCache
 
 logger = logging.getLogger(__name__)
 
+# 向量ID = (命名空间 << 48) | 数据库主键，使论文和知识库文档共用一个索引而不冲突
+DOC_ID_NAMESPACES = {
+    "paper": 1,
+    "knowledge": 2
+}
+_NAMESPACE_SHIFT = 48
+
+
+def make_doc_id(namespace: str, pk: int) -> int:
+    """
+    根据数据库主键生成向量ID
+    :param namespace: 命名空间（paper 或 knowledge）
+    :param pk: 数据库主键
+    :return: 向量ID
+    """
+    return (DOC_ID_NAMESPACES[namespace] << _NAMESPACE_SHIFT) | int(pk)
+
+
+# 文本块向量ID = 标志位 | (文档ID << 12) | 块序号，每个文档最多 4096 个块
+_CHUNK_FLAG = 1 << 62
+_CHUNK_BITS = 12
+
+
+def chunk_vector_id(doc_id: int, chunk_index: int) -> int:
+    """
+    生成文本块的向量ID
+    :param doc_id: 所属文档ID
+    :param chunk_index: 块序号
+    :return: 向量ID
+    """
+    return _CHUNK_FLAG | (int(doc_id) << _CHUNK_BITS) | int(chunk_index)
+
+
+def parent_doc_id(vector_id: int) -> int:
+    """
+    根据向量ID取得所属文档ID（整篇文档一个向量的旧数据，向量ID即文档ID）
+    :param vector_id: 向量ID
+    :return: 文档ID
+    """
+    vector_id = int(vector_id)
+    if vector_id & _CHUNK_FLAG:
+        return (vector_id & ~_CHUNK_FLAG) >> _CHUNK_BITS
+    return vector_id
+
+
 class VectorStore:
     """向量存储和检索类"""
     
@@ -22,141 +75,788 @@ class VectorStore:
     
     def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
         """
-        初始化向量存储
+        初始化向量存储（只创建空状态，模型和索引在首次使用或后台预热时加载）
         :param model_name: 使用的sentence-transformer模型名称
         """
         if self._initialized:
             return
             
-        self.model = None
+        self.model_name = model_name
+        self._model = None
         self.index = None
         self.dimension = 384  # 默认维度
         self.document_map: Dict[int, Dict[str, Any]] = {}
-        
+        self.directory = None
+        self._wal = None
+        self._lock = threading.RLock()
+        # 已删除但尚未从索引中物理移除的向量ID
+        self._tombstones = set()
+        # 不支持删除的索引（HNSW）中已被覆盖的旧向量的存储位置；覆盖时沿用同一向量ID，只能按位置排除
+        self._stale_positions = set()
+        # 后台重建索引期间发生的变更，重建完成后补写到新索引；为None表示没有进行中的重建
+        self._rebuild_log = None
+        # 加载状态：pending 未加载、loading 加载中、ready 已加载、failed 加载失败
+        self._load_lock = threading.Lock()
+        self._load_state = "pending"
+        # 异步编码使用的工作池，首次调用 aencode 时创建
+        self._encoder_pool = None
+        # 文本向量缓存及当前模型标识（模型名称、后端和探针向量的哈希）
+        self._embedding_cache = None
+        self._model_tag = None
+        self._initialized = True
+
+    @property
+    def model(self):
+        """向量模型，首次访问时加载"""
+        self._ensure_loaded()
+        return self._model
+
+    @property
+    def load_state(self) -> str:
+        """模型和索引的加载状态"""
+        return self._load_state
+
+    @property
+    def ready(self) -> bool:
+        """模型和索引是否已加载完成并可用，不会触发加载"""
+        return self._load_state == "ready" and self._model is not None and self.index is not None
+
+    def warm_up(self) -> None:
+        """在后台线程中预先加载模型和索引，尚未开始加载时才会启动"""
+        if self._load_state != "pending":
+            return
+        threading.Thread(target=self._ensure_loaded, name="vector-model-warmup", daemon=True).start()
+
+    def _ensure_loaded(self) -> None:
+        """确保模型和索引已加载，多个线程同时调用时只加载一次"""
+        if self._load_state in ("ready", "failed"):
+            return
+        with self._load_lock:
+            if self._load_state in ("ready", "failed"):
+                return
+            self._load_state = "loading"
+            self._load_state = "ready" if self._load() else "failed"
+
+    def _load(self) -> bool:
+        """
+        加载编码模型并打开持久化索引
+        :return: 是否成功（模型加载失败时以有限功能模式运行，仍返回True）
+        """
         try:
-            # 确保模型缓存目录存在
             cache_dir = os.path.abspath('./models')
-            os.makedirs(cache_dir, exist_ok=True)
-            logger.info(f'模型缓存目录：{cache_dir}')
+            backend = settings.EMBEDDING_BACKEND
             
-            # 检查缓存目录中是否已有模型文件
-            model_name = 'paraphrase-multilingual-MiniLM-L12-v2'
-            model_files_exist = False
-            model_dir = os.path.join(cache_dir, model_name)
-            
-            if os.path.exists(model_dir):
-                logger.info(f'检测到模型目录存在: {model_dir}')
-                # 检查模型文件是否完整
-                required_files = ['config.json', 'pytorch_model.bin', 'tokenizer.json']
-                files_in_dir = os.listdir(model_dir) if os.path.isdir(model_dir) else []
-                logger.info(f'模型目录内容: {files_in_dir}')
-                
-                # 检查关键模型文件是否存在
-                if any(f for f in files_in_dir if f.endswith('.bin')):
-                    model_files_exist = True
-                    logger.info('检测到模型文件已存在')
-            
-            # 尝试加载模型，如果不存在则下载
+            # 按配置创建编码后端，非torch后端加载失败或一致性检查不通过时回退到torch
             try:
-                if model_files_exist:
-                    logger.info(f'使用本地缓存的模型: {model_name}')
-                else:
-                    logger.info(f'模型文件不存在，将从网络下载: {model_name}')
-                
-                # 加载或下载模型
-                logger.info(f'开始加载模型: {model_name}')
-                self.model = SentenceTransformer(model_name, cache_folder=cache_dir)
-                logger.info('模型加载成功')
+                logger.info(f'开始加载编码模型: {self.model_name}, 后端: {backend}')
+                self._model = encoders.create_encoder(backend, self.model_name, cache_dir)
+                if backend != encoders.BACKEND_TORCH and settings.EMBEDDING_PARITY_CHECK:
+                    if not encoders.verify_parity(self._model, self.model_name, cache_dir):
+                        logger.warning(f'编码后端 {backend} 与torch后端输出不一致，回退到torch后端')
+                        self._model = encoders.create_encoder(encoders.BACKEND_TORCH, self.model_name, cache_dir)
             except Exception as e:
                 logger.error(f'模型加载失败：{str(e)}')
-                logger.warning('将以有限功能模式运行，知识库搜索功能将不可用')
+                if backend != encoders.BACKEND_TORCH:
+                    try:
+                        logger.warning(f'编码后端 {backend} 不可用，回退到torch后端')
+                        self._model = encoders.create_encoder(encoders.BACKEND_TORCH, self.model_name, cache_dir)
+                    except Exception as e:
+                        logger.error(f'模型加载失败：{str(e)}')
+                if not self._model:
+                    logger.warning('将以有限功能模式运行，知识库搜索功能将不可用')
             
             # 如果模型加载成功，获取实际维度
-            if self.model:
+            if self._model:
                 test_text = "测试文本"
-                test_vector = self.model.encode([test_text])[0]
+                test_vector = self._model.encode([test_text])[0]
                 self.dimension = len(test_vector)
-                logger.info(f'模型输出维度：{self.dimension}')
+                logger.info(f'编码后端: {self._model.backend}, 模型输出维度：{self.dimension}')
+                self._open_embedding_cache(test_vector)
             
             # 初始化FAISS索引
-            self.index = faiss.IndexFlatL2(self.dimension)
-            logger.info('向量存储初始化完成')
+            self.index = self._new_index()
             
-            # 标记初始化完成
-            self._initialized = True
+            # 从配置的目录恢复快照并重放预写日志
+            base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+            self._open_storage(os.path.join(base_dir, settings.VECTOR_STORE_DIR))
+            logger.info('向量存储初始化完成')
+            return True
             
         except Exception as e:
             logger.error(f'初始化VectorStore时发生错误：{str(e)}')
             logger.warning('将以有限功能模式运行，知识库搜索功能将不可用')
+            return False
+
+    @property
+    def use_cosine(self) -> bool:
+        """是否使用归一化向量+内积索引，此时检索分数即余弦相似度"""
+        return settings.VECTOR_METRIC == "cosine"
 
-    def add_document(self, text: str, metadata: Dict[str, Any]) -> int:
+    @property
+    def metric(self) -> int:
+        """索引使用的faiss度量方式"""
+        return faiss.METRIC_INNER_PRODUCT if self.use_cosine else faiss.METRIC_L2
+
+    def _new_index(self) -> faiss.Index:
+        """创建以文档ID为键的空索引"""
+        return index_factory.build_index(index_factory.select_index_type(0), self.dimension, self.metric)
+
+    def _prepare_vectors(self, vectors: np.ndarray) -> np.ndarray:
         """
-        添加文档到向量存储
+        转换为索引所需的格式：float32、二维、连续内存；余弦模式下做L2归一化
+        :param vectors: 原始向量
+        :return: 处理后的向量（不修改原数组）
+        """
+        vectors = np.array(vectors, dtype=np.float32, copy=True).reshape(-1, self.index.d)
+        if self.use_cosine:
+            faiss.normalize_L2(vectors)
+        return vectors
+
+    def add_document(self, text: str, metadata: Dict[str, Any], doc_id: Optional[int] = None) -> int:
+        """
+        添加文档到向量存储：文档切分为文本块后逐块编码，每个块一个向量；ID已存在时覆盖原有向量
         :param text: 文档文本
         :param metadata: 文档元数据
+        :param doc_id: 文档ID，通常由 make_doc_id 根据数据库主键生成；为空时自动分配
         :return: 文档ID
         """
+        return self.add_documents([text], [metadata], [doc_id])[0]
+
+    def add_documents(self,
+                      texts: List[str],
+                      metadatas: List[Dict[str, Any]],
+                      doc_ids: Optional[List[Optional[int]]] = None) -> List[int]:
+        """
+        批量添加文档：所有文档的文本块一起按长度分批编码，再一次性写入索引，适用于知识库或历史论文的批量导入
+        :param texts: 文档文本列表
+        :param metadatas: 文档元数据列表，与 texts 一一对应
+        :param doc_ids: 文档ID列表，为空或其中某项为None时自动分配
+        :return: 文档ID列表
+        """
         try:
             if not self.model or not self.index:
                 raise RuntimeError("向量存储未正确初始化，无法添加文档")
+            doc_ids = self._check_batch(texts, metadatas, doc_ids)
+            if not texts:
+                return []
                 
-            logger.debug(f"开始生成文档向量，文本长度: {len(text)}")
+            logger.debug(f"开始生成文档向量，文档数: {len(texts)}, 总文本长度: {sum(len(text) for text in texts)}")
             
-            # 生成文档向量
-            vector = self.model.encode([text])[0]
-            vector = np.array(vector, dtype=np.float32)  # 确保数据类型正确
-            
-            if len(vector) != self.dimension:
-                raise ValueError(f"向量维度不匹配，期望: {self.dimension}, 实际: {len(vector)}")
+            # 切分所有文档后一起编码，充分利用模型的批处理能力
+            doc_chunks = [self.chunk_document(text) for text in texts]
+            all_vectors = self.encode_batch([chunk for chunks in doc_chunks for chunk in chunks])
+            return self._insert_documents([len(chunks) for chunks in doc_chunks], all_vectors, metadatas, doc_ids)
+        except Exception as e:
+            logger.error(f"添加文档到向量存储失败: {str(e)}")
+            raise
+
+    async def aadd_document(self, text: str, metadata: Dict[str, Any], doc_id: Optional[int] = None) -> int:
+        """
+        add_document 的异步版本：编码在工作池中进行，不阻塞事件循环
+        :param text: 文档文本
+        :param metadata: 文档元数据
+        :param doc_id: 文档ID，为空时自动分配
+        :return: 文档ID
+        """
+        return (await self.aadd_documents([text], [metadata], [doc_id]))[0]
+
+    async def aadd_documents(self,
+                             texts: List[str],
+                             metadatas: List[Dict[str, Any]],
+                             doc_ids: Optional[List[Optional[int]]] = None) -> List[int]:
+        """
+        add_documents 的异步版本：编码在工作池中进行，写入索引和预写日志在线程中进行
+        :param texts: 文档文本列表
+        :param metadatas: 文档元数据列表
+        :param doc_ids: 文档ID列表
+        :return: 文档ID列表
+        """
+        try:
+            await asyncio.to_thread(self._ensure_loaded)
+            if not self._model or not self.index:
+                raise RuntimeError("向量存储未正确初始化，无法添加文档")
+            doc_ids = self._check_batch(texts, metadatas, doc_ids)
+            if not texts:
+                return []
             
-            # 添加到FAISS索引
-            vector = vector.reshape(1, -1)
-            doc_id = len(self.document_map)
-            self.index.add(vector)
+            doc_chunks = [self.chunk_document(text) for text in texts]
+            all_vectors = await self.aencode([chunk for chunks in doc_chunks for chunk in chunks])
+            return await asyncio.to_thread(
+                self._insert_documents, [len(chunks) for chunks in doc_chunks], all_vectors, metadatas, doc_ids
+            )
+        except Exception as e:
+            logger.error(f"添加文档到向量存储失败: {str(e)}")
+            raise
+
+    async def aadd_vectors(self, vectors: np.ndarray, metadata: Dict[str, Any], doc_id: Optional[int] = None) -> int:
+        """
+        写入已编码的文档：用于分阶段导入，文本块已通过 chunk_document 切分并用 aencode 编码
+        :param vectors: 文本块向量矩阵
+        :param metadata: 文档元数据
+        :param doc_id: 文档ID，为空时自动分配
+        :return: 文档ID
+        """
+        try:
+            await asyncio.to_thread(self._ensure_loaded)
+            if not self._model or not self.index:
+                raise RuntimeError("向量存储未正确初始化，无法添加文档")
+            if len(vectors) == 0:
+                raise ValueError("文档没有可写入的向量")
+            doc_ids = await asyncio.to_thread(self._insert_documents, [len(vectors)], vectors, [metadata], [doc_id])
+            return doc_ids[0]
+        except Exception as e:
+            logger.error(f"添加文档到向量存储失败: {str(e)}")
+            raise
+
+    @staticmethod
+    def _check_batch(texts: List[str],
+                     metadatas: List[Dict[str, Any]],
+                     doc_ids: Optional[List[Optional[int]]]) -> List[Optional[int]]:
+        """
+        检查批量添加的参数
+        :return: 与 texts 等长的文档ID列表
+        """
+        if len(metadatas) != len(texts):
+            raise ValueError(f"文档数量 {len(texts)} 与元数据数量 {len(metadatas)} 不一致")
+        doc_ids = list(doc_ids) if doc_ids is not None else [None] * len(texts)
+        if len(doc_ids) != len(texts):
+            raise ValueError(f"文档数量 {len(texts)} 与文档ID数量 {len(doc_ids)} 不一致")
+        explicit_ids = [doc_id for doc_id in doc_ids if doc_id is not None]
+        if len(set(explicit_ids)) != len(explicit_ids):
+            raise ValueError("同一批次中存在重复的文档ID")
+        return doc_ids
+
+    def _insert_documents(self,
+                          chunk_counts: List[int],
+                          all_vectors: np.ndarray,
+                          metadatas: List[Dict[str, Any]],
+                          doc_ids: List[Optional[int]]) -> List[int]:
+        """
+        将已编码的文档写入索引、元数据和预写日志
+        :param chunk_counts: 每个文档的文本块数
+        :param all_vectors: 所有文档的文本块向量，按文档顺序拼接
+        :param metadatas: 文档元数据列表
+        :param doc_ids: 文档ID列表，None表示自动分配
+        :return: 文档ID列表
+        """
+        all_vectors = self._prepare_vectors(all_vectors)
+        doc_ids = list(doc_ids)
+        with self._lock:
+            all_ids = []
+            offset = 0
+            for position, (count, metadata) in enumerate(zip(chunk_counts, metadatas)):
+                doc_id = doc_ids[position]
+                vectors = all_vectors[offset:offset + count]
+                offset += count
+                
+                if doc_id is None:
+                    doc_id = self._allocate_id()
+                else:
+                    # 覆盖已有文档：先移除旧向量，日志中记录删除以便重放时不会保留旧向量
+                    stale_ids = [vid for vid in self._tombstones if parent_doc_id(vid) == doc_id]
+                    if doc_id in self.document_map:
+                        stale_ids += self._vector_ids(doc_id, self.document_map[doc_id])
+                    if stale_ids:
+                        self._remove_from_index(stale_ids)
+                        if self._wal:
+                            self._wal.append(OP_DELETE, doc_id)
+                doc_ids[position] = doc_id
+                
+                # 存储文档元数据和块数，向量只保存在索引中
+                self.document_map[doc_id] = {"metadata": metadata, "chunks": len(vectors)}
+                all_ids.extend(chunk_vector_id(doc_id, i) for i in range(len(vectors)))
+                
+                # 写入预写日志
+                if self._wal:
+                    self._wal.append(OP_ADD_CHUNKS, doc_id, metadata, vectors)
             
-            # 存储文档元数据
-            self.document_map[doc_id] = {
-                "metadata": metadata,
-                "vector": vector.reshape(-1).tolist()
-            }
+            # 一次性添加到FAISS索引
+            ids = np.array(all_ids, dtype=np.int64)
+            self.index.add_with_ids(all_vectors, ids)
+            self._tombstones.difference_update(all_ids)
+            if self._rebuild_log is not None:
+                self._rebuild_log.append((OP_ADD, ids, all_vectors))
             
-            logger.info(f"文档向量生成成功，ID: {doc_id}")
-            return doc_id
+            # 必要时压缩为快照；数据量跨过阈值时在后台切换索引类型
+            self._maybe_compact()
+            self._maybe_rebuild()
+        
+        logger.info(f"文档向量生成成功，文档数: {len(doc_ids)}, 文本块数: {len(all_vectors)}")
+        return doc_ids
+
+    @staticmethod
+    def _vector_ids(doc_id: int, doc_data: Dict[str, Any]) -> List[int]:
+        """
+        文档在索引中的全部向量ID
+        :param doc_id: 文档ID
+        :param doc_data: document_map 中的文档信息，chunks 为 0 表示整篇文档一个向量的旧数据
+        :return: 向量ID列表
+        """
+        chunks = doc_data.get("chunks", 0)
+        if not chunks:
+            return [doc_id]
+        return [chunk_vector_id(doc_id, i) for i in range(chunks)]
+
+    def _is_live_vector(self, vector_id: int) -> bool:
+        """向量是否属于仍然存在的文档（调用方需持有锁）"""
+        if vector_id in self._tombstones:
+            return False
+        doc_id = parent_doc_id(vector_id)
+        doc_data = self.document_map.get(doc_id)
+        if not doc_data:
+            return False
+        chunks = doc_data.get("chunks", 0)
+        if not chunks:
+            return vector_id == doc_id
+        return vector_id != doc_id and (vector_id & ((1 << _CHUNK_BITS) - 1)) < chunks
+
+    def update_document(self, doc_id: int, text: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        更新文档的向量和元数据
+        :param doc_id: 文档ID
+        :param text: 新的文档文本
+        :param metadata: 新的元数据，为空时保留原有元数据
+        :return: 文档ID
+        """
+        self._ensure_loaded()
+        if metadata is None:
+            doc_data = self.document_map.get(doc_id)
+            if not doc_data:
+                raise KeyError(f"文档不存在: {doc_id}")
+            metadata = doc_data["metadata"]
+        return self.add_document(text, metadata, doc_id=doc_id)
+
+    def delete_document(self, doc_id: int) -> bool:
+        """
+        删除文档
+        :param doc_id: 文档ID
+        :return: 文档是否存在
+        """
+        return self.remove_ids([int(doc_id)]) > 0
+
+    def remove_ids(self, doc_ids: List[int]) -> int:
+        """
+        批量删除文档：文档的全部向量先标记为墓碑并从检索结果中排除，墓碑比例超过阈值时再批量从索引中移除
+        :param doc_ids: 文档ID列表
+        :return: 实际删除的文档数
+        """
+        try:
+            self._ensure_loaded()
+            with self._lock:
+                removed = 0
+                for doc_id in doc_ids:
+                    doc_id = int(doc_id)
+                    doc_data = self.document_map.pop(doc_id, None)
+                    if doc_data is None:
+                        continue
+                    self._tombstones.update(self._vector_ids(doc_id, doc_data))
+                    if self._wal:
+                        self._wal.append(OP_DELETE, doc_id)
+                    removed += 1
+                
+                if removed:
+                    logger.info(f"已删除 {removed} 个文档向量")
+                    self._maybe_purge_tombstones()
+                    self._maybe_compact()
+                return removed
         except Exception as e:
-            logger.error(f"添加文档到向量存储失败: {str(e)}")
+            logger.error(f"删除文档向量失败: {str(e)}")
             raise
 
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float, Dict[str, Any]]]:
+    def find_ids(self, filter: Dict[str, Any]) -> List[int]:
+        """
+        按元数据查找文档ID
+        :param filter: 元数据过滤条件
+        :return: 文档ID列表
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return [
+                doc_id for doc_id, doc_data in self.document_map.items()
+                if self._match_filter(doc_data["metadata"], filter)
+            ]
+
+    async def adelete_document(self, doc_id: int) -> bool:
+        """delete_document 的异步版本：加载、写日志和压缩都在线程中执行，不阻塞事件循环"""
+        return await asyncio.to_thread(self.delete_document, doc_id)
+
+    async def aremove_ids(self, doc_ids: List[int]) -> int:
+        """remove_ids 的异步版本"""
+        return await asyncio.to_thread(self.remove_ids, doc_ids)
+
+    async def afind_ids(self, filter: Dict[str, Any]) -> List[int]:
+        """find_ids 的异步版本"""
+        return await asyncio.to_thread(self.find_ids, filter)
+
+    def _allocate_id(self) -> int:
+        """为未指定ID的文档分配一个不属于任何命名空间的顺序ID"""
+        legacy_ids = [doc_id for doc_id in self.document_map if doc_id < (1 << _NAMESPACE_SHIFT)]
+        return max(legacy_ids, default=-1) + 1
+
+    def _remove_from_index(self, vector_ids: List[int]) -> None:
+        """
+        从索引中物理移除向量（调用方需持有锁）
+        HNSW索引不支持删除：已删除的文档通过元数据在检索时排除，并在后台重建时真正移除
+        """
+        if not vector_ids:
+            return
+        if not index_factory.supports_remove(self.index):
+            # 记下旧向量的存储位置，检索和重建时排除；重建期间的删除同样写入变更记录
+            id_map = faiss.vector_to_array(self.index.id_map)
+            stale = np.nonzero(np.isin(id_map, np.array(vector_ids, dtype=np.int64)))[0]
+            self._stale_positions.update(stale.tolist())
+            if self._rebuild_log is not None:
+                self._rebuild_log.append((OP_DELETE, np.array(vector_ids, dtype=np.int64), None))
+            self._start_rebuild(index_factory.index_type_of(self.index))
+            return
+        self.index.remove_ids(np.array(vector_ids, dtype=np.int64))
+        self._tombstones.difference_update(vector_ids)
+        if self._rebuild_log is not None:
+            self._rebuild_log.append((OP_DELETE, np.array(vector_ids, dtype=np.int64), None))
+
+    def _maybe_rebuild(self) -> None:
+        """检查是否需要切换索引类型或重新训练（调用方需持有锁）"""
+        target = index_factory.needs_rebuild(self.index)
+        if target:
+            self._start_rebuild(target)
+
+    def _start_rebuild(self, index_type: str) -> None:
+        """启动后台线程重建索引，已有重建在进行时忽略（调用方需持有锁）"""
+        if self._rebuild_log is not None:
+            return
+        self._rebuild_log = []
+        logger.info(f'开始在后台重建向量索引: {index_factory.index_type_of(self.index)} -> {index_type}, 向量数: {self.index.ntotal}')
+        threading.Thread(
+            target=self._rebuild_worker,
+            args=(index_type,),
+            name="vector-index-rebuild",
+            daemon=True
+        ).start()
+
+    def _rebuild_worker(self, index_type: str) -> None:
+        """
+        后台重建索引：在锁内取出向量快照，在锁外训练和写入新索引，最后在锁内补写期间的变更并替换
+        :param index_type: 目标索引类型
+        """
+        try:
+            with self._lock:
+                ids, vectors = index_factory.reconstruct_all(self.index)
+                # 只保留仍然存在的文档的向量，排除已被覆盖的旧向量；同一ID出现多次时以最后写入的向量为准
+                latest = {}
+                for position, vector_id in enumerate(ids.tolist()):
+                    if position not in self._stale_positions and self._is_live_vector(vector_id):
+                        latest[vector_id] = position
+                excluded = set(ids.tolist()) - set(latest)
+                vectors = {vector_id: vectors[position] for vector_id, position in latest.items()}
+                # 快照之前记录的变更已经包含在快照中
+                log_offset = len(self._rebuild_log)
+
+            new_index = self._build_from(index_type, vectors)
+            attempts = 0
+            while True:
+                with self._lock:
+                    pending = self._rebuild_log[log_offset:]
+                    log_offset = len(self._rebuild_log)
+                    if index_factory.supports_remove(new_index):
+                        for op, vector_ids, op_vectors in pending:
+                            new_index.remove_ids(vector_ids)
+                            if op == OP_ADD:
+                                new_index.add_with_ids(op_vectors, vector_ids)
+                    elif self._replaces_vectors(pending, vectors):
+                        # 新索引同样不支持删除：把期间的变更合并到向量集合后重新构建；
+                        # 锁外重建两次后仍有新的覆盖或删除时，在锁内完成最后一次构建
+                        self._merge_log(vectors, pending)
+                        attempts += 1
+                        if attempts <= 2:
+                            new_index = None
+                        else:
+                            new_index = self._build_from(index_type, vectors)
+                    else:
+                        for _, vector_ids, op_vectors in pending:
+                            new_index.add_with_ids(op_vectors, vector_ids)
+
+                    if new_index is not None:
+                        self.index = new_index
+                        self._tombstones -= excluded
+                        self._stale_positions = set()
+                        self._rebuild_log = None
+                        logger.info(f'向量索引重建完成: {index_type}, 向量数: {self.index.ntotal}')
+                        self.compact()
+                        break
+                # 在锁外按合并后的向量集合重新构建
+                new_index = self._build_from(index_type, vectors)
+        except Exception as e:
+            logger.error(f'重建向量索引失败: {str(e)}')
+            # 只在失败时清除；成功时替换索引后的压缩可能已经启动了下一次重建
+            with self._lock:
+                self._rebuild_log = None
+
+    def _build_from(self, index_type: str, vectors: Dict[int, np.ndarray]) -> faiss.Index:
+        """
+        按 {向量ID: 向量} 构建新索引
+        :param index_type: 索引类型
+        :param vectors: 向量集合
+        :return: 写入完成的索引
+        """
+        ids = np.array(list(vectors.keys()), dtype=np.int64)
+        matrix = np.vstack(list(vectors.values())).astype(np.float32) if vectors \
+            else np.zeros((0, self.dimension), dtype=np.float32)
+        new_index = index_factory.build_index(index_type, self.dimension, self.metric, len(ids))
+        return index_factory.populate_index(new_index, ids, matrix)
+
+    @staticmethod
+    def _replaces_vectors(log: List[tuple], vectors: Dict[int, np.ndarray]) -> bool:
+        """变更记录中是否有删除或覆盖已有向量的操作（只追加新向量时可以直接写入新索引）"""
+        seen = set(vectors)
+        for op, vector_ids, _ in log:
+            if op == OP_DELETE:
+                return True
+            for vector_id in vector_ids.tolist():
+                if vector_id in seen:
+                    return True
+                seen.add(vector_id)
+        return False
+
+    @staticmethod
+    def _merge_log(vectors: Dict[int, np.ndarray], log: List[tuple]) -> None:
+        """将变更记录按顺序合并到 {向量ID: 向量} 集合中"""
+        for op, vector_ids, op_vectors in log:
+            if op == OP_ADD:
+                vectors.update(zip(vector_ids.tolist(), op_vectors))
+            else:
+                for vector_id in vector_ids.tolist():
+                    vectors.pop(vector_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取向量存储的状态信息
+        """
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "load_state": self._load_state,
+                "index_type": index_factory.index_type_of(self.index) if self.index else None,
+                "metric": settings.VECTOR_METRIC,
+                "vectors": self.index.ntotal if self.index else 0,
+                "documents": len(self.document_map),
+                "tombstones": len(self._tombstones),
+                "stale_vectors": len(self._stale_positions),
+                "rebuilding": self._rebuild_log is not None,
+                "nlist": getattr(self.index, "nlist", None)
+            }
+
+    def _maybe_purge_tombstones(self) -> None:
+        """墓碑数量超过索引规模的一定比例时批量移除（调用方需持有锁）"""
+        if not self._tombstones:
+            return
+        if len(self._tombstones) >= max(1, int(self.index.ntotal * settings.VECTOR_TOMBSTONE_RATIO)):
+            if not index_factory.supports_remove(self.index):
+                self._start_rebuild(index_factory.index_type_of(self.index))
+                return
+            count = len(self._tombstones)
+            self._remove_from_index(list(self._tombstones))
+            logger.info(f"已从索引中移除 {count} 个已删除的向量，当前向量数: {self.index.ntotal}")
+
+    def search(self,
+               query: str,
+               top_k: int = 5,
+               nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None) -> List[Tuple[int, float, Dict[str, Any]]]:
         """
         搜索最相似的文档
         :param query: 查询文本
         :param top_k: 返回结果数量
-        :return: [(doc_id, distance, metadata), ...]
+        :param nprobe: IVF索引本次查询访问的聚类数
+        :param ef_search: HNSW索引本次查询的候选列表长度
+        :return: [(doc_id, 余弦相似度, metadata), ...]，文档的得分取其最相似文本块的得分
         """
         try:
             if not self.model or not self.index:
                 raise RuntimeError("向量存储未正确初始化，无法执行搜索")
-                
-            # 生成查询向量
-            query_vector = self.model.encode([query])[0]
-            query_vector = query_vector.reshape(1, -1)
-            
-            # 搜索最近邻
-            distances, indices = self.index.search(query_vector, top_k)
-            
-            # 整理结果
-            results = []
-            for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-                if idx != -1:  # FAISS返回-1表示无效结果
-                    doc_data = self.document_map.get(int(idx))
-                    if doc_data:
-                        results.append((int(idx), float(distance), doc_data["metadata"]))
-            
-            return results
+            return self.search_similar(self.encode_text(query), top_k, nprobe=nprobe, ef_search=ef_search)
         except Exception as e:
             logger.error(f"向量搜索失败: {str(e)}")
             raise
 
+    def search_similar(self,
+                       vector: np.ndarray,
+                       top_k: int = 5,
+                       filter: Optional[Dict[str, Any]] = None,
+                       nprobe: Optional[int] = None,
+                       ef_search: Optional[int] = None) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """
+        使用已编码的向量检索索引中最相似的文档，不再重新编码候选文档
+        :param vector: 查询向量（通常由 encode_text 生成一次）
+        :param top_k: 返回结果数量
+        :param filter: 元数据过滤条件，如 {"paper_type": "master"}，所有键值都相等才算匹配
+        :param nprobe: IVF索引本次查询访问的聚类数，越大召回率越高、延迟越高
+        :param ef_search: HNSW索引本次查询的候选列表长度，越大召回率越高、延迟越高
+        :return: [(doc_id, 余弦相似度, metadata), ...]，按相似度降序排列，文档得分取其最相似文本块的得分
+        """
+        try:
+            self._ensure_loaded()
+            if not self.index:
+                raise RuntimeError("向量存储未正确初始化，无法执行搜索")
+
+            total = self.index.ntotal
+            if total == 0 or top_k <= 0:
+                return []
+
+            query_vector = self._prepare_vectors(vector)[:1]
+            params = index_factory.search_params(self.index, nprobe, ef_search)
+
+            # 一个文档有多个文本块，按块数放大候选数量；有过滤条件时再多取一些，不够再逐步扩大检索范围
+            k = min(total, top_k * settings.CHUNK_SEARCH_K * (4 if filter else 1) + len(self._tombstones))
+            while True:
+                best = self._search_vectors(query_vector, k, filter, params)[0]
+                if len(best) >= top_k or k >= total:
+                    break
+                k = min(total, k * 4)
+
+            with self._lock:
+                results = [
+                    (doc_id, similarity, self.document_map[doc_id]["metadata"])
+                    for doc_id, similarity in best.items() if doc_id in self.document_map
+                ]
+            results.sort(key=lambda item: item[1], reverse=True)
+            return results[:top_k]
+        except Exception as e:
+            logger.error(f"相似文档检索失败: {str(e)}")
+            raise
+
+    def search_documents(self,
+                         query_vectors: np.ndarray,
+                         top_k: int = 5,
+                         filter: Optional[Dict[str, Any]] = None,
+                         threshold: Optional[float] = None,
+                         nprobe: Optional[int] = None,
+                         ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        用查询文档的全部文本块向量检索相似文档，并按文档聚合各块的命中情况
+        :param query_vectors: 查询文档的文本块向量矩阵（通常由 encode_document 生成）
+        :param top_k: 返回文档数量
+        :param filter: 元数据过滤条件
+        :param threshold: 文本块相似度阈值，超过该值的查询块计为命中，默认取 PLAGIARISM_THRESHOLD
+        :param nprobe: IVF索引本次查询访问的聚类数
+        :param ef_search: HNSW索引本次查询的候选列表长度
+        :return: 按 similarity 降序排列的结果列表，每项包含：
+                 doc_id、similarity（各查询块最高相似度的平均值，未召回该文档的块记为0）、
+                 max_similarity（单个文本块的最高相似度）、matched_chunks（超过阈值的查询块数）、
+                 coverage（超过阈值的查询块占比）、metadata
+        """
+        try:
+            self._ensure_loaded()
+            if not self.index:
+                raise RuntimeError("向量存储未正确初始化，无法执行搜索")
+
+            total = self.index.ntotal
+            if total == 0 or top_k <= 0:
+                return []
+            threshold = settings.PLAGIARISM_THRESHOLD if threshold is None else threshold
+
+            queries = self._prepare_vectors(query_vectors)
+            if not len(queries):
+                return []
+            params = index_factory.search_params(self.index, nprobe, ef_search)
+            k = min(total, settings.CHUNK_SEARCH_K * (4 if filter else 1) + len(self._tombstones))
+            per_query = self._search_vectors(queries, k, filter, params)
+
+            # 按文档聚合：每个查询块只取该文档中与其最相似的块
+            aggregated: Dict[int, List[float]] = {}
+            for best in per_query:
+                for doc_id, similarity in best.items():
+                    aggregated.setdefault(doc_id, []).append(similarity)
+
+            results = []
+            with self._lock:
+                for doc_id, similarities in aggregated.items():
+                    doc_data = self.document_map.get(doc_id)
+                    if not doc_data:
+                        continue
+                    matched = sum(1 for similarity in similarities if similarity >= threshold)
+                    results.append({
+                        "doc_id": doc_id,
+                        "similarity": sum(similarities) / len(queries),
+                        "max_similarity": max(similarities),
+                        "matched_chunks": matched,
+                        "coverage": matched / len(queries),
+                        "metadata": doc_data["metadata"]
+                    })
+            results.sort(key=lambda item: item["similarity"], reverse=True)
+            return results[:top_k]
+        except Exception as e:
+            logger.error(f"文档级相似检索失败: {str(e)}")
+            raise
+
+    def _search_vectors(self,
+                        queries: np.ndarray,
+                        k: int,
+                        filter: Optional[Dict[str, Any]],
+                        params: Optional[faiss.SearchParameters]) -> List[Dict[int, float]]:
+        """
+        检索文本块向量并换算为文档得分
+        :param queries: 已处理过的查询向量矩阵
+        :param k: 每个查询向量取回的向量数
+        :param filter: 元数据过滤条件
+        :param params: 检索参数
+        :return: 每个查询向量对应的 {doc_id: 最高余弦相似度}
+        """
+        with self._lock:
+            distances, indices = self._search_index(queries, k, params)
+            results = []
+            for row, (row_distances, row_indices) in enumerate(zip(distances, indices)):
+                best: Dict[int, float] = {}
+                query_norm = np.linalg.norm(queries[row])
+                for distance, vector_id in zip(row_distances, row_indices):
+                    vector_id = int(vector_id)
+                    # FAISS返回-1表示无效结果
+                    if vector_id == -1 or not self._is_live_vector(vector_id):
+                        continue
+                    doc_id = parent_doc_id(vector_id)
+                    if not self._match_filter(self.document_map[doc_id]["metadata"], filter):
+                        continue
+                    if self.use_cosine:
+                        # 内积索引中的向量已归一化，检索分数即余弦相似度
+                        similarity = float(distance)
+                    else:
+                        doc_vector = self.index.reconstruct(vector_id)
+                        doc_norm = np.linalg.norm(doc_vector)
+                        if query_norm == 0 or doc_norm == 0:
+                            similarity = 0.0
+                        else:
+                            similarity = float(np.dot(queries[row], doc_vector) / (query_norm * doc_norm))
+                    similarity = max(0.0, min(1.0, similarity))
+                    if similarity > best.get(doc_id, -1.0):
+                        best[doc_id] = similarity
+                results.append(best)
+            return results
+
+    def _search_index(self,
+                      queries: np.ndarray,
+                      k: int,
+                      params: Optional[faiss.SearchParameters]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索索引，排除已被覆盖的旧向量（调用方需持有锁）
+        :return: (距离矩阵, 向量ID矩阵)，无效结果的ID为-1
+        """
+        if not self._stale_positions:
+            return self.index.search(queries, k, params=params)
+        # 旧向量与新向量共用同一ID，直接检索底层索引并按存储位置排除，再换算为向量ID
+        base = faiss.downcast_index(self.index.index)
+        id_map = faiss.vector_to_array(self.index.id_map)
+        k = min(self.index.ntotal, k + len(self._stale_positions))
+        distances, positions = base.search(queries, k, params=params)
+        stale = np.isin(positions, np.fromiter(self._stale_positions, dtype=np.int64))
+        indices = np.where((positions < 0) | stale, -1, id_map[np.clip(positions, 0, None)])
+        return distances, indices
+
+    @staticmethod
+    def _match_filter(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+        """检查文档元数据是否满足过滤条件"""
+        if not filter:
+            return True
+        return all(metadata.get(key) == value for key, value in filter.items())
+
     def save(self, directory: str):
         """
         保存向量索引和文档映射
@@ -165,21 +865,19 @@ class VectorStore:
         try:
             os.makedirs(directory, exist_ok=True)
             
-            # 保存FAISS索引
+            # 先写临时文件再替换，避免写到一半时崩溃留下损坏的快照
             index_path = os.path.join(directory, "index.faiss")
-            faiss.write_index(self.index, index_path)
+            metadata_path = os.path.join(directory, "metadata.db")
             
-            # 保存文档映射
-            map_path = os.path.join(directory, "document_map.json")
-            with open(map_path, 'w', encoding='utf-8') as f:
-                # 将numpy数组转换为列表以便JSON序列化
-                serializable_map = {}
-                for k, v in self.document_map.items():
-                    serializable_map[str(k)] = {
-                        "metadata": v["metadata"],
-                        "vector": v["vector"]
-                    }
-                json.dump(serializable_map, f, ensure_ascii=False, indent=2)
+            # 保存文档元数据（向量只保存在FAISS索引中）
+            self._write_metadata(metadata_path + '.tmp')
+            
+            # 保存FAISS索引
+            faiss.write_index(self.index, index_path + '.tmp')
+            
+            # 元数据先替换，重放日志时会补齐索引中缺失的向量
+            os.replace(metadata_path + '.tmp', metadata_path)
+            os.replace(index_path + '.tmp', index_path)
             
             logger.info(f"向量存储已保存到: {directory}")
         except Exception as e:
@@ -195,22 +893,9 @@ class VectorStore:
         """
         try:
             instance = cls()
-            
-            # 加载FAISS索引
-            index_path = os.path.join(directory, "index.faiss")
-            instance.index = faiss.read_index(index_path)
-            
-            # 加载文档映射
-            map_path = os.path.join(directory, "document_map.json")
-            with open(map_path, 'r', encoding='utf-8') as f:
-                serialized_map = json.load(f)
-                instance.document_map = {
-                    int(k): {
-                        "metadata": v["metadata"],
-                        "vector": v["vector"]
-                    }
-                    for k, v in serialized_map.items()
-                }
+            instance._ensure_loaded()
+            with instance._lock:
+                instance._load_snapshot(directory)
             
             logger.info(f"向量存储已从 {directory} 加载")
             return instance
@@ -218,27 +903,389 @@ class VectorStore:
             logger.error(f"加载向量存储失败: {str(e)}")
             raise
             
+    def _load_snapshot(self, directory: str) -> None:
+        """
+        从目录读取索引快照和文档映射
+        :param directory: 快照目录
+        """
+        index_path = os.path.join(directory, "index.faiss")
+        self.index = index_factory.prepare_loaded_index(faiss.read_index(index_path))
+        if isinstance(self.index, faiss.IndexFlat):
+            # 旧版索引按插入顺序编号，包装为ID映射索引并保留原有编号
+            legacy_index = self.index
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(legacy_index.d))
+            if legacy_index.ntotal:
+                self.index.add_with_ids(
+                    legacy_index.reconstruct_n(0, legacy_index.ntotal),
+                    np.arange(legacy_index.ntotal, dtype=np.int64)
+                )
+            logger.info(f'旧版索引已转换为ID映射索引，向量数: {self.index.ntotal}')
+        self._tombstones = set()
+        self._stale_positions = set()
+        if not index_factory.supports_remove(self.index):
+            # HNSW索引只能追加，快照中同一ID的多个向量里只有最后写入的有效
+            id_map = faiss.vector_to_array(self.index.id_map)
+            last = {vector_id: position for position, vector_id in enumerate(id_map.tolist())}
+            self._stale_positions = set(range(len(id_map))) - set(last.values())
+            if self._stale_positions:
+                logger.info(f'快照中有 {len(self._stale_positions)} 个已被覆盖的旧向量，将在重建索引时移除')
+        
+        metadata_path = os.path.join(directory, "metadata.db")
+        legacy_map_path = os.path.join(directory, "document_map.json")
+        if not os.path.exists(metadata_path) and os.path.exists(legacy_map_path):
+            self._migrate_legacy_map(legacy_map_path, metadata_path)
+        self.document_map = self._read_metadata(metadata_path) if os.path.exists(metadata_path) else {}
+
+    def _write_metadata(self, path: str) -> None:
+        """
+        将文档元数据写入SQLite文件
+        :param path: 目标文件路径
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(
+                "CREATE TABLE documents (id INTEGER PRIMARY KEY, metadata TEXT NOT NULL, chunks INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.executemany(
+                "INSERT INTO documents (id, metadata, chunks) VALUES (?, ?, ?)",
+                ((doc_id, json.dumps(doc["metadata"], ensure_ascii=False), doc.get("chunks", 0))
+                 for doc_id, doc in self.document_map.items())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _read_metadata(path: str) -> Dict[int, Dict[str, Any]]:
+        """
+        从SQLite文件读取文档元数据
+        :param path: 元数据文件路径
+        :return: {doc_id: {"metadata": ..., "chunks": 块数}}
+        """
+        conn = sqlite3.connect(path)
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            # 旧版元数据文件没有 chunks 列，对应整篇文档一个向量
+            query = "SELECT id, metadata, chunks FROM documents" if "chunks" in columns \
+                else "SELECT id, metadata, 0 FROM documents"
+            return {
+                int(doc_id): {"metadata": json.loads(metadata), "chunks": int(chunks)}
+                for doc_id, metadata, chunks in conn.execute(query)
+            }
+        finally:
+            conn.close()
+
+    def _migrate_legacy_map(self, legacy_map_path: str, metadata_path: str) -> None:
+        """
+        将旧版 document_map.json（元数据和向量重复保存）迁移为SQLite元数据文件，向量保留在索引中
+        :param legacy_map_path: 旧版文档映射路径
+        :param metadata_path: 新的元数据文件路径
+        """
+        logger.info(f'迁移旧版文档映射: {legacy_map_path}')
+        with open(legacy_map_path, 'r', encoding='utf-8') as f:
+            serialized_map = json.load(f)
+        self.document_map = {
+            int(k): {"metadata": v["metadata"], "chunks": 0}
+            for k, v in serialized_map.items()
+        }
+        self._write_metadata(metadata_path + '.tmp')
+        os.replace(metadata_path + '.tmp', metadata_path)
+        os.replace(legacy_map_path, legacy_map_path + '.bak')
+        logger.info(f'旧版文档映射迁移完成，文档数: {len(self.document_map)}')
+
+    def _open_storage(self, directory: str) -> None:
+        """
+        打开持久化目录：加载最近的快照，重放快照之后的预写日志，之后的每次变更都会写入日志
+        :param directory: 持久化目录
+        """
+        try:
+            with self._lock:
+                index_path = os.path.join(directory, "index.faiss")
+                if os.path.exists(index_path):
+                    self._load_snapshot(directory)
+                    if self.index.d != self.dimension:
+                        raise ValueError(f"索引维度 {self.index.d} 与模型维度 {self.dimension} 不一致")
+                    logger.info(f'已加载向量索引快照，文档数: {self.index.ntotal}')
+                
+                wal = VectorWAL(os.path.join(directory, "wal.log"))
+                self._replay_wal(wal)
+                self.directory = directory
+                self._wal = wal
+                
+                # 已保存索引的度量方式与配置不一致时重建索引，并立即写入新快照
+                expected_metric = faiss.METRIC_INNER_PRODUCT if self.use_cosine else faiss.METRIC_L2
+                if self.index.metric_type != expected_metric:
+                    self._migrate_metric()
+                    self.compact()
+                
+                self._maybe_rebuild()
+                if self._stale_positions:
+                    self._start_rebuild(index_factory.index_type_of(self.index))
+        except Exception as e:
+            logger.error(f'加载持久化向量存储失败，本次运行不会写入磁盘: {str(e)}')
+            self.index = self._new_index()
+            self.document_map = {}
+
+    def _migrate_metric(self) -> None:
+        """
+        按当前配置的度量方式重建索引：取出全部向量，余弦模式下归一化后写入内积索引
+        注意：从余弦模式切回L2模式时，向量已被归一化，原始长度无法恢复
+        """
+        ids, vectors = index_factory.reconstruct_all(self.index)
+        self.index = index_factory.build_index(
+            index_factory.index_type_of(self.index), self.dimension, self.metric, len(ids)
+        )
+        index_factory.populate_index(self.index, ids, self._prepare_vectors(vectors))
+        logger.info(f'向量索引已迁移为 {settings.VECTOR_METRIC} 模式，向量数: {self.index.ntotal}')
+
+    def _replay_wal(self, wal: VectorWAL) -> None:
+        """
+        重放预写日志中的记录，已包含在快照中的向量只补齐元数据
+        :param wal: 预写日志
+        """
+        present = set(index_factory.all_ids(self.index).tolist())
+        pending = {}
+        to_remove = set()
+        for record in wal.replay():
+            doc_id = record["doc_id"]
+            if record["op"] in (OP_ADD, OP_ADD_CHUNKS):
+                if record["op"] == OP_ADD:
+                    # 旧版日志：整篇文档一个向量，向量ID即文档ID
+                    vector_ids, vectors, chunks = [doc_id], [record["vector"]], 0
+                else:
+                    vectors = record["vector"].reshape(-1, self.dimension)
+                    chunks = len(vectors)
+                    vector_ids = [chunk_vector_id(doc_id, i) for i in range(chunks)]
+                for vector_id, vector in zip(vector_ids, vectors):
+                    if vector_id not in present:
+                        pending[vector_id] = vector
+                self.document_map[doc_id] = {"metadata": record["metadata"], "chunks": chunks}
+            elif record["op"] == OP_DELETE:
+                doc_data = self.document_map.pop(doc_id, None)
+                if doc_data is None:
+                    continue
+                for vector_id in self._vector_ids(doc_id, doc_data):
+                    if pending.pop(vector_id, None) is None and vector_id in present:
+                        present.discard(vector_id)
+                        to_remove.add(vector_id)
+        
+        if to_remove:
+            self._remove_from_index(list(to_remove))
+        if pending:
+            vectors = np.vstack(list(pending.values())).astype(np.float32)
+            if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                # 日志可能写于L2模式下，写入内积索引前统一归一化
+                faiss.normalize_L2(vectors)
+            self.index.add_with_ids(vectors, np.array(list(pending.keys()), dtype=np.int64))
+        if wal.count:
+            logger.info(f'已重放预写日志 {wal.count} 条记录，补齐向量 {len(pending)} 个，移除向量 {len(to_remove)} 个')
+
+    def _maybe_compact(self) -> None:
+        """预写日志记录数达到阈值时压缩为快照"""
+        if self._wal and self._wal.count >= settings.VECTOR_WAL_COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        将当前索引和文档映射写入快照并清空预写日志
+        """
+        if not self._wal or not self.directory:
+            return
+        with self._lock:
+            self._remove_from_index(list(self._tombstones))
+            self.save(self.directory)
+            self._wal.reset()
+            logger.info(f'向量存储已压缩为快照，文档数: {self.index.ntotal}')
+
     def encode_text(self, text: str) -> np.ndarray:
         """
         将文本编码为向量
         :param text: 要编码的文本
         :return: 文本向量
         """
+        return self.encode_batch([text])[0]
+
+    def encode_batch(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        批量编码文本：按长度排序后分批送入模型，使同一批次内的填充长度接近，结果按输入顺序返回
+        :param texts: 要编码的文本列表
+        :param batch_size: 每批文本数，默认取 EMBEDDING_BATCH_SIZE
+        :return: 向量矩阵，形状为 (文本数, 维度)
+        """
         try:
             if not self.model:
                 raise RuntimeError("向量模型未初始化，无法编码文本")
-                
-            # 生成文本向量
-            vector = self.model.encode([text])[0]
-            vector = np.array(vector, dtype=np.float32)  # 确保数据类型正确
+            if not texts:
+                return np.zeros((0, self.dimension), dtype=np.float32)
+            batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
             
-            if len(vector) != self.dimension:
-                raise ValueError(f"向量维度不匹配，期望: {self.dimension}, 实际: {len(vector)}")
-                
-            return vector
+            vectors, keys, missing = self._lookup_embeddings(texts)
+            for batch in encoders.length_sorted_batches([texts[i] for i in missing], batch_size):
+                batch = [missing[i] for i in batch]
+                vectors[batch] = self._check_dimension(
+                    self.model.encode([texts[i] for i in batch], batch_size=batch_size)
+                )
+            self._store_embeddings(keys, vectors, missing)
+            
+            return vectors
+        except Exception as e:
+            logger.error(f"文本编码失败: {str(e)}")
+            raise
+
+    async def aencode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        encode_batch 的异步版本：各批次分发到编码工作池并行编码，不阻塞事件循环
+        :param texts: 要编码的文本列表
+        :param batch_size: 每批文本数，默认取 EMBEDDING_BATCH_SIZE
+        :return: 向量矩阵，形状为 (文本数, 维度)
+        """
+        try:
+            await asyncio.to_thread(self._ensure_loaded)
+            if not self._model:
+                raise RuntimeError("向量模型未初始化，无法编码文本")
+            if not texts:
+                return np.zeros((0, self.dimension), dtype=np.float32)
+            batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+            
+            vectors, keys, missing = await asyncio.to_thread(self._lookup_embeddings, texts)
+            if missing:
+                pool = self._get_encoder_pool()
+                batches = [
+                    [missing[i] for i in batch]
+                    for batch in encoders.length_sorted_batches([texts[i] for i in missing], batch_size)
+                ]
+                results = await asyncio.gather(*(
+                    pool.encode([texts[i] for i in batch], batch_size) for batch in batches
+                ))
+                for batch, encoded in zip(batches, results):
+                    vectors[batch] = self._check_dimension(encoded)
+                await asyncio.to_thread(self._store_embeddings, keys, vectors, missing)
+            return vectors
         except Exception as e:
             logger.error(f"文本编码失败: {str(e)}")
             raise
+
+    async def aencode_document(self, text: str) -> np.ndarray:
+        """
+        encode_document 的异步版本
+        :param text: 文档文本
+        :return: 文本块向量矩阵
+        """
+        return await self.aencode(self.chunk_document(text))
+
+    def _open_embedding_cache(self, probe_vector: np.ndarray) -> None:
+        """
+        打开文本向量缓存；模型、编码后端或模型权重变化时（探针向量不同）清空缓存
+        :param probe_vector: 固定测试文本的向量，用于识别模型版本
+        """
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return
+        try:
+            probe_hash = hashlib.sha256(np.asarray(probe_vector, dtype=np.float32).tobytes()).hexdigest()[:16]
+            self._model_tag = f"{self.model_name}:{self._model.backend}:{probe_hash}"
+            base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+            cache = DiskCache(
+                os.path.join(base_dir, settings.EMBEDDING_CACHE_PATH),
+                max_bytes=settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+                compress=False
+            )
+            cached_tag = cache.get_meta("model")
+            if cached_tag != self._model_tag:
+                if cached_tag is not None:
+                    logger.info(f'向量模型已变化（{cached_tag} -> {self._model_tag}），清空文本向量缓存')
+                cache.clear()
+                cache.set_meta("model", self._model_tag)
+            self._embedding_cache = cache
+        except Exception as e:
+            logger.error(f'打开文本向量缓存失败，将不使用缓存: {str(e)}')
+            self._embedding_cache = None
+
+    def _embedding_key(self, text: str) -> str:
+        """文本向量缓存键：模型标识 + 规范化文本（合并空白）的哈希"""
+        normalized = " ".join(text.split())
+        return f"{self._model_tag}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    def _lookup_embeddings(self, texts: List[str]) -> Tuple[np.ndarray, List[str], List[int]]:
+        """
+        从缓存中读取文本向量
+        :param texts: 文本列表
+        :return: (向量矩阵（未命中的行未初始化）, 缓存键列表, 未命中的文本下标)
+        """
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if self._embedding_cache is None:
+            return vectors, [], list(range(len(texts)))
+        try:
+            keys = [self._embedding_key(text) for text in texts]
+            cached = self._embedding_cache.get_many(keys)
+        except Exception as e:
+            logger.error(f'读取文本向量缓存失败: {str(e)}')
+            return vectors, [], list(range(len(texts)))
+        missing = []
+        for i, key in enumerate(keys):
+            value = cached.get(key)
+            if value is not None and len(value) == self.dimension * 4:
+                vectors[i] = np.frombuffer(value, dtype=np.float32)
+            else:
+                missing.append(i)
+        return vectors, keys, missing
+
+    def _store_embeddings(self, keys: List[str], vectors: np.ndarray, indices: List[int]) -> None:
+        """将新编码的文本向量写入缓存"""
+        if self._embedding_cache is None or not keys or not indices:
+            return
+        try:
+            self._embedding_cache.set_many({keys[i]: vectors[i].tobytes() for i in indices})
+        except Exception as e:
+            logger.error(f'写入文本向量缓存失败: {str(e)}')
+
+    def embedding_cache_stats(self) -> Dict[str, Any]:
+        """
+        获取文本向量缓存的统计信息
+        """
+        if self._embedding_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, "model": self._model_tag, **self._embedding_cache.stats()}
+
+    def _check_dimension(self, encoded: np.ndarray) -> np.ndarray:
+        """检查编码结果的维度"""
+        encoded = np.asarray(encoded, dtype=np.float32)
+        if encoded.ndim != 2 or encoded.shape[1] != self.dimension:
+            raise ValueError(f"向量维度不匹配，期望: {self.dimension}, 实际: {encoded.shape[-1]}")
+        return encoded
+
+    def _get_encoder_pool(self) -> EncoderPool:
+        """获取编码工作池，首次调用时创建"""
+        with self._lock:
+            if self._encoder_pool is None:
+                self._encoder_pool = EncoderPool(self._model, self.model_name)
+            return self._encoder_pool
+
+    def close_encoder_pool(self) -> None:
+        """关闭编码工作池"""
+        with self._lock:
+            pool, self._encoder_pool = self._encoder_pool, None
+        if pool:
+            pool.shutdown()
+
+    def chunk_document(self, text: str) -> List[str]:
+        """
+        将文档切分为用于编码的文本块
+        :param text: 文档文本
+        :return: 文本块列表，文本过短无法切分时返回原文
+        """
+        return chunk_text(text, max_chunks=min(settings.CHUNK_MAX_PER_DOCUMENT, 1 << _CHUNK_BITS)) or [text]
+
+    def encode_document(self, text: str) -> np.ndarray:
+        """
+        将长文档切分为文本块并批量编码，避免模型截断导致只有开头部分参与比对
+        :param text: 文档文本
+        :return: 文本块向量矩阵，形状为 (块数, 维度)
+        """
+        chunks = self.chunk_document(text)
+        logger.debug(f"文档已切分为 {len(chunks)} 个文本块")
+        return self.encode_batch(chunks)
     
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """
@@ -251,9 +1298,8 @@ class VectorStore:
             if not self.model:
                 raise RuntimeError("向量模型未初始化，无法计算相似度")
             
-            # 编码两个文本
-            vector1 = self.encode_text(text1)
-            vector2 = self.encode_text(text2)
+            # 两个文本在同一批次中编码
+            vector1, vector2 = self.encode_batch([text1, text2])
             
             # 计算余弦相似度
             # 余弦相似度 = 向量点积 / (向量1范数 * 向量2范数)
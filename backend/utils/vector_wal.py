@@ -0,0 +1,112 @@
+import os
+import json
+import struct
+import zlib
+import logging
+import threading
+from typing import Dict, Any, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 记录类型
+OP_ADD = 1
+OP_DELETE = 2
+# 按文本块写入整篇文档，向量部分为该文档全部块向量依次拼接
+OP_ADD_CHUNKS = 3
+
+# 记录头：负载长度、负载CRC32
+_RECORD_HEADER = struct.Struct('<II')
+# 负载头：记录类型、文档ID、元数据长度
+_PAYLOAD_HEADER = struct.Struct('<BqI')
+
+
+class VectorWAL:
+    """向量存储的预写日志，每次变更追加一条带校验的记录，快照之后的变更在启动时重放"""
+
+    def __init__(self, path: str):
+        """
+        打开（或创建）预写日志文件
+        :param path: 日志文件路径
+        """
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'ab')
+
+    def append(self, op: int, doc_id: int,
+               metadata: Optional[Dict[str, Any]] = None,
+               vector: Optional[np.ndarray] = None) -> None:
+        """
+        追加一条记录并刷盘
+        :param op: 记录类型
+        :param doc_id: 文档ID
+        :param metadata: 文档元数据
+        :param vector: 文档向量（OP_ADD_CHUNKS 时为块向量矩阵）
+        """
+        meta_bytes = json.dumps(metadata, ensure_ascii=False).encode('utf-8') if metadata is not None else b''
+        vector_bytes = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else b''
+        payload = _PAYLOAD_HEADER.pack(op, doc_id, len(meta_bytes)) + meta_bytes + vector_bytes
+        record = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            self._file.write(record)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.count += 1
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """
+        按写入顺序读取日志中的全部有效记录，遇到不完整或校验失败的尾部记录时截断
+        :return: 记录迭代器，每条记录包含 op、doc_id、metadata、vector
+        """
+        with self._lock:
+            self._file.flush()
+            records = []
+            valid_offset = 0
+            with open(self.path, 'rb') as f:
+                data = f.read()
+
+            offset = 0
+            while offset + _RECORD_HEADER.size <= len(data):
+                length, crc = _RECORD_HEADER.unpack_from(data, offset)
+                start = offset + _RECORD_HEADER.size
+                payload = data[start:start + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+
+                op, doc_id, meta_len = _PAYLOAD_HEADER.unpack_from(payload)
+                meta_end = _PAYLOAD_HEADER.size + meta_len
+                meta_bytes = payload[_PAYLOAD_HEADER.size:meta_end]
+                vector_bytes = payload[meta_end:]
+                records.append({
+                    "op": op,
+                    "doc_id": doc_id,
+                    "metadata": json.loads(meta_bytes.decode('utf-8')) if meta_bytes else None,
+                    "vector": np.frombuffer(vector_bytes, dtype=np.float32) if vector_bytes else None
+                })
+                offset = start + length
+                valid_offset = offset
+
+            if valid_offset < len(data):
+                logger.warning(f'预写日志尾部存在不完整记录，已截断 {len(data) - valid_offset} 字节: {self.path}')
+                self._file.truncate(valid_offset)
+
+            self.count = len(records)
+
+        return iter(records)
+
+    def reset(self) -> None:
+        """清空日志（在快照写入完成后调用）"""
+        with self._lock:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.count = 0
+
+    def close(self) -> None:
+        """关闭日志文件"""
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,70 @@
+import os
+import sys
+import hashlib
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 测试从仓库根目录导入 backend 包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import base, database  # noqa: E402
+from backend.utils.vector_store import VectorStore  # noqa: E402
+
+
+class FakeEncoder:
+    """按文本哈希生成固定向量的编码器，代替真实的向量模型"""
+
+    backend = "fake"
+    dimension = 16
+
+    def encode(self, texts, batch_size=None):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dimension))
+        return np.array(vectors, dtype=np.float32)
+
+
+@pytest.fixture
+def open_vector_store():
+    """
+    按目录打开一个新的向量存储实例（使用 FakeEncoder），同一目录再次打开即模拟进程重启；
+    测试结束后关闭预写日志并恢复单例
+    """
+    stores = []
+
+    def open_store(directory: str) -> VectorStore:
+        if stores and stores[-1]._wal:
+            # 上一个实例不做压缩直接关闭日志，相当于进程退出
+            stores[-1]._wal.close()
+        VectorStore._instance = None
+        store = VectorStore()
+        store._model = FakeEncoder()
+        store.dimension = FakeEncoder.dimension
+        store.index = store._new_index()
+        store._open_storage(str(directory))
+        store._load_state = "ready"
+        stores.append(store)
+        return store
+
+    yield open_store
+    if stores and stores[-1]._wal:
+        stores[-1]._wal.close()
+    VectorStore._instance = None
+
+
+@pytest.fixture
+def memory_db():
+    """
+    内存SQLite数据库，创建全部表；所有会话共用同一个连接，可以在 asyncio.to_thread 的线程中使用
+    :return: 会话工厂，测试中替换模块的 SessionLocal
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    database.Base.metadata.create_all(bind=engine)
+    base.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
@@ -0,0 +1,251 @@
+"""
+AsyncOllamaClient 的测试：在本地启动模拟 Ollama 的HTTP服务器（/api/tags 和 /api/generate），
+不依赖真实的Ollama服务
+"""
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import HTTPException
+
+from backend.utils.ollama_client import (
+    AsyncOllamaClient, GenerationMetrics, cancel_on_disconnect, close_async_client
+)
+
+EVALUATION = {
+    "score": 88,
+    "academic_evaluation": {k: {"score": 8, "comments": "好"} for k in ["significance", "innovation", "methodology", "results"]},
+    "ethical_evaluation": {k: {"score": 8, "comments": "好"} for k in ["academic_integrity", "research_ethics"]},
+    "technical_analysis": {k: {"score": 8, "comments": "好"} for k in ["literature_review", "data_analysis", "contribution"]},
+    "format_evaluation": {k: {"score": 8, "comments": "好"} for k in ["writing", "structure"]},
+    "plagiarism_check": {"is_plagiarized": False, "comments": "无"},
+    "historical_comparison": {"improvement": "improved", "comments": "有进步"},
+    "overall_comments": "总体评价良好"
+}
+
+
+class StubState:
+    """模拟服务器的行为配置和请求记录"""
+
+    def __init__(self):
+        self.models = [{"name": "m1", "size": 1}, {"name": "m2", "size": 2}]
+        self.answer = "模型工作正常。"
+        self.chunk_size = 2
+        self.delay = 0.0
+        self.eval_stats = {"eval_count": 7, "eval_duration": 350_000_000}
+        self.error = None
+        self.tags_requests = 0
+        self.payloads = []
+        self.completed = threading.Event()
+        self.disconnected = threading.Event()
+
+
+def _make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, body):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path != "/api/tags":
+                self.send_error(404)
+                return
+            state.tags_requests += 1
+            self._send_json({"models": state.models})
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self.send_error(404)
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            state.payloads.append(payload)
+            if not payload.get("stream"):
+                self._send_json({"response": state.answer, "done": True})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                if state.error:
+                    self._write_chunk((json.dumps({"error": state.error}) + "\n").encode())
+                else:
+                    for i in range(0, len(state.answer), state.chunk_size):
+                        line = {"response": state.answer[i:i + state.chunk_size], "done": False}
+                        self._write_chunk((json.dumps(line, ensure_ascii=False) + "\n").encode())
+                        time.sleep(state.delay)
+                    final = {"response": "", "done": True, **state.eval_stats}
+                    self._write_chunk((json.dumps(final) + "\n").encode())
+                self._write_chunk(b"")
+                state.completed.set()
+            except (BrokenPipeError, ConnectionResetError):
+                state.disconnected.set()
+                self.close_connection = True
+
+    return Handler
+
+
+@pytest.fixture
+def stub():
+    state = StubState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def run(coro):
+    """在新的事件循环中执行协程，结束后关闭共享的异步HTTP客户端（客户端绑定在创建它的事件循环上）"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_async_client()
+    return asyncio.run(main())
+
+
+def test_list_models(stub):
+    client = AsyncOllamaClient(base_url=stub.url)
+    models = run(client.list_models(refresh=True))
+    assert models == {"models": [
+        {"name": "m1", "model": "m1", "size": 1},
+        {"name": "m2", "model": "m2", "size": 2}
+    ]}
+
+
+def test_check_model_uses_cached_inventory(stub):
+    client = AsyncOllamaClient(base_url=stub.url)
+
+    async def check():
+        results = await asyncio.gather(*(client.check_model("m1") for _ in range(5)))
+        return results, await client.check_model("m1")
+
+    results, again = run(check())
+    assert all(results) and again
+    # 并发的调用共享一次请求，之后命中缓存
+    assert stub.tags_requests == 1
+
+    # 缓存中没有的模型会重新获取一次列表
+    assert run(client.check_model("missing")) is False
+    assert stub.tags_requests == 2
+
+
+def test_generate_streams_tokens_and_records_metrics(stub):
+    client = AsyncOllamaClient(base_url=stub.url)
+    tokens = []
+    metrics = GenerationMetrics()
+
+    text = run(client.generate("测试", model_name="m1", on_token=tokens.append, metrics=metrics))
+
+    assert text == stub.answer
+    assert "".join(tokens) == stub.answer
+    assert len(tokens) == (len(stub.answer) + stub.chunk_size - 1) // stub.chunk_size
+    assert stub.payloads[-1]["stream"] is True
+    assert stub.payloads[-1]["model"] == "m1"
+    assert metrics.model == "m1"
+    assert metrics.ttft is not None and 0 <= metrics.ttft <= metrics.total_seconds
+    # 以Ollama最后一段输出中的统计信息为准：7个token用时0.35秒
+    assert metrics.tokens == 7
+    assert metrics.tokens_per_second == pytest.approx(20.0)
+
+
+def test_generate_stream_measures_rate_without_eval_stats(stub):
+    stub.eval_stats = {}
+    stub.delay = 0.01
+    client = AsyncOllamaClient(base_url=stub.url)
+    metrics = GenerationMetrics()
+
+    async def collect():
+        return [token async for token in client.generate_stream("测试", model_name="m1", metrics=metrics)]
+
+    tokens = run(collect())
+    assert "".join(tokens) == stub.answer
+    assert metrics.tokens == len(tokens)
+    assert metrics.tokens_per_second is not None and metrics.tokens_per_second > 0
+
+
+def test_generate_reports_server_error(stub):
+    stub.error = "model not loaded"
+    client = AsyncOllamaClient(base_url=stub.url)
+    with pytest.raises(ValueError, match="model not loaded"):
+        run(client.generate("测试", model_name="m1"))
+
+
+def test_generate_rejects_unknown_model(stub):
+    client = AsyncOllamaClient(base_url=stub.url)
+    with pytest.raises(ValueError, match="不存在"):
+        run(client.generate("测试", model_name="missing"))
+    assert stub.payloads == []
+
+
+def test_evaluate_paper(stub):
+    stub.answer = "评价结果如下：" + json.dumps(EVALUATION, ensure_ascii=False)
+    stub.chunk_size = 50
+    client = AsyncOllamaClient(base_url=stub.url)
+    tokens = []
+    metrics = GenerationMetrics()
+
+    result = run(client.evaluate_paper(
+        paper_text="论文正文。" * 20,
+        paper_type="master",
+        reference_texts=["参考文献"],
+        model_name="m1",
+        on_token=tokens.append,
+        metrics=metrics
+    ))
+
+    assert result["score"] == 88
+    assert result["plagiarism_check"]["is_plagiarized"] is False
+    assert "".join(tokens) == stub.answer
+    assert metrics.ttft is not None
+    assert stub.payloads[-1]["system"]
+
+
+class FakeRequest:
+    """模拟客户端在收到第一段输出后断开连接的请求"""
+
+    def __init__(self, tokens: list):
+        self._tokens = tokens
+
+    async def is_disconnected(self) -> bool:
+        return bool(self._tokens)
+
+
+def test_cancel_on_disconnect_closes_upstream_stream(stub):
+    stub.answer = "很长的输出" * 200
+    stub.delay = 0.02
+    client = AsyncOllamaClient(base_url=stub.url)
+    tokens = []
+
+    with pytest.raises(HTTPException) as excinfo:
+        run(cancel_on_disconnect(
+            FakeRequest(tokens),
+            client.generate("测试", model_name="m1", on_token=tokens.append),
+            poll_interval=0.05
+        ))
+
+    assert excinfo.value.status_code == 499
+    assert tokens
+    # 生成被取消后上游连接随之关闭，模拟服务器在继续写入时发现连接已断开
+    assert stub.disconnected.wait(timeout=5)
+    assert not stub.completed.is_set()
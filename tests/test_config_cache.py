@@ -0,0 +1,102 @@
+"""
+模型配置缓存的测试：异步客户端在线程中刷新配置，配置属性只读取已缓存的快照，不在事件循环中查询数据库；
+数据库使用内存SQLite
+"""
+import asyncio
+import threading
+
+import pytest
+
+from backend.core.config import settings
+from backend.database import ModelConfig
+from backend.utils import config_cache, ollama_client
+from backend.utils.config_cache import ModelConfigCache, bump_version
+from backend.utils.ollama_client import AsyncOllamaClient
+
+
+@pytest.fixture
+def cache(memory_db, monkeypatch):
+    """替换数据库和共享的配置缓存，记录每次查询数据库所在的线程"""
+    monkeypatch.setattr(config_cache, "SessionLocal", memory_db)
+    cache = ModelConfigCache()
+    monkeypatch.setattr(config_cache, "_cache", cache)
+    cache.refresh_threads = []
+    refresh = cache._refresh
+
+    def recording_refresh():
+        cache.refresh_threads.append(threading.get_ident())
+        refresh()
+
+    monkeypatch.setattr(cache, "_refresh", recording_refresh)
+    return cache
+
+
+def save_config(db, default_model: str, server_url: str = "http://ollama:11434") -> None:
+    session = db()
+    try:
+        config = session.query(ModelConfig).first()
+        if config is None:
+            config = ModelConfig()
+            session.add(config)
+        config.server_url = server_url
+        config.default_model = default_model
+        bump_version(session)
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_async_refresh_runs_off_loop(cache, memory_db, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_CONFIG_CHECK_INTERVAL", 3600.0)
+    save_config(memory_db, "m1")
+
+    async def main():
+        snapshot = await cache.aget()
+        # 检查间隔内直接返回缓存的快照，不再进入线程
+        assert await cache.aget() is snapshot
+        return threading.get_ident(), snapshot
+
+    loop_thread, snapshot = asyncio.run(main())
+    assert snapshot.default_model == "m1"
+    assert len(cache.refresh_threads) == 1
+    assert cache.refresh_threads[0] != loop_thread
+
+
+def test_client_properties_only_read_snapshot(cache, memory_db, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_CONFIG_CHECK_INTERVAL", 0.0)
+    save_config(memory_db, "m1")
+    client = AsyncOllamaClient()
+
+    async def main():
+        await client.load_config()
+        assert client.default_model == "m1"
+        refreshes = len(cache.refresh_threads)
+
+        # 配置已修改且超过检查间隔，属性仍然只读取快照，不在事件循环中查询数据库
+        save_config(memory_db, "m2")
+        assert client.default_model == "m1"
+        assert client.base_url == "http://ollama:11434"
+        assert len(cache.refresh_threads) == refreshes
+
+        await client.load_config()
+        assert client.default_model == "m2"
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert cache.refresh_threads
+    assert loop_thread not in cache.refresh_threads
+
+
+def test_list_models_uses_refreshed_server(cache, memory_db, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_CONFIG_CHECK_INTERVAL", 3600.0)
+    save_config(memory_db, "m1", server_url="http://gpu-server:11434")
+    servers = []
+
+    async def aget(base_url, fetch, refresh=False):
+        servers.append(base_url)
+        return {"models": []}
+
+    monkeypatch.setattr(ollama_client._inventory, "aget", aget)
+    asyncio.run(AsyncOllamaClient().list_models())
+    assert servers == ["http://gpu-server:11434"]
+    assert cache.loads == 1
@@ -0,0 +1,90 @@
+"""编码后端一致性检查的测试：ONNX后端的检查结果缓存在模型目录中，模型文件或阈值不变时不再加载torch"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from backend.core.config import settings
+from backend.utils import encoders
+
+
+class FakeOnnxEncoder:
+    backend = encoders.BACKEND_ONNX
+
+    def __init__(self, onnx_dir, noise: float = 0.0):
+        self.model_path = os.path.join(onnx_dir, "model.onnx")
+        self.parity_cache_path = os.path.join(onnx_dir, "parity.json")
+        self.noise = noise
+
+    def encode(self, texts, batch_size=32):
+        vectors = FakeTorchEncoder().encode(texts)
+        return vectors + self.noise * np.random.default_rng(1).standard_normal(vectors.shape).astype(np.float32)
+
+
+class FakeTorchEncoder:
+    backend = encoders.BACKEND_TORCH
+    parity_cache_path = None
+
+    def encode(self, texts, batch_size=32):
+        return np.array([[len(text), 1.0, 2.0, 3.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def references(monkeypatch):
+    """记录加载torch参考编码器的次数"""
+    created = []
+
+    def create_encoder(backend, model_name, cache_dir):
+        assert backend == encoders.BACKEND_TORCH
+        created.append(model_name)
+        return FakeTorchEncoder()
+
+    monkeypatch.setattr(encoders, "create_encoder", create_encoder)
+    return created
+
+
+@pytest.fixture
+def onnx_dir(tmp_path):
+    (tmp_path / "model.onnx").write_bytes(b"onnx-model")
+    return str(tmp_path)
+
+
+def test_result_is_cached_next_to_model(onnx_dir, references):
+    encoder = FakeOnnxEncoder(onnx_dir)
+    assert encoders.verify_parity(encoder, "m", "/tmp") is True
+    assert references == ["m"]
+    with open(os.path.join(onnx_dir, "parity.json"), encoding="utf-8") as f:
+        cached = json.load(f)
+    assert cached[encoders.BACKEND_ONNX]["result"]["passed"] is True
+
+    # 之后的启动直接使用缓存的结果，不再加载torch
+    assert encoders.verify_parity(FakeOnnxEncoder(onnx_dir), "m", "/tmp") is True
+    assert references == ["m"]
+
+
+def test_model_or_threshold_change_rechecks(onnx_dir, references, monkeypatch):
+    encoders.verify_parity(FakeOnnxEncoder(onnx_dir), "m", "/tmp")
+    with open(os.path.join(onnx_dir, "model.onnx"), "ab") as f:
+        f.write(b"re-exported")
+    encoders.verify_parity(FakeOnnxEncoder(onnx_dir), "m", "/tmp")
+    assert len(references) == 2
+
+    monkeypatch.setattr(settings, "EMBEDDING_PARITY_MIN_COSINE", 0.999)
+    encoders.verify_parity(FakeOnnxEncoder(onnx_dir), "m", "/tmp")
+    assert len(references) == 3
+
+
+def test_failed_result_is_cached(onnx_dir, references):
+    assert encoders.verify_parity(FakeOnnxEncoder(onnx_dir, noise=5.0), "m", "/tmp") is False
+    assert encoders.verify_parity(FakeOnnxEncoder(onnx_dir, noise=5.0), "m", "/tmp") is False
+    assert references == ["m"]
+
+
+def test_encoder_without_cache_path_always_checks(references):
+    class FakeTorchInt8(FakeTorchEncoder):
+        backend = encoders.BACKEND_TORCH_INT8
+
+    assert encoders.verify_parity(FakeTorchInt8(), "m", "/tmp") is True
+    assert encoders.verify_parity(FakeTorchInt8(), "m", "/tmp") is True
+    assert references == ["m", "m"]
@@ -0,0 +1,301 @@
+"""
+评价任务的测试：事件流按 Last-Event-ID 或快照恢复、任务重新执行后事件ID继续递增、
+输出保存失败时不推进预留的事件ID，以及任务失败时的结束状态；
+数据库使用内存SQLite，评价过程使用替换的 run_evaluation
+"""
+import time
+import asyncio
+
+import pytest
+
+from backend.core.config import settings
+from backend.database import EvaluationJob
+from backend.utils import evaluation_jobs
+from backend.utils.evaluation_jobs import EvaluationJobManager
+
+
+@pytest.fixture
+def db(memory_db, monkeypatch):
+    monkeypatch.setattr(evaluation_jobs, "SessionLocal", memory_db)
+    return memory_db
+
+
+def create_job(db, status: str = evaluation_jobs.STATUS_QUEUED, last_event_id: int = 0,
+               paper_type: str = "master") -> int:
+    session = db()
+    try:
+        job = EvaluationJob(paper_type=paper_type, file_name="paper.pdf", file_path="/tmp/paper.pdf",
+                            model_name="m1", status=status, last_event_id=last_event_id)
+        session.add(job)
+        session.commit()
+        return job.id
+    finally:
+        session.close()
+
+
+def load_job(db, job_id: int) -> EvaluationJob:
+    session = db()
+    try:
+        return session.get(EvaluationJob, job_id)
+    finally:
+        session.close()
+
+
+class ScriptedEvaluation:
+    """代替 run_evaluation：依次进入各阶段并输出token，等待测试放行后返回结果或抛出异常"""
+
+    def __init__(self, tokens, error: Exception = None):
+        self.tokens = list(tokens)
+        self.error = error
+        self.generated = asyncio.Event()
+        self.proceed = asyncio.Event()
+
+    async def __call__(self, paper_type, target_file, target_path, model_name, progress=None):
+        await progress.stage(evaluation_jobs.STAGE_EXTRACT)
+        await progress.stage(evaluation_jobs.STAGE_GENERATE)
+        for token in self.tokens:
+            progress.on_token(token)
+        # token回调通过 call_soon_threadsafe 转到事件循环中处理
+        await asyncio.sleep(0.01)
+        self.generated.set()
+        await self.proceed.wait()
+        if self.error:
+            raise self.error
+        return {"score": 88}
+
+
+async def collect(manager, job_id, last_event_id=None):
+    return [event async for event in manager.events(job_id, last_event_id)]
+
+
+async def subscribe(manager, job_id, last_event_id=None) -> asyncio.Task:
+    """订阅事件流并等到收到第一个事件，返回收集其余事件的任务"""
+    events = manager.events(job_id, last_event_id)
+    first = await events.__anext__()
+
+    async def rest():
+        return [first] + [event async for event in events]
+
+    return asyncio.create_task(rest())
+
+
+def assert_consecutive(events):
+    ids = [event["id"] for event in events]
+    assert ids == list(range(ids[0], ids[0] + len(ids)))
+
+
+def test_events_replay_from_last_event_id_or_snapshot(db, monkeypatch):
+    job_id = create_job(db)
+
+    async def main():
+        evaluation = ScriptedEvaluation(["评", "价", "中"])
+        monkeypatch.setattr(evaluation_jobs, "run_evaluation", evaluation)
+        manager = EvaluationJobManager(workers=1)
+        # 排队中的任务在启动时开始执行
+        await manager.start()
+        await evaluation.generated.wait()
+
+        channel = manager._channels[job_id]
+        assert channel.base == 0
+        assert [event["type"] for event in channel.events] == ["stage", "stage", "token", "token", "token"]
+
+        full = await subscribe(manager, job_id, 0)
+        resumed = await subscribe(manager, job_id, 2)
+        fresh = await subscribe(manager, job_id)
+        stale = await subscribe(manager, job_id, 999)
+        evaluation.proceed.set()
+        await manager._tasks[job_id]
+        return await asyncio.gather(full, resumed, fresh, stale)
+
+    full, resumed, fresh, stale = asyncio.run(main())
+
+    assert [event["id"] for event in full] == [1, 2, 3, 4, 5, 6]
+    assert full[-1]["type"] == "result" and full[-1]["data"]["result"] == {"score": 88}
+    # 断线重连只补发之后的事件
+    assert resumed == full[2:]
+    # 首次连接和超出范围的ID都先收到快照，快照的ID与之后的事件连续
+    for events in (fresh, stale):
+        snapshot = events[0]
+        assert snapshot["type"] == "snapshot"
+        assert snapshot["id"] == 5
+        assert snapshot["data"]["partial_output"] == "评价中"
+        assert snapshot["data"]["status"] == evaluation_jobs.STATUS_RUNNING
+        assert events[1:] == full[5:]
+
+    job = load_job(db, job_id)
+    assert job.status == evaluation_jobs.STATUS_SUCCEEDED
+    assert job.last_event_id == 6
+    assert job.partial_output == "评价中"
+
+    # 任务结束后只返回快照，ID即最后一个事件的ID
+    async def finished():
+        return await collect(EvaluationJobManager(workers=1), job_id, 3)
+
+    events = asyncio.run(finished())
+    assert [(event["type"], event["id"]) for event in events] == [("snapshot", 6)]
+    assert events[0]["data"]["status"] == evaluation_jobs.STATUS_SUCCEEDED
+
+
+def test_event_ids_keep_increasing_across_relaunch(db, monkeypatch):
+    job_id = create_job(db)
+
+    async def first_run():
+        evaluation = ScriptedEvaluation(["第一次"] * 10)
+        monkeypatch.setattr(evaluation_jobs, "run_evaluation", evaluation)
+        manager = EvaluationJobManager(workers=1)
+        # 排队中的任务在启动时开始执行
+        await manager.start()
+        await evaluation.generated.wait()
+        emitted = manager._channels[job_id].last_id
+        # 服务退出：任务保留为运行中，下次启动时重新执行
+        await manager.stop()
+        return emitted
+
+    emitted = asyncio.run(first_run())
+    job = load_job(db, job_id)
+    assert job.status == evaluation_jobs.STATUS_RUNNING
+    assert job.last_event_id >= emitted
+
+    async def second_run():
+        evaluation = ScriptedEvaluation(["第二次"] * 3)
+        monkeypatch.setattr(evaluation_jobs, "run_evaluation", evaluation)
+        manager = EvaluationJobManager(workers=1)
+        await manager.start()
+        assert job_id in manager._channels
+        await evaluation.generated.wait()
+        channel = manager._channels[job_id]
+        base = channel.base
+        events = list(channel.events)
+        resumed = await subscribe(manager, job_id, base + 2)
+        below_base = await subscribe(manager, job_id, emitted)
+        evaluation.proceed.set()
+        await manager._tasks[job_id]
+        return base, events, await resumed, await below_base
+
+    base, events, resumed, below_base = asyncio.run(second_run())
+    assert base == job.last_event_id
+    assert events[0]["id"] == base + 1 > emitted
+    assert_consecutive(events + resumed[len(events) - 2:])
+    assert resumed[0]["id"] == base + 3
+    assert resumed[-1]["type"] == "result"
+    # 上一次执行的事件ID已不在本次的事件记录中，先发送快照
+    assert below_base[0]["type"] == "snapshot"
+    assert load_job(db, job_id).last_event_id == resumed[-1]["id"]
+
+
+def test_failed_flush_keeps_reservation(db, monkeypatch):
+    monkeypatch.setattr(settings, "EVALUATION_FLUSH_INTERVAL", 3600.0)
+    saves = {"calls": 0, "fail": True}
+    save_output = EvaluationJobManager._save_output
+
+    def flaky_save(job_id, output, progress, last_event_id):
+        saves["calls"] += 1
+        if saves["fail"]:
+            raise RuntimeError("database is locked")
+        save_output(job_id, output, progress, last_event_id)
+
+    monkeypatch.setattr(EvaluationJobManager, "_save_output", staticmethod(flaky_save))
+    job_id = create_job(db)
+
+    async def main():
+        evaluation = ScriptedEvaluation([])
+        monkeypatch.setattr(evaluation_jobs, "run_evaluation", evaluation)
+        manager = EvaluationJobManager(workers=1)
+        # 排队中的任务在启动时开始执行
+        await manager.start()
+        await evaluation.generated.wait()
+        channel = manager._channels[job_id]
+        stored = load_job(db, job_id).last_event_id
+        assert channel.reserved == stored
+
+        # 事件ID接近已保存的上限时每个token都会尝试提前保存，保存失败时不推进上限
+        while channel.last_id < stored - evaluation_jobs._EVENT_ID_RESERVE // 2 + 5:
+            manager._on_token(job_id, "字")
+            await asyncio.sleep(0)
+        await channel.flush_task
+        assert saves["calls"] >= 2
+        assert channel.reserved == stored
+        assert load_job(db, job_id).last_event_id == stored
+
+        saves["fail"] = False
+        manager._on_token(job_id, "字")
+        await channel.flush_task
+        assert channel.reserved == load_job(db, job_id).last_event_id > channel.last_id
+
+        evaluation.proceed.set()
+        await manager._tasks[job_id]
+
+    asyncio.run(main())
+
+
+def test_pending_flush_is_awaited_when_job_ends(db, monkeypatch):
+    monkeypatch.setattr(settings, "EVALUATION_FLUSH_INTERVAL", 0.0)
+    saved = []
+    save_output = EvaluationJobManager._save_output
+
+    def slow_save(job_id, output, progress, last_event_id):
+        time.sleep(0.2)
+        save_output(job_id, output, progress, last_event_id)
+        saved.append(output)
+
+    monkeypatch.setattr(EvaluationJobManager, "_save_output", staticmethod(slow_save))
+    job_id = create_job(db)
+
+    async def main():
+        evaluation = ScriptedEvaluation(["输", "出"])
+        evaluation.proceed.set()
+        monkeypatch.setattr(evaluation_jobs, "run_evaluation", evaluation)
+        manager = EvaluationJobManager(workers=1)
+        # 排队中的任务在启动时开始执行
+        await manager.start()
+        channel = manager._channels[job_id]
+        await manager._tasks[job_id]
+        # 任务结束时进行中的保存已经完成，而不是留给事件循环关闭时处理
+        assert isinstance(channel.flush_task, asyncio.Task)
+        assert channel.flush_task.done() and not channel.flush_task.cancelled()
+        assert saved
+
+    asyncio.run(main())
+    # 结束后的保存不会覆盖最终状态
+    job = load_job(db, job_id)
+    assert job.status == evaluation_jobs.STATUS_SUCCEEDED
+    assert job.progress == 1.0
+
+
+@pytest.mark.parametrize("paper_type, error, message", [
+    ("master", ValueError("模型输出无法解析"), "模型输出无法解析"),
+    ("master", evaluation_jobs.HTTPException(status_code=503, detail="Ollama不可用"), "Ollama不可用"),
+    ("bogus", None, "'bogus' is not a valid PaperType"),
+])
+def test_errors_end_job_as_failed(db, monkeypatch, paper_type, error, message):
+    job_id = create_job(db, paper_type=paper_type)
+
+    async def main():
+        evaluation = ScriptedEvaluation(["部分输出"], error=error)
+        monkeypatch.setattr(evaluation_jobs, "run_evaluation", evaluation)
+        manager = EvaluationJobManager(workers=1)
+        # 排队中的任务在启动时开始执行
+        await manager.start()
+        task = manager._tasks[job_id]
+        events = None
+        if paper_type != "bogus":
+            await evaluation.generated.wait()
+            events = await subscribe(manager, job_id, 0)
+            evaluation.proceed.set()
+        await task
+        assert job_id not in manager._channels
+        return await events if events else None
+
+    events = asyncio.run(main())
+    job = load_job(db, job_id)
+    assert job.status == evaluation_jobs.STATUS_FAILED
+    assert job.error == message
+    assert job.finished_at is not None
+    if events is None:
+        # 读取任务参数时就失败，没有进入评价阶段
+        assert job.last_event_id == 1
+    else:
+        assert events[-1]["type"] == "error"
+        assert events[-1]["data"] == {"status": evaluation_jobs.STATUS_FAILED, "error": message}
+        assert job.last_event_id == events[-1]["id"]
+        assert job.partial_output == "部分输出"
@@ -0,0 +1,265 @@
+"""
+文档导入队列状态机的测试：带条件更新的领取、失败后的延迟重试、最终失败保留记录、手动重试重置，
+以及重试接口；数据库使用内存SQLite，编码使用替换的 aencode
+"""
+import os
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import database
+from backend.api import job_routes
+from backend.core.config import settings
+from backend.database import IngestionJob, Paper, PaperType
+from backend.utils import ingestion
+from backend.utils.ingestion import IngestionQueue
+from backend.utils.vector_store import make_doc_id
+
+
+@pytest.fixture
+def db(memory_db, monkeypatch):
+    monkeypatch.setattr(ingestion, "SessionLocal", memory_db)
+    return memory_db
+
+
+def add_paper(db, file_path: str) -> int:
+    """创建论文记录和对应的导入任务，返回任务ID"""
+    session = db()
+    try:
+        paper = Paper(title="论文", file_path=file_path, paper_type=PaperType.master,
+                      status=ingestion.PAPER_STATUS_PROCESSING)
+        session.add(paper)
+        session.flush()
+        job = IngestionQueue().enqueue(session, ingestion.KIND_PAPER, paper.id, file_path)
+        session.commit()
+        return job.id
+    finally:
+        session.close()
+
+
+def load(db, model, pk):
+    session = db()
+    try:
+        return session.get(model, pk)
+    finally:
+        session.close()
+
+
+def set_job(db, job_id: int, **values) -> None:
+    session = db()
+    try:
+        session.query(IngestionJob).filter(IngestionJob.id == job_id).update(values)
+        session.commit()
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    return str(path)
+
+
+def test_claim_in_order_and_only_due_jobs(db, upload):
+    first, second, later = (add_paper(db, upload) for _ in range(3))
+    set_job(db, later, next_attempt_at=datetime.utcnow() + timedelta(hours=1))
+
+    assert IngestionQueue._claim_next() == first
+    assert IngestionQueue._claim_next() == second
+    assert IngestionQueue._claim_next() is None
+
+    job = load(db, IngestionJob, first)
+    assert job.status == ingestion.STATUS_RUNNING
+    assert job.attempts == 1
+    assert job.stage == ingestion.STAGE_EXTRACT
+
+
+def test_concurrent_claims_take_each_job_once(tmp_path, monkeypatch, upload):
+    # 多个线程同时领取时需要真正的并发连接，这里使用文件数据库
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"timeout": 30})
+    database.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(ingestion, "SessionLocal", session_factory)
+    job_ids = {add_paper(session_factory, upload) for _ in range(5)}
+
+    claimed = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        while (job_id := IngestionQueue._claim_next()) is not None:
+            claimed.append(job_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    assert sorted(claimed) == sorted(job_ids)
+    session = session_factory()
+    try:
+        assert {job.attempts for job in session.query(IngestionJob)} == {1}
+    finally:
+        session.close()
+
+
+def test_failure_requeues_with_growing_delay(db, upload, monkeypatch):
+    monkeypatch.setattr(settings, "INGESTION_RETRY_DELAY", 10.0)
+    job_id = add_paper(db, upload)
+
+    for attempt in (1, 2):
+        assert IngestionQueue._claim_next() == job_id
+        before = datetime.utcnow()
+        IngestionQueue._handle_failure(IngestionQueue._load_job(job_id), "编码模型不可用")
+        job = load(db, IngestionJob, job_id)
+        assert job.status == ingestion.STATUS_QUEUED
+        assert job.attempts == attempt
+        assert job.error == "编码模型不可用"
+        delay = (job.next_attempt_at - before).total_seconds()
+        assert 10.0 * attempt - 1 < delay <= 10.0 * attempt + 1
+        # 未到重试时间不会被领取
+        assert IngestionQueue._claim_next() is None
+        set_job(db, job_id, next_attempt_at=datetime.utcnow())
+
+
+def test_final_failure_keeps_paper_and_file(db, upload):
+    job_id = add_paper(db, upload)
+    set_job(db, job_id, attempts=settings.INGESTION_MAX_ATTEMPTS - 1)
+    assert IngestionQueue._claim_next() == job_id
+
+    IngestionQueue._handle_failure(IngestionQueue._load_job(job_id), "未能从文档中提取到文本")
+
+    job = load(db, IngestionJob, job_id)
+    assert job.status == ingestion.STATUS_FAILED
+    assert job.finished_at is not None
+    paper = load(db, Paper, job.target_id)
+    assert paper is not None and paper.status == ingestion.PAPER_STATUS_FAILED
+    assert os.path.exists(upload)
+    assert IngestionQueue._claim_next() is None
+
+
+def test_deleted_target_fails_without_retry(db, upload):
+    job_id = add_paper(db, upload)
+    assert IngestionQueue._claim_next() == job_id
+    IngestionQueue._handle_failure(IngestionQueue._load_job(job_id), "导入目标记录已删除: paper 1")
+    assert load(db, IngestionJob, job_id).status == ingestion.STATUS_FAILED
+
+
+def test_retry_resets_failed_job(db, upload):
+    job_id = add_paper(db, upload)
+    set_job(db, job_id, attempts=settings.INGESTION_MAX_ATTEMPTS - 1)
+    IngestionQueue._claim_next()
+    IngestionQueue._handle_failure(IngestionQueue._load_job(job_id), "Ollama不可用")
+
+    job = IngestionQueue.retry(job_id)
+    assert job["status"] == ingestion.STATUS_QUEUED
+    assert job["attempts"] == 0
+    assert job["error"] is None and job["stage"] is None and job["finished_at"] is None
+    assert load(db, Paper, job["target_id"]).status == ingestion.PAPER_STATUS_PROCESSING
+    # 重试的任务立即可以领取，并重新获得完整的重试次数
+    assert IngestionQueue._claim_next() == job_id
+    assert load(db, IngestionJob, job_id).attempts == 1
+
+
+def test_retry_rejects_invalid_jobs(db, upload):
+    job_id = add_paper(db, upload)
+    assert IngestionQueue.retry(job_id + 100) is None
+    with pytest.raises(ValueError, match="只能重试失败的导入任务"):
+        IngestionQueue.retry(job_id)
+
+    set_job(db, job_id, status=ingestion.STATUS_FAILED)
+    os.remove(upload)
+    with pytest.raises(ValueError, match="文件已不存在"):
+        IngestionQueue.retry(job_id)
+
+
+def test_retry_endpoint(db, upload, monkeypatch):
+    notified = []
+    monkeypatch.setattr(ingestion, "_queue", IngestionQueue())
+    monkeypatch.setattr(ingestion._queue, "notify", lambda: notified.append(True))
+    app = FastAPI()
+    app.include_router(job_routes.router, prefix="/api")
+    client = TestClient(app)
+    job_id = add_paper(db, upload)
+
+    response = client.post(f"/api/jobs/ingestion/{job_id}/retry")
+    assert response.status_code == 400
+    assert client.post(f"/api/jobs/ingestion/{job_id + 100}/retry").status_code == 404
+    assert not notified
+
+    set_job(db, job_id, status=ingestion.STATUS_FAILED, attempts=3)
+    response = client.post(f"/api/jobs/ingestion/{job_id}/retry")
+    assert response.status_code == 200
+    assert response.json()["status"] == ingestion.STATUS_QUEUED
+    assert response.json()["attempts"] == 0
+    assert notified == [True]
+
+
+@pytest.fixture
+def pipeline(db, tmp_path, open_vector_store, monkeypatch):
+    """替换文本提取和编码，导入流程的其余部分照常执行"""
+    monkeypatch.setattr(ingestion.DocumentProcessor, "process_document",
+                        staticmethod(lambda file_path: "导入测试文本。" * 100))
+    store = open_vector_store(tmp_path / "vector_store")
+    calls = {"encode": 0, "fail": 0}
+
+    async def aencode(texts, batch_size=None):
+        calls["encode"] += 1
+        if calls["fail"]:
+            calls["fail"] -= 1
+            raise RuntimeError("编码模型不可用")
+        return store._model.encode(texts)
+
+    monkeypatch.setattr(store, "aencode", aencode)
+    return store, calls
+
+
+def test_run_succeeds(db, upload, pipeline):
+    store, calls = pipeline
+    job_id = add_paper(db, upload)
+    assert IngestionQueue._claim_next() == job_id
+    asyncio.run(IngestionQueue()._run(job_id))
+
+    job = load(db, IngestionJob, job_id)
+    assert job.status == ingestion.STATUS_SUCCEEDED and job.progress == 1.0
+    paper = load(db, Paper, job.target_id)
+    doc_id = make_doc_id("paper", paper.id)
+    assert paper.vector == str(doc_id) and paper.status == "pending"
+    assert store.document_map[doc_id]["metadata"]["paper_id"] == paper.id
+    assert calls["encode"] >= 1
+
+
+def test_run_retries_then_fails(db, upload, pipeline, monkeypatch):
+    store, calls = pipeline
+    monkeypatch.setattr(settings, "INGESTION_RETRY_DELAY", 0.0)
+    calls["fail"] = settings.INGESTION_MAX_ATTEMPTS
+    job_id = add_paper(db, upload)
+    queue = IngestionQueue()
+
+    for attempt in range(1, settings.INGESTION_MAX_ATTEMPTS + 1):
+        assert IngestionQueue._claim_next() == job_id
+        asyncio.run(queue._run(job_id))
+        job = load(db, IngestionJob, job_id)
+        assert job.attempts == attempt
+        assert job.error == "编码模型不可用"
+
+    assert job.status == ingestion.STATUS_FAILED
+    assert load(db, Paper, job.target_id).status == ingestion.PAPER_STATUS_FAILED
+    assert not store.document_map
+
+    # 手动重试后成功
+    IngestionQueue.retry(job_id)
+    assert IngestionQueue._claim_next() == job_id
+    asyncio.run(queue._run(job_id))
+    assert load(db, IngestionJob, job_id).status == ingestion.STATUS_SUCCEEDED
+    assert load(db, Paper, job.target_id).status == "pending"
@@ -0,0 +1,23 @@
+"""文本提取缓存键的测试：影响提取结果的配置变化时缓存键随之变化"""
+import pytest
+
+from backend.core.config import settings
+from backend.utils import document_processor
+
+
+@pytest.mark.parametrize("name, value", [
+    ("PDF_MIN_TEXT_CHARS", 50),
+    ("PDF_MIXED_IMAGE_COVERAGE", 0.8),
+    ("OCR_DPI", 300),
+])
+def test_setting_change_changes_tag(monkeypatch, name, value):
+    before = document_processor._text_cache_tag()
+    monkeypatch.setattr(settings, name, value)
+    assert document_processor._text_cache_tag() != before
+
+
+def test_ocr_mode_change_changes_tag(monkeypatch):
+    before = document_processor._text_cache_tag()
+    monkeypatch.setattr(settings, "OCR_MODE", "sequential")
+    monkeypatch.setattr(document_processor.ocr, "_config_tag", None)
+    assert document_processor._text_cache_tag() != before
@@ -0,0 +1,232 @@
+"""
+向量存储持久化的测试：预写日志重放、尾部损坏记录截断、快照压缩、旧版文档映射迁移，
+以及按 make_doc_id 写入的文档在覆盖和删除后重启的状态
+"""
+import os
+import json
+import time
+import struct
+
+import faiss
+import numpy as np
+import pytest
+
+from backend.core.config import settings
+from backend.utils import index_factory
+from backend.utils.vector_wal import VectorWAL, OP_ADD_CHUNKS, OP_DELETE
+from backend.utils.vector_store import make_doc_id, chunk_vector_id, parent_doc_id
+
+PAPER_1 = make_doc_id("paper", 1)
+PAPER_2 = make_doc_id("paper", 2)
+KNOWLEDGE_1 = make_doc_id("knowledge", 1)
+
+
+def long_text(label: str, sentences: int = 30) -> str:
+    """生成会被切分为多个文本块的文档"""
+    return "".join(f"{label}第{i}句，用于测试向量存储的持久化。" for i in range(sentences))
+
+
+def total_chunks(store) -> int:
+    return sum(doc["chunks"] for doc in store.document_map.values())
+
+
+def best_match(store, text: str):
+    """用文档自身的文本块检索，返回有文本块完全相同的最相似文档，没有时返回None"""
+    results = store.search_documents(store.encode_document(text), top_k=1, threshold=0.99)
+    return results[0] if results and results[0]["matched_chunks"] else None
+
+
+def test_doc_id_scheme():
+    assert PAPER_1 != KNOWLEDGE_1
+    assert PAPER_1 >> 48 == 1 and KNOWLEDGE_1 >> 48 == 2
+    for doc_id in (PAPER_1, KNOWLEDGE_1, 7):
+        for chunk in (0, 1, 4095):
+            assert parent_doc_id(chunk_vector_id(doc_id, chunk)) == doc_id
+    assert chunk_vector_id(PAPER_1, 0) != chunk_vector_id(KNOWLEDGE_1, 0)
+    # 整篇文档一个向量的旧数据，向量ID即文档ID
+    assert parent_doc_id(PAPER_1) == PAPER_1
+
+
+def test_replay_after_crash_without_compaction(tmp_path, open_vector_store):
+    store = open_vector_store(tmp_path)
+    texts = {PAPER_1: long_text("甲"), PAPER_2: long_text("乙"), KNOWLEDGE_1: long_text("丙")}
+    for doc_id, text in texts.items():
+        store.add_document(text, {"title": str(doc_id)}, doc_id=doc_id)
+    chunks = total_chunks(store)
+    assert chunks > len(texts)
+    assert not os.path.exists(tmp_path / "index.faiss")
+
+    store = open_vector_store(tmp_path)
+    assert store._wal is not None
+    assert set(store.document_map) == set(texts)
+    assert store.index.ntotal == total_chunks(store) == chunks
+    for doc_id, text in texts.items():
+        match = best_match(store, text)
+        assert match["doc_id"] == doc_id
+        assert match["metadata"] == {"title": str(doc_id)}
+        assert match["coverage"] == 1.0
+
+
+def test_torn_last_record_is_truncated(tmp_path, open_vector_store):
+    store = open_vector_store(tmp_path)
+    store.add_document(long_text("甲"), {"title": "甲"}, doc_id=PAPER_1)
+    wal_path = tmp_path / "wal.log"
+    valid_size = os.path.getsize(wal_path)
+    store.add_document(long_text("乙"), {"title": "乙"}, doc_id=PAPER_2)
+    # 模拟写最后一条记录时崩溃：只留下一半
+    with open(wal_path, "r+b") as f:
+        f.truncate(valid_size + (os.path.getsize(wal_path) - valid_size) // 2)
+
+    store = open_vector_store(tmp_path)
+    assert set(store.document_map) == {PAPER_1}
+    assert store.index.ntotal == total_chunks(store)
+    assert os.path.getsize(wal_path) == valid_size
+
+    # 截断后继续追加的记录在下次启动时正常重放
+    store.add_document(long_text("丙"), {"title": "丙"}, doc_id=KNOWLEDGE_1)
+    store = open_vector_store(tmp_path)
+    assert set(store.document_map) == {PAPER_1, KNOWLEDGE_1}
+    assert best_match(store, long_text("丙"))["doc_id"] == KNOWLEDGE_1
+
+
+def test_corrupt_last_record_fails_crc(tmp_path):
+    path = str(tmp_path / "wal.log")
+    wal = VectorWAL(path)
+    wal.append(OP_ADD_CHUNKS, PAPER_1, {"title": "甲"}, np.ones((2, 4), dtype=np.float32))
+    valid_size = os.path.getsize(path)
+    wal.append(OP_ADD_CHUNKS, PAPER_2, {"title": "乙"}, np.ones((2, 4), dtype=np.float32))
+    wal.close()
+    # 长度完整但负载被改写，校验和不匹配
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    wal = VectorWAL(path)
+    records = list(wal.replay())
+    assert [record["doc_id"] for record in records] == [PAPER_1]
+    assert records[0]["metadata"] == {"title": "甲"}
+    assert records[0]["vector"].reshape(2, 4).tolist() == np.ones((2, 4)).tolist()
+    assert wal.count == 1
+    assert os.path.getsize(path) == valid_size
+    wal.close()
+
+
+def test_wal_ignores_trailing_partial_header(tmp_path):
+    path = str(tmp_path / "wal.log")
+    wal = VectorWAL(path)
+    wal.append(OP_DELETE, PAPER_1)
+    wal.close()
+    with open(path, "ab") as f:
+        f.write(struct.pack("<I", 12))
+
+    wal = VectorWAL(path)
+    assert [(record["op"], record["doc_id"]) for record in wal.replay()] == [(OP_DELETE, PAPER_1)]
+    wal.close()
+
+
+def test_compaction_then_restart(tmp_path, open_vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_WAL_COMPACT_THRESHOLD", 3)
+    store = open_vector_store(tmp_path)
+    texts = {make_doc_id("paper", pk): long_text(f"文档{pk}") for pk in range(1, 5)}
+    for doc_id, text in texts.items():
+        store.add_document(text, {"pk": doc_id}, doc_id=doc_id)
+    # 第3条记录触发压缩，之后的记录留在日志中
+    assert os.path.exists(tmp_path / "index.faiss")
+    assert os.path.exists(tmp_path / "metadata.db")
+    assert store._wal.count == 1
+    chunks = total_chunks(store)
+
+    store = open_vector_store(tmp_path)
+    assert set(store.document_map) == set(texts)
+    # 快照中已有的向量不会因为重放再写入一次
+    assert store.index.ntotal == total_chunks(store) == chunks
+    assert sorted(index_factory.all_ids(store.index).tolist()) == sorted(
+        chunk_vector_id(doc_id, i) for doc_id, doc in store.document_map.items() for i in range(doc["chunks"])
+    )
+
+    store.compact()
+    assert os.path.getsize(tmp_path / "wal.log") == 0
+    store = open_vector_store(tmp_path)
+    assert store.index.ntotal == chunks
+    for doc_id, text in texts.items():
+        assert best_match(store, text)["doc_id"] == doc_id
+
+
+def test_legacy_document_map_migration(tmp_path, open_vector_store):
+    # 旧版快照：按插入顺序编号的精确索引 + 同时保存元数据和向量的 document_map.json
+    vectors = np.random.default_rng(0).standard_normal((3, 16)).astype(np.float32)
+    legacy_index = faiss.IndexFlatL2(16)
+    legacy_index.add(vectors)
+    faiss.write_index(legacy_index, str(tmp_path / "index.faiss"))
+    legacy_map = {str(i): {"metadata": {"title": f"旧文档{i}"}, "vector": vectors[i].tolist()} for i in range(3)}
+    with open(tmp_path / "document_map.json", "w", encoding="utf-8") as f:
+        json.dump(legacy_map, f, ensure_ascii=False)
+
+    store = open_vector_store(tmp_path)
+    assert store._wal is not None
+    assert not os.path.exists(tmp_path / "document_map.json")
+    assert os.path.exists(tmp_path / "document_map.json.bak")
+    assert os.path.exists(tmp_path / "metadata.db")
+    assert store.document_map == {i: {"metadata": {"title": f"旧文档{i}"}, "chunks": 0} for i in range(3)}
+    assert sorted(index_factory.all_ids(store.index).tolist()) == [0, 1, 2]
+    results = store.search_similar(vectors[1], top_k=1)
+    assert results[0][0] == 1 and results[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    # 迁移后的存储可以正常写入，重启后不再迁移
+    store.add_document(long_text("新"), {"title": "新文档"}, doc_id=PAPER_1)
+    store.delete_document(2)
+    store = open_vector_store(tmp_path)
+    assert set(store.document_map) == {0, 1, PAPER_1}
+    assert store.search_similar(vectors[0], top_k=1)[0][0] == 0
+    assert all(doc_id != 2 for doc_id, _, _ in store.search_similar(vectors[2], top_k=5))
+
+
+@pytest.mark.parametrize("compact_between", [False, True])
+def test_overwrite_and_delete_survive_restart(tmp_path, open_vector_store, compact_between):
+    store = open_vector_store(tmp_path)
+    old_text, new_text = long_text("旧版本", 40), long_text("新版本", 10)
+    store.add_document(old_text, {"version": 1}, doc_id=PAPER_1)
+    store.add_document(long_text("知识"), {"kind": "knowledge"}, doc_id=KNOWLEDGE_1)
+    if compact_between:
+        store.compact()
+
+    store.update_document(PAPER_1, new_text, {"version": 2})
+    assert store.delete_document(KNOWLEDGE_1)
+    assert not store.delete_document(KNOWLEDGE_1)
+    # 同一主键的不同命名空间互不影响
+    assert store.find_ids({"version": 2}) == [PAPER_1]
+
+    store = open_vector_store(tmp_path)
+    assert list(store.document_map) == [PAPER_1]
+    assert store.document_map[PAPER_1]["metadata"] == {"version": 2}
+    assert store.index.ntotal == store.document_map[PAPER_1]["chunks"]
+    assert best_match(store, new_text)["doc_id"] == PAPER_1
+    # 旧版本多出的文本块已不在索引中
+    assert best_match(store, old_text) is None
+    assert best_match(store, long_text("知识")) is None
+
+
+def test_hnsw_overwrite_survives_restart(tmp_path, open_vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_TYPE", index_factory.INDEX_HNSW)
+    store = open_vector_store(tmp_path)
+    assert not index_factory.supports_remove(store.index)
+    old_text, new_text = long_text("旧版本", 20), long_text("新版本", 20)
+    store.add_document(old_text, {"version": 1}, doc_id=PAPER_1)
+    store.add_document(new_text, {"version": 2}, doc_id=PAPER_1)
+    # 覆盖前的向量在后台重建完成前按存储位置排除
+    assert best_match(store, old_text) is None
+
+    deadline = time.monotonic() + 10
+    while store.stats()["rebuilding"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not store.stats()["rebuilding"]
+    assert store.stats()["stale_vectors"] == 0
+    assert store.index.ntotal == store.document_map[PAPER_1]["chunks"]
+
+    store = open_vector_store(tmp_path)
+    assert store.index.ntotal == store.document_map[PAPER_1]["chunks"]
+    assert store.stats()["stale_vectors"] == 0
+    assert best_match(store, new_text)["doc_id"] == PAPER_1
+    assert best_match(store, old_text) is None